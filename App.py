@@ -41,6 +41,7 @@ from os import access,R_OK, mkdir
 from glob import iglob
 import shutil
 from autoanalysis.controller import EVT_RESULT, Controller
+from autoanalysis.processmodules.DirIndex import DirIndex
 from autoanalysis.gui.appgui import ConfigPanel, FilesPanel, WelcomePanel, ProcessPanel,dlgLogViewer
 
 __version__ = '1.0.0'
@@ -372,12 +373,13 @@ class FileSelectPanel(FilesPanel):
         """
         self.btnAutoFind.Disable()
         self.m_status.SetLabelText("Finding files ... please wait")
-        allfiles = [y for y in iglob(join(self.inputdir, '**'), recursive=True)]
+        # single scan of directory tree - kept and updated for next search
+        allfiles = DirIndex.get(self.inputdir).getFiles(self.inputdir)
         searchtext = self.m_tcSearch.GetValue()
         if (len(searchtext) > 0):
             filenames = [f for f in allfiles if re.search(searchtext, f, flags=re.IGNORECASE)]
         else:
-            filenames = [f for f in allfiles if not isdir(f)]
+            filenames = allfiles
         #Assign files to group based on filenames
         groups = self.m_cbGroups.GetItems()
         for fname in filenames:
@@ -423,6 +425,8 @@ class ProcessRunPanel(ProcessPanel):
         # EVT_CANCEL(self, self.stopfunc)
         # Set timer handler
         self.start = {}
+        # Row of each process in table - plot stages are added as processing runs
+        self.rows = {}
 
     def loadController(self):
         self.controller = self.Parent.controller
@@ -462,8 +466,10 @@ class ProcessRunPanel(ProcessPanel):
         status = "%d of %d files " % (i, total)
         msg = "\nProgress updated: %s count=%d status=%s" % (time.ctime(), count, status)
         print(msg)
-        if count == 0:
+        row = self.rows.get(process, row)
+        if count == 0 and i == 0:
             self.m_dataViewListCtrlRunning.AppendItem([process, count, "Pending"])
+            self.rows[process] = self.m_dataViewListCtrlRunning.GetItemCount() - 1
             self.start[process] = time.time()
         elif count < 0:
             self.m_dataViewListCtrlRunning.SetValue("ERROR in process - see log file", row=row, col=2)
@@ -513,6 +519,7 @@ class ProcessRunPanel(ProcessPanel):
         """
         # Clear processing window
         self.m_dataViewListCtrlRunning.DeleteAllItems()
+        self.rows = {}
         # Disable Run button
         # self.m_btnRunProcess.Disable()
         btn = event.GetEventObject()
@@ -548,14 +555,22 @@ class ProcessRunPanel(ProcessPanel):
                     raise ValueError("No files selected in Files Panel")
 
                 row = 0
-                # For each process
+                processes = []
                 for pcaption in selections:
                     for p in self.controller.processes.keys():
                         if self.controller.processes[p]['caption']==pcaption:
                             break
-                    print("processname =", p)
-                    self.controller.RunProcess(self, p, outputdir,filenames, row, showplots)
-                    row = row + 1
+                    processes.append(p)
+                # Run as chain for each file
+                if len(processes) > 1 and self.controller.isPipeline():
+                    print("pipeline =", processes)
+                    self.controller.RunPipeline(self, processes, outputdir, filenames, row, showplots)
+                else:
+                    # For each process
+                    for p in processes:
+                        print("processname =", p)
+                        self.controller.RunProcess(self, p, outputdir,filenames, row, showplots)
+                        row = row + 1
 
             else:
                 if len(selections) <= 0:
@@ -584,6 +599,7 @@ class ProcessRunPanel(ProcessPanel):
 
     def OnClearWindow(self, event):
         self.m_dataViewListCtrlRunning.DeleteAllItems()
+        self.rows = {}
 
 ########################################################################
 class AppMain(wx.Listbook):
@@ -677,7 +693,7 @@ class AppMain(wx.Listbook):
 
     def OnQuit(self, e):
         if self.controller.db is not None:
-            self.controller.db.conn.close()
+            self.controller.db.closeconn()
         self.Close()
 
     def OnCloseWindow(self, e):
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Command line runner
+    1. Runs processes as listed in processes.yaml without the gui - eg from a job scheduler
+    2. Input files from a directory (searched recursively), a list of files or a saved file list (csv of group,file)
+    3. Files are assigned to groups (GROUPx in config) from directory names for batch processes
+    4. --shard i/N runs only part i of N of the matched files so several jobs can split one experiment set
+    5. Progress is written to stdout as text or as a stream of json lines
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import argparse
+import csv
+import json
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from os import access, R_OK
+from os.path import join, dirname, abspath, expanduser, isdir, sep
+from autoanalysis.db.dbquery import ConnectionPool
+from autoanalysis.controller import Controller, PipelineThread
+from autoanalysis.processmodules.DirIndex import DirIndex
+
+RESOURCE_DIR = join(dirname(abspath(__file__)), 'resources')
+
+
+class ProgressReporter():
+    """
+    Receives progress from process threads (in place of gui events) and writes one line per update
+    """
+
+    def __init__(self, stream=None, asjson=False, shard=None):
+        """
+        :param stream: output stream (default stdout)
+        :param asjson: write json lines rather than text
+        :param shard: (i, n) of this job - included in json output
+        """
+        if stream is None:
+            stream = sys.stdout
+        self.stream = stream
+        self.asjson = asjson
+        self.shard = shard
+        self.errors = 0
+        self.start = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, data):
+        """
+        Write progress
+        :param data: tuple of (count, row, i, total, processname) as sent by ProcessThread
+        """
+        (count, row, i, total, process) = data
+        if count == 0 and i == 0:
+            status = 'pending'
+            self.start[process] = time.time()
+        elif count < 0:
+            status = 'error'
+            self.errors += 1
+        elif count < 100:
+            status = 'running'
+        else:
+            status = 'done'
+        elapsed = time.time() - self.start.get(process, time.time())
+        if self.asjson:
+            record = OrderedDict([('time', time.time()), ('process', process), ('status', status),
+                                  ('percent', round(count, 1)), ('file', i), ('total', total),
+                                  ('elapsed', round(elapsed, 3))])
+            if self.shard is not None:
+                record['shard'] = "%d/%d" % self.shard
+            line = json.dumps(record)
+        else:
+            line = "%s: %s %d of %d files (%d percent, %d secs)" % (process, status, i, total, count, elapsed)
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+def parseShard(shard):
+    """
+    Parse shard as i/N
+    :param shard: string eg 2/4 or None
+    :return: (i, n) or None
+    """
+    if shard is None:
+        return None
+    try:
+        (i, n) = [int(x) for x in shard.split('/')]
+    except ValueError:
+        raise ValueError("Shard must be given as i/N eg 1/4: %s" % shard)
+    if n < 1 or i < 1 or i > n:
+        raise ValueError("Shard must be from 1/N to N/N: %s" % shard)
+    return (i, n)
+
+
+def getConfigdb(configdb=None):
+    """
+    Config db - as given, else user's config as saved by the gui, else default in resources
+    :return: full path of db
+    """
+    if configdb is None:
+        configdb = join(expanduser('~'), '.qbi_autoanalysis', 'autoconfig.db')
+        if not access(configdb, R_OK):
+            configdb = join(RESOURCE_DIR, 'autoconfig.db')
+    if not access(configdb, R_OK):
+        raise IOError("Cannot access config db: %s" % configdb)
+    return configdb
+
+
+def findFiles(inputdir, searchtext=None):
+    """
+    Find all files in directory (recursive) - as FileSelectPanel.OnAutofind
+    :param inputdir: top level directory
+    :param searchtext: regex to match in full path (case insensitive)
+    :return: list of files
+    """
+    allfiles = DirIndex.get(inputdir).getFiles(inputdir)
+    if searchtext is not None and len(searchtext) > 0:
+        allfiles = [f for f in allfiles if re.search(searchtext, f, flags=re.IGNORECASE)]
+    return allfiles
+
+
+def getGroup(filename, groups):
+    """
+    Group of file from directory names - as FileSelectPanel.OnAutofind
+    :param filename: full path filename
+    :param groups: list of group names from config
+    :return: group or empty string
+    """
+    for g in groups:
+        if g.upper() in filename.upper().split(sep):
+            return g
+    return ''
+
+
+def loadFilelist(filelist):
+    """
+    Load file list as saved from FileSelectPanel
+    :param filelist: csv with rows of group,filename
+    :return: list of (group, filename)
+    """
+    rows = []
+    with open(filelist, 'r') as csvfile:
+        sreader = csv.reader(csvfile, delimiter=',', quotechar='"')
+        for row in sreader:
+            if len(row) > 1:
+                rows.append((row[0], row[1]))
+    return rows
+
+
+def getFilenames(controller, args):
+    """
+    Input files sorted into groups - as ProcessRunPanel.OnRunScripts
+    :return: dict of 'all' and each group with list of files
+    """
+    config = controller.db.getConfig(controller.currentconfig)
+    groups = [config[c] for c in sorted(config.keys()) if c.startswith('GROUP')]
+    rows = []
+    if args.filelist is not None:
+        rows += loadFilelist(args.filelist)
+    files = list(args.files)
+    if args.inputdir is not None:
+        files += findFiles(args.inputdir, args.search)
+    rows += [(getGroup(f, groups), f) for f in files]
+    filenames = {'all': []}
+    for g in groups:
+        filenames[g] = []
+    for (group, fname) in rows:
+        if not isdir(fname):
+            filenames['all'].append(fname)
+            if len(group) > 0:
+                filenames.setdefault(group, []).append(fname)
+    return filenames
+
+
+def getProcess(controller, name):
+    """
+    Process id from id, href or caption as in processes.yaml
+    :return: process id
+    """
+    for p in controller.processes.keys():
+        if name in [p, controller.processes[p]['href'], controller.processes[p]['caption']]:
+            return p
+    raise ValueError("Process not found: %s - available: %s" % (name, ", ".join(controller.processes.keys())))
+
+
+def create_parser():
+    """
+    Create commandline parser
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog='autoanalysis',
+                                     description='''\
+            Runs processes (as in processes.yaml) over data files without the gui
+
+             ''')
+    parser.add_argument('files', nargs='*', help='Data files (or use --inputdir or --filelist)')
+    parser.add_argument('--process', action='store', nargs='+', required=True,
+                        help='Processes to run in order - id, href or caption eg bleach baseline')
+    parser.add_argument('--inputdir', action='store', help='Input directory (searched recursively)')
+    parser.add_argument('--search', action='store', help='Regex to select files in input directory')
+    parser.add_argument('--filelist', action='store', help='Saved file list (csv of group,filename)')
+    parser.add_argument('--outputdir', action='store', help='Output directory for batch processes', default='')
+    parser.add_argument('--configdb', action='store', help='Config database (default user config)')
+    parser.add_argument('--dbwal', action='store_true',
+                        help='Switch config database to WAL journal mode (local disks only - not network shares)')
+    parser.add_argument('--configid', action='store', help='Config id in database', default='general')
+    parser.add_argument('--processfile', action='store', help='Processes yaml',
+                        default=join(RESOURCE_DIR, 'processes.yaml'))
+    parser.add_argument('--shard', action='store', help='Run only part i of N of the matched files eg 1/4')
+    parser.add_argument('--pipeline', action='store_true', help='Run processes as a chain for each file')
+    parser.add_argument('--showplots', action='store_true', help='Generate plots')
+    parser.add_argument('--json', action='store_true', help='Progress as json lines on stdout (other output to stderr)')
+    return parser
+
+
+def main(argv=None):
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    shard = parseShard(args.shard)
+    stream = sys.stdout
+    if args.json:
+        # keep stdout for progress only
+        sys.stdout = sys.stderr
+    reporter = ProgressReporter(stream, args.json, shard)
+    ConnectionPool.wal = args.dbwal
+    controller = Controller(getConfigdb(args.configdb), args.configid, args.processfile)
+    processes = [getProcess(controller, p) for p in args.process]
+    filenames = getFilenames(controller, args)
+    if len(filenames['all']) <= 0:
+        raise ValueError("No input files - give files, --inputdir or --filelist")
+    outputdir = args.outputdir
+    if len(outputdir) <= 0 and args.inputdir is not None:
+        outputdir = args.inputdir
+    try:
+        for row, p in enumerate(processes):
+            try:
+                if len(processes) > 1 and (args.pipeline or controller.isPipeline()):
+                    t = controller.RunPipeline(reporter, processes, outputdir, filenames, row, args.showplots, shard)
+                else:
+                    t = controller.RunProcess(reporter, p, outputdir, filenames, row, args.showplots, shard)
+            except ValueError as e:
+                # eg no matched files for this shard
+                print(e.args[0])
+                continue
+            # wait as each process may use outputs of previous
+            t.join()
+            if isinstance(t, PipelineThread):
+                break
+    finally:
+        controller.db.closeconn()
+    return 1 if reporter.errors > 0 else 0
+
+
+####################################################################################################################
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,33 @@
 import logging
 import threading
-from glob import iglob
+from collections import OrderedDict
 from logging.handlers import RotatingFileHandler
-from multiprocessing import freeze_support, Pool
-from os import access, R_OK, mkdir
-from os.path import join, dirname, exists, split, splitext, expanduser
-from autoanalysis.db.dbquery import DBI
+from multiprocessing import freeze_support, Pool, cpu_count
+from os import access, R_OK, mkdir, makedirs
+from os.path import join, dirname, exists, split, splitext, expanduser, abspath, basename
+from autoanalysis.db.dbquery import DBI, ConfigSnapshot
+from autoanalysis.processmodules.DataParser import AutoData, configureCache, configurePrefetch
+from autoanalysis.processmodules.DirIndex import DirIndex
+from autoanalysis.processmodules.ExcelExport import flushExports, waitExport
+from autoanalysis.processmodules.Manifest import Manifest, isIncremental, getCodeVersion
 import matplotlib.pyplot as plt
-import wx
 import yaml
 import importlib
 from configobj import ConfigObj
+try:
+    import wx
+    PyEvent = wx.PyEvent
+except ImportError:
+    # Running headless (see cli) - progress sent to reporter function instead of gui events
+    wx = None
+    PyEvent = object
 
 
 # Required for dist
 freeze_support()
 # Define notification event for thread completion
-EVT_RESULT_ID = wx.NewId()
-EVT_DATA_ID = wx.NewId()
+EVT_RESULT_ID = wx.NewId() if wx is not None else -1
+EVT_DATA_ID = wx.NewId() if wx is not None else -1
 #global logger
 logger = logging.getLogger()
 
@@ -31,7 +41,7 @@ def EVT_DATA(win, func):
     win.Connect(-1, -1, EVT_DATA_ID, func)
 
 
-class ResultEvent(wx.PyEvent):
+class ResultEvent(PyEvent):
     """Simple event to carry arbitrary result data."""
 
     def __init__(self, data):
@@ -41,7 +51,7 @@ class ResultEvent(wx.PyEvent):
         self.data = data
 
 
-class DataEvent(wx.PyEvent):
+class DataEvent(PyEvent):
     """Simple event to carry arbitrary result data."""
 
     def __init__(self, data):
@@ -51,17 +61,31 @@ class DataEvent(wx.PyEvent):
         self.data = data
 
 
+def postResult(wxObject, data):
+    """
+    Send progress to gui as ResultEvent or, if headless, to reporter function
+    :param wxObject: wx window, function taking data tuple or None
+    :param data: tuple of (count, row, i, total, processname) with count as percent done or -1 for error
+    """
+    if wxObject is None:
+        return
+    if wx is not None and isinstance(wxObject, wx.EvtHandler):
+        wx.PostEvent(wxObject, ResultEvent(data))
+    else:
+        wxObject(data)
+
+
 def CheckFilenames(filenames, configfiles):
     """
     Check that filenames are appropriate for the script required
+    - other files needed are found in the directory of each file (and subdirs) from a single index of each directory
     :param filenames: list of full path filenames
     :param configfiles: matching filename for script as in config
     :return: filtered list
     """
     newfiles = {k: [] for k in filenames.keys() }
+    indexes = DirIndex.getIndexes([dirname(f) for group in filenames.keys() for f in filenames[group]])
     for conf in configfiles:
-        # if conf.startswith('_'):
-        #     conf = conf[1:]
         for group in filenames.keys():
             for f in filenames[group]:
                 parts = split(f)
@@ -69,19 +93,359 @@ def CheckFilenames(filenames, configfiles):
                     newfiles[group].append(f)
                 elif conf.startswith('_'):
                     c = conf[1:]
-                    newfiles[group] = newfiles[group] + [y for y in iglob(join(parts[0], '**', '*' + c), recursive=True)]
+                    newfiles[group] = newfiles[group] + indexes[abspath(parts[0])].find(suffix=c, under=parts[0])
                 else:
                     # extract directory and seek files
-                    newfiles[group] = newfiles[group] + [y for y in iglob(join(parts[0], '**', conf), recursive=True)]
+                    newfiles[group] = newfiles[group] + indexes[abspath(parts[0])].find(name=conf, under=parts[0])
+    # remove duplicates (same file found from several selected files)
+    for group in newfiles.keys():
+        newfiles[group] = list(OrderedDict.fromkeys(newfiles[group]))
+    return newfiles
 
 
+def getSourceKey(filename, index):
+    """
+    Source input of a file - the input with the shortest name that the filename starts with in its directory
+    or a parent directory (eg processed/EXP1_Time Trace(s)_Processed.xlsx is from EXP1_Time Trace(s).csv)
+    :param filename: full path filename
+    :param index: dict of directory: list of input basenames (no extension)
+    :return: (directory, basename) of source or of the file itself if not from an input
+    """
+    name = basename(filename)
+    path = abspath(dirname(filename))
+    key = None
+    while True:
+        for bname in index.get(path, []):
+            if name.startswith(bname) and (key is None or len(bname) < len(key[1])):
+                key = (path, bname)
+        parent = dirname(path)
+        if parent == path:
+            break
+        path = parent
+    if key is None:
+        key = (abspath(dirname(filename)), splitext(name)[0])
+    return key
+
+
+def shardFiles(filenames, shard, inputs=None):
+    """
+    Select files for one of several jobs splitting the same file set
+    - source inputs are assigned round robin (sorted) and each file goes with its source (see getSourceKey)
+      so the files of an experiment stay in the same job for every stage whatever outputs already exist
+    :param filenames: list of files or dict of group: files (batch - whole groups are assigned to a job)
+    :param shard: (i, n) for job i (from 1) of n jobs or None for all files
+    :param inputs: files or dict of group: files given for the run (same for all stages) - filenames if None
+    :return: files for this job as list or dict
+    """
+    if shard is None:
+        return filenames
+    (i, n) = shard
+    if i < 1 or i > n:
+        raise ValueError("Shard must be from 1 to %d: %d" % (n, i))
+    if inputs is None:
+        inputs = filenames
+    if isinstance(filenames, dict):
+        groups = sorted([g for g in inputs.keys() if g != 'all' and len(inputs[g]) > 0])[i - 1::n]
+        sharded = dict([(g, filenames[g]) for g in groups if g in filenames])
+        sharded['all'] = sorted(set([f for g in sharded.keys() for f in sharded[g]]))
+        return sharded
+    if isinstance(inputs, dict):
+        inputs = inputs['all']
+    index = dict()
+    for f in set(inputs):
+        index.setdefault(abspath(dirname(f)), []).append(splitext(basename(f))[0])
+    keys = sorted(set([getSourceKey(f, index) for f in inputs]))
+    selected = set(keys[i - 1::n])
+    return sorted(set([f for f in filenames if getSourceKey(f, index) in selected]))
+
+
+def getOutputdir(filename, output):
+    """
+    Determine output directory for a file - 'local' creates a processed subdir next to the input
+    :param filename: data file to process
+    :param output: 'local' or full path of output directory
+    :return: output directory
+    """
+    if output == 'local':
+        inputdir = dirname(filename)
+        if 'processed' in inputdir:
+            outputdir = inputdir
+        else:
+            outputdir = join(inputdir, 'processed')
+        # may be created concurrently by several workers
+        makedirs(outputdir, exist_ok=True)
+    else:
+        outputdir = output
+    return outputdir
 
-    # if self.filesIn is not None:
-    #     checkedfilenames = CheckFilenames(self.filenames, self.filesIn)
-    #     files = [f for f in checkedfilenames if self.controller.datafile in f]
-    # else:
-    #     files = self.filenames
-    return newfiles
+
+def matchFilename(filename, configfiles):
+    """
+    Check if filename matches any of the config filenames (as in CheckFilenames)
+    :param filename: full path filename
+    :param configfiles: list of config filenames eg _Processed.xlsx
+    :return: true if matched
+    """
+    bname = split(filename)[1]
+    for conf in configfiles:
+        if conf in bname or conf[1:] in bname:
+            return True
+    return False
+
+
+def getPlotProcesses(config):
+    """
+    Number of processes for the plot stage from config PLOT_PROCESSES (default 0)
+    - 0 writes plots as each module runs, more than 0 defers plots to a separate stage (opt-in)
+    :param config: ConfigSnapshot (or dict of config name=value)
+    :return: number of processes
+    """
+    try:
+        return max(int(config.get('PLOT_PROCESSES', 0)), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def loadModule(module_name, class_name, filename, output, showplots, config):
+    """
+    Instantiate module for file with config values
+    :param config: ConfigSnapshot (or dict of config name=value) as loaded by parent
+    :return: (module instance, config values of module)
+    """
+    outputdir = getOutputdir(filename, output)
+    # Instantiate module
+    module = importlib.import_module(module_name)
+    class_ = getattr(module, class_name)
+    mod = class_(filename, outputdir, showplots=showplots)
+    # Plots queued for plot stage (see PlotStage)
+    mod.deferplots = showplots and getPlotProcesses(config) > 0
+    cfg = resolveConfig(mod, config)
+    mod.setConfigurables(cfg)
+    return (mod, cfg)
+
+
+def resolveConfig(mod, config):
+    """
+    All params required for module from config loaded by parent - typed as module defaults
+    :param mod: module instance
+    :param config: ConfigSnapshot (or dict of config name=value)
+    :return: dict of config values of module
+    """
+    if not isinstance(config, ConfigSnapshot):
+        config = ConfigSnapshot(None, config)
+    cfg = config.resolve(mod.getConfigurables())
+    for c in cfg.keys():
+        msg = "Process File: config set: %s=%s" % (c, str(cfg[c]))
+        logger.debug(msg)
+    return cfg
+
+
+def runModule(mod, module_name, key, cfg, showplots, config):
+    """
+    Run module - if INCREMENTAL set in config, run is skipped when its outputs are up to date
+    ie inputs, config values and module code unchanged since outputs were written (see Manifest)
+    :param mod: module instance with config set
+    :param module_name: full module name
+    :param key: input file or batch group
+    :param cfg: config values of module
+    :param showplots: plots are outputs so included with config
+    :param config: dict of config name=value as loaded by parent
+    :return: (result, skipped)
+    """
+    if not isIncremental(config):
+        return (mod.run(), False)
+    process = "%s.%s" % (module_name, mod.__class__.__name__)
+    settings = dict([(c, str(cfg[c])) for c in cfg.keys()])
+    settings['showplots'] = str(showplots)
+    code = getCodeVersion(module_name)
+    manifest = Manifest(mod.outputdir)
+    sources = list(mod.inputfiles)
+    record = manifest.isUpToDate(process, key, sources, settings, code)
+    if record is not None:
+        logger.info("Up to date - skipped %s: %s", mod.__class__.__name__, key)
+        mod.outputfiles = list(record['outputs'].keys())
+        return (None, True)
+    result = mod.run()
+    # outputs must be finalized before fingerprints are taken - exports of other runs continue
+    for f in mod.outputfiles:
+        waitExport(f)
+    args = (mod.outputdir, process, key, sources, mod.inputfiles, mod.outputfiles, settings, code)
+    if len(getattr(mod, 'plotjobs', [])) > 0:
+        # Deferred plots are outputs - recorded once written so failed plots are redrawn by next run
+        mod.plotjobs = [(recordPlots, args + (mod.plotjobs,))]
+    else:
+        manifest.record(*args[1:])
+    return (result, False)
+
+
+def recordPlots(outputdir, process, key, sources, inputs, outputs, settings, code, plotjobs):
+    """
+    Write deferred plots of a run then record the run with the plots as outputs (see runModule)
+    - at module level so it can be sent to a plot process
+    :param plotjobs: list of (function, args) of run
+    :return: list of plot files written
+    """
+    files = []
+    for job in plotjobs:
+        files += renderPlot(job)
+    Manifest(outputdir).record(process, key, sources, inputs, outputs + files, settings, code)
+    return files
+
+
+def processFile(args):
+    """
+    Run module on a single file - at module level so it can be sent to a worker process
+    :param args: tuple of (module_name, class_name, filename, output, showplots, config)
+    :return: (filename, result, plot jobs)
+    """
+    (module_name, class_name, filename, output, showplots, config) = args
+    logger.info("Process File with file: %s", filename)
+    configureCache(config)
+    (mod, cfg) = loadModule(module_name, class_name, filename, output, showplots, config)
+    (result, skipped) = runModule(mod, module_name, filename, cfg, showplots, config)
+    return (filename, result, mod.plotjobs)
+
+
+def processPipeline(args):
+    """
+    Run a chain of modules on a single file - at module level so it can be sent to a worker process
+    Output sheets of each stage (module outputs) are passed in memory to the next stage
+    so its input file does not need to be parsed again
+    :param args: tuple of (stages, filename, output, showplots, config) with stages as list of (module_name, class_name, filesin)
+    :return: (filename, list of results per stage, plot jobs of all stages)
+    """
+    (stages, filename, output, showplots, config) = args
+    logger.info("Process Pipeline with file: %s", filename)
+    configureCache(config)
+    results = []
+    plotjobs = []
+    inputfile = filename
+    outputs = None
+    for (module_name, class_name, filesin) in stages:
+        if outputs is not None:
+            # Input for this stage from outputs of previous stage
+            matched = [f for f in outputs.keys() if matchFilename(f, filesin)]
+            if len(matched) <= 0:
+                logger.warning("Process Pipeline: no output for %s from %s", class_name, inputfile)
+                break
+            inputfile = matched[0]
+        (mod, cfg) = loadModule(module_name, class_name, inputfile, output, showplots, config)
+        if outputs is not None and len(outputs[inputfile]) > 0:
+            mod.sheets.update(outputs[inputfile])
+            logger.info("Process Pipeline: %s data passed in memory from %s", class_name, inputfile)
+        (result, skipped) = runModule(mod, module_name, inputfile, cfg, showplots, config)
+        results.append(result)
+        plotjobs += mod.plotjobs
+        # Output files of skipped stages are loaded from disk by next stage
+        outputs = dict([(f, {}) for f in mod.outputfiles])
+        outputs.update(getattr(mod, 'outputs', {}))
+    return (filename, results, plotjobs)
+
+
+def runWorker(args):
+    """
+    Run worker function in a worker process - its exports are finalized before the result is returned
+    :param args: tuple of (worker function, task args)
+    :return: result of worker
+    """
+    (worker, task) = args
+    result = worker(task)
+    flushExports()
+    return result
+
+
+def renderPlot(job):
+    """
+    Write plot of a plot job - at module level so it can be sent to a plot process
+    :param job: tuple of (function, args) as queued by module (see AutoData.addPlot)
+    :return: list of files written
+    """
+    (func, args) = job
+    return func(*args)
+
+
+class PlotStage():
+    """
+    Renders plot jobs from processing in a separate pool of processes so processing does not wait for plots
+    Progress is reported as its own row - named for the process with (plots)
+    """
+
+    def __init__(self, wxObject, row, processname, numprocesses=1):
+        """
+        Init plot stage - pool is started with the first job
+        :param wxObject: gui window for progress events or function taking progress tuple (headless)
+        :param row: row of process
+        :param processname: name of process
+        :param numprocesses: number of plot processes
+        """
+        self.wxObject = wxObject
+        self.row = row
+        self.processname = "%s (plots)" % processname
+        self.numprocesses = numprocesses
+        self.pool = None
+        self.total = 0
+        self.done = 0
+        self.errors = 0
+        self.closed = False
+        self.outputfiles = []
+        self.lock = threading.Lock()
+
+    def submit(self, jobs):
+        """
+        Queue plot jobs
+        :param jobs: list of (function, args)
+        """
+        for job in jobs:
+            with self.lock:
+                if self.pool is None:
+                    self.pool = Pool(processes=self.numprocesses)
+                    postResult(self.wxObject, (0, self.row, 0, 0, self.processname))
+                self.total += 1
+            self.pool.apply_async(renderPlot, (job,), callback=self.onDone, error_callback=self.onError)
+
+    def onDone(self, files):
+        with self.lock:
+            self.done += 1
+            self.outputfiles += files
+            self.report()
+
+    def onError(self, e):
+        logger.error("Plot stage: %s", e)
+        with self.lock:
+            self.errors += 1
+            self.report()
+
+    def report(self):
+        """
+        Send progress - complete only when no more jobs can be queued
+        """
+        finished = self.closed and self.done + self.errors == self.total
+        count = (self.done / self.total) * 100
+        if finished and self.errors > 0:
+            count = -1
+        elif not finished:
+            count = min(count, 99)
+        postResult(self.wxObject, (count, self.row, self.done, self.total, self.processname))
+
+    def close(self):
+        """
+        No more jobs - pool finishes queued jobs
+        """
+        with self.lock:
+            self.closed = True
+            if self.pool is None:
+                return
+            if self.done + self.errors == self.total:
+                self.report()
+        self.pool.close()
+
+    def join(self):
+        """
+        Wait for queued jobs
+        """
+        if self.pool is not None:
+            self.pool.join()
+            logger.info("Plot stage: %d plots written (%d errors)", self.done, self.errors)
 
 
 ########################################################################
@@ -167,19 +531,31 @@ class TestThread(threading.Thread):
 
 class ProcessThread(threading.Thread):
     """Multi Worker Thread Class."""
+    # Function run per file in worker processes
+    worker = staticmethod(processFile)
     # ----------------------------------------------------------------------
-    def __init__(self, controller, wxObject, modules, outputdir, filenames, row, processname, showplots):
-        """Init Worker Thread Class."""
+    def __init__(self, controller, wxObject, modules, outputdir, filenames, row, processname, showplots, numprocesses=1,
+                 config=None):
+        """
+        Init Worker Thread Class.
+        :param config: ConfigSnapshot for this run (loaded from controller db if not given)
+        """
         threading.Thread.__init__(self)
         self.controller = controller
-        self.config = self.controller.db.getConfig(self.controller.currentconfig)
-        self.db = DBI(self.controller.configfile)
+        if config is None:
+            config = self.controller.getSnapshot()
+        self.config = config
         self.wxObject = wxObject
         self.filenames = filenames
         self.output = outputdir
         self.row = row
         self.showplots = showplots
         self.processname = processname
+        self.numprocesses = numprocesses
+        # Plots rendered while processing continues (see PlotStage)
+        self.plots = None
+        if showplots and getPlotProcesses(config) > 0:
+            self.plots = PlotStage(wxObject, row, processname, getPlotProcesses(config))
         (self.module_name,self.class_name) = modules
         logger = logging.getLogger(processname)
         # self.start()  # start the thread
@@ -192,47 +568,56 @@ class ProcessThread(threading.Thread):
             event.set()
             lock.acquire(True)
             q = dict()
-            # connect to db
-            self.db.getconn()
+            configureCache(self.config)
             if isinstance(self.filenames,dict):
                 batch = True
                 total_files = len(self.filenames)-1
                 i = 0
-                for group in self.filenames.keys():
-                    if group == 'all' or len(self.filenames[group])<=0:
-                        continue
-                    count = (i/ total_files )* 100
-                    msg = "PROCESS THREAD (batch):%s run: count=%d of %d (%d percent)" % (self.processname, i, total_files, count)
+                module = importlib.import_module(self.module_name)
+                if getattr(getattr(module, self.class_name), 'grouped', False):
+                    # module takes files of all groups at once (single output)
+                    msg = "PROCESS THREAD (batch):%s run: all groups" % self.processname
                     print(msg)
                     logger.info(msg)
-                    #TODO fix this
-                    wx.PostEvent(self.wxObject, ResultEvent((count, self.row, i + 1, total_files, self.processname)))
-                    self.processBatch(self.filenames[group], q, group)
-                    i += 1
+                    postResult(self.wxObject, (0, self.row, 1, total_files, self.processname))
+                    self.processBatch(self.filenames, q)
+                else:
+                    for group in self.filenames.keys():
+                        if group == 'all' or len(self.filenames[group])<=0:
+                            continue
+                        count = (i/ total_files )* 100
+                        msg = "PROCESS THREAD (batch):%s run: count=%d of %d (%d percent)" % (self.processname, i, total_files, count)
+                        print(msg)
+                        logger.info(msg)
+                        #TODO fix this
+                        postResult(self.wxObject, (count, self.row, i + 1, total_files, self.processname))
+                        self.processBatch(self.filenames[group], q, group)
+                        i += 1
 
             else:
                 batch = False
                 files = self.filenames
                 total_files = len(files)
-                for i in range(total_files):
-                    count = (i+1/ total_files )* 100
-                    msg = "PROCESS THREAD: %s run: count=%d of %d (%d percent)" % (self.processname, i+1, total_files, count)
-                    print(msg)
-                    logger.info(msg)
-                    wx.PostEvent(self.wxObject, ResultEvent((count, self.row, i + 1, total_files, self.processname)))
-                    self.processData(files[i], q)
-
-            wx.PostEvent(self.wxObject, ResultEvent((100, self.row, total_files, total_files, self.processname)))
+                if self.numprocesses > 1 and total_files > 1:
+                    self.processParallel(files, q)
+                else:
+                    self.processSerial(files, q)
+            # Excel outputs written in background are finalized before process completes
+            flushExports()
+            postResult(self.wxObject, (100, self.row, total_files, total_files, self.processname))
         except Exception as e:
-            wx.PostEvent(self.wxObject, ResultEvent((-1, self.row, i + 1, total_files, self.processname)))
+            postResult(self.wxObject, (-1, self.row, i + 1, total_files, self.processname))
             logging.error(e)
         finally:
+            if self.plots is not None:
+                self.plots.close()
             logger.info('Finished ProcessThread')
             # self.terminate()
             lock.release()
             event.clear()
-            # connect to db
-            self.db.closeconn()
+        # Next process can start while plots are written
+        if self.plots is not None:
+            self.plots.join()
 
     # ----------------------------------------------------------------------
     def processData(self, filename, q):
@@ -242,35 +627,83 @@ class ProcessThread(threading.Thread):
         :param q: queue for results
         :return:
         """
-        logger.info("Process Data with file: %s", filename)
-        # create local subdir for output
-        if self.output == 'local':
-            inputdir = dirname(filename)
-            if 'processed' in inputdir:
-                outputdir = inputdir
-            else:
-                outputdir = join(inputdir, 'processed')
-            if not exists(outputdir):
-                mkdir(outputdir)
-        else:
-            outputdir = self.output
-        # Instantiate module
-        module = importlib.import_module(self.module_name)
-        class_ = getattr(module, self.class_name)
-        mod = class_(filename, outputdir, showplots=self.showplots)
-        # Load all params required for module - get list from module
-        cfg = mod.getConfigurables()
-        for c in cfg.keys():
-            cfg[c] = self.db.getConfigByName(self.controller.currentconfig, c)
-            msg ="Process Data: config set: %s=%s" % (c,str(cfg[c]))
-            print(msg)
-            logger.debug(msg)
-        mod.setConfigurables(cfg)
-        if mod.data is not None:
-            q[filename] = mod.run()
-        else:
-            q[filename] = None
+        (filename, result, plotjobs) = self.worker(self.getTask(filename))
+        q[filename] = result
+        self.submitPlots(plotjobs)
+
+    def submitPlots(self, plotjobs):
+        """
+        Send plot jobs to plot stage
+        :param plotjobs: list of (function, args)
+        """
+        if self.plots is not None:
+            self.plots.submit(plotjobs)
+
+    def getTask(self, filename):
+        """
+        Arguments for worker for a file
+        :param filename: data file to process
+        :return: tuple of args
+        """
+        return (self.module_name, self.class_name, filename, self.output, self.showplots, self.config)
+
+    def processSerial(self, files, q):
+        """
+        Run module over files in this thread - the next files are read while each is processed (see Prefetch)
+        :param files: list of data files to process
+        :param q: queue for results
+        :return:
+        """
+        total_files = len(files)
+        prefetch = None
+        if total_files > 1:
+            prefetch = configurePrefetch(self.config)
+        try:
+            for i in range(total_files):
+                if prefetch is not None:
+                    prefetch.fetch(files[i + 1:])
+                count = (i / total_files) * 100
+                msg = "PROCESS THREAD: %s run: count=%d of %d (%d percent)" % (self.processname, i+1, total_files, count)
+                print(msg)
+                logger.info(msg)
+                postResult(self.wxObject, (count, self.row, i + 1, total_files, self.processname))
+                self.processData(files[i], q)
+                if prefetch is not None:
+                    prefetch.release(files[i])
+        finally:
+            if prefetch is not None:
+                prefetch.close()
+                AutoData.prefetch = None
+                logger.info(prefetch.getStats())
 
+    def processParallel(self, files, q):
+        """
+        Run module over files in a pool of worker processes
+        - results are collected in file order so progress is reported in order
+        :param files: list of data files to process
+        :param q: queue for results
+        :return:
+        """
+        total_files = len(files)
+        numprocesses = min(self.numprocesses, total_files)
+        logger.info("Process Parallel with %d files over %d processes", total_files, numprocesses)
+        tasks = [(self.worker, self.getTask(f)) for f in files]
+        pool = Pool(processes=numprocesses)
+        try:
+            for i, (filename, result, plotjobs) in enumerate(pool.imap(runWorker, tasks)):
+                q[filename] = result
+                self.submitPlots(plotjobs)
+                count = ((i + 1) / total_files) * 100
+                msg = "PROCESS THREAD (parallel): %s done: count=%d of %d (%d percent)" % (self.processname, i + 1, total_files, count)
+                print(msg)
+                logger.info(msg)
+                postResult(self.wxObject, (count, self.row, i + 1, total_files, self.processname))
+            pool.close()
+        except Exception as e:
+            pool.terminate()
+            raise e
+        finally:
+            pool.join()
 
     def processBatch(self, filelist, q, group=None):
         """
@@ -287,17 +720,15 @@ class ProcessThread(threading.Thread):
         class_ = getattr(module, self.class_name)
         mod = class_(filelist, outputdir, showplots=self.showplots)
         # Load all params required for module - get list from module
-        cfg = mod.getConfigurables()
-        for c in cfg.keys():
-            cfg[c] = self.db.getConfigByName(self.controller.currentconfig, c)
-            msg ="Process Batch: config set: %s=%s" % (c,str(cfg[c]))
-            logger.debug(msg)
+        cfg = resolveConfig(mod, self.config)
         mod.setConfigurables(cfg)
         if group is not None:
             mod.prefix = group
-            q[group] = mod.run()
+            key = group
         else:
-            q[mod.base] = mod.run()
+            key = mod.base
+        (q[key], skipped) = runModule(mod, self.module_name, key, cfg, self.showplots, self.config)
+        self.submitPlots(getattr(mod, 'plotjobs', []))
 
 
 
@@ -308,6 +739,28 @@ class ProcessThread(threading.Thread):
 
 
 
+####################################################################################################
+
+class PipelineThread(ProcessThread):
+    """Worker Thread running a chain of processes on each file."""
+    worker = staticmethod(processPipeline)
+
+    # ----------------------------------------------------------------------
+    def __init__(self, controller, wxObject, stages, outputdir, filenames, row, processname, showplots, numprocesses=1,
+                 config=None):
+        """
+        Init Pipeline Thread
+        :param stages: list of (module_name, class_name, filesin) in order
+        """
+        (module_name, class_name, filesin) = stages[0]
+        ProcessThread.__init__(self, controller, wxObject, (module_name, class_name), outputdir, filenames, row,
+                               processname, showplots, numprocesses, config)
+        self.stages = stages
+
+    def getTask(self, filename):
+        return (self.stages, filename, self.output, self.showplots, self.config)
+
+
 ########################################################################
 
 class Controller():
@@ -396,45 +849,132 @@ class Controller():
 
 
     # ----------------------------------------------------------------------
-    def RunProcess(self, wxGui, process,outputdir,filenames, row, showplots=False):
+    def RunProcess(self, wxGui, process,outputdir,filenames, row, showplots=False, shard=None):
         """
         Instantiate Thread with type for Process
-        :param wxGui:
+        :param wxGui: gui window for progress events or function taking progress tuple (headless)
         :param filenames:
         :param type:
         :param row:
-        :return:
+        :param shard: (i, n) to run only job i of n splitting the matched files (see shardFiles)
+        :return: thread
         """
 
         type = self.processes[process]['href']
         processname = self.processes[process]['caption']
-        filesIn = []
-        for f in self.processes[process]['filesin'].split(", "):
-            fin = self.db.getConfigByName(self.currentconfig, f)
-            if fin is not None:
-                filesIn.append(fin)
-            else:
-                filesIn.append(f)
+        # Config for whole run
+        config = self.getSnapshot()
+        filesIn = self.getFilesIn(process, config)
+        inputs = filenames
         filenames = CheckFilenames(filenames,filesIn)
         # filesout = self.processes[process]['filesout'] #TODO link up with module config?
         # suffix = self.db.getConfigByName(self.currentconfig,filesout)
         if self.processes[process]['output'] == 'local':
             outputdir = self.processes[process]['output']
             filenames = filenames['all']
+        # same files of each experiment in this shard for every stage (see shardFiles)
+        filenames = shardFiles(filenames, shard, inputs)
 
         if len(filenames) > 0:
             logger.info("Load Process Threads: %s [row: %d]", type, row)
-            wx.PostEvent(wxGui, ResultEvent((0, row, 0, len(filenames), processname)))
-            t = ProcessThread(self, wxGui, self.cmodules[process],outputdir, filenames, row, processname, showplots )
+            postResult(wxGui, (0, row, 0, len(filenames), processname))
+            t = ProcessThread(self, wxGui, self.cmodules[process],outputdir, filenames, row, processname, showplots,
+                              self.getNumProcesses(config), config)
             t.start()
             logger.info("Running Thread: %s", type)
+            return t
         else:
             logger.error("No files to process")
             raise ValueError("No matched files to process")
 
     # ----------------------------------------------------------------------
+    def RunPipeline(self, wxGui, processes, outputdir, filenames, row, showplots=False, shard=None):
+        """
+        Instantiate Thread running processes as a chain for each file - outputs passed in memory between stages
+        :param wxGui: gui window for progress events or function taking progress tuple (headless)
+        :param processes: list of process ids in order
+        :param filenames:
+        :param row:
+        :param shard: (i, n) to run only job i of n splitting the matched files (see shardFiles)
+        :return: thread
+        """
+        for process in processes:
+            if self.processes[process]['output'] != 'local':
+                raise ValueError("Pipeline only available for processes with local output: %s" % self.processes[process]['caption'])
+        processname = " > ".join([self.processes[p]['caption'] for p in processes])
+        # Config for whole run
+        config = self.getSnapshot()
+        stages = [self.cmodules[p] + (self.getFilesIn(p, config),) for p in processes]
+        filenames = shardFiles(CheckFilenames(filenames, stages[0][2])['all'], shard, filenames)
+        if len(filenames) > 0:
+            logger.info("Load Pipeline Thread: %s [row: %d]", processname, row)
+            postResult(wxGui, (0, row, 0, len(filenames), processname))
+            t = PipelineThread(self, wxGui, stages, 'local', filenames, row, processname, showplots,
+                               self.getNumProcesses(config), config)
+            t.start()
+            logger.info("Running Pipeline Thread: %s", processname)
+            return t
+        else:
+            logger.error("No files to process")
+            raise ValueError("No matched files to process")
 
+    # ----------------------------------------------------------------------
+    def getSnapshot(self):
+        """
+        Read-only copy of current config - loaded once for a run and passed to all workers
+        :return: ConfigSnapshot
+        """
+        return self.db.getSnapshot(self.currentconfig)
 
+    # ----------------------------------------------------------------------
+    def getFilesIn(self, process, config=None):
+        """
+        Input filenames for process from config (or as listed if not in config)
+        :param process: process id
+        :param config: ConfigSnapshot for run (loaded if not given)
+        :return: list of filenames
+        """
+        if config is None:
+            config = self.getSnapshot()
+        filesIn = []
+        for f in self.processes[process]['filesin'].split(", "):
+            fin = config.get(f)
+            if fin is not None:
+                filesIn.append(fin)
+            else:
+                filesIn.append(f)
+        return filesIn
+
+    # ----------------------------------------------------------------------
+    def isPipeline(self, config=None):
+        """
+        Run selected processes as a pipeline if PIPELINE set in config (default false)
+        :param config: ConfigSnapshot for run (loaded if not given)
+        :return: true or false
+        """
+        if config is None:
+            config = self.getSnapshot()
+        return config.resolve({'PIPELINE': False})['PIPELINE']
+
+    # ----------------------------------------------------------------------
+    def getNumProcesses(self, config=None):
+        """
+        Number of worker processes for per-file processing from config NUM_PROCESSES (default 1 = serial)
+        - 0 or less uses all available cpus
+        :param config: ConfigSnapshot for run (loaded if not given)
+        :return: number of processes
+        """
+        if config is None:
+            config = self.getSnapshot()
+        try:
+            numprocesses = int(config.resolve({'NUM_PROCESSES': 1})['NUM_PROCESSES'])
+        except ValueError:
+            numprocesses = 1
+        if numprocesses <= 0:
+            numprocesses = cpu_count()
+        return numprocesses
+
+    # ----------------------------------------------------------------------
     def shutdown(self):
         logger.info('Close extra thread')
         t = threading.current_thread()
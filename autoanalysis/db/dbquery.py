@@ -1,31 +1,193 @@
 import sqlite3
+import threading
+import logging
 import pandas
-from os.path import join
+from collections import OrderedDict
+from collections.abc import Mapping
+from copy import copy
+from os.path import join, abspath
 from os import access, R_OK, W_OK
 
+
+def coerceValue(value, default):
+    """
+    Convert config value (as stored in db) to type of default value
+    :param value: value from db (string) or None if not set
+    :param default: default value from module getConfigurables
+    :return: typed value or copy of default if not set
+    """
+    if value is None:
+        return copy(default)
+    if isinstance(default, bool):
+        return str(value).lower() in ['true', '1', 'y', 'yes']
+    if isinstance(default, int):
+        try:
+            return int(value)
+        except ValueError:
+            # eg 1.5 set where default is 1
+            return float(value)
+    if isinstance(default, float):
+        return float(value)
+    if isinstance(default, list):
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        return [v for v in str(value).split(',') if len(v) > 0]
+    if isinstance(default, str):
+        return str(value)
+    return value
+
+
+class ConfigSnapshot(Mapping):
+    """
+    Read-only copy of all config values for a configid - loaded once per run and passed to workers
+    """
+    __slots__ = ('configid', '_values')
+
+    def __init__(self, configid, values=None):
+        """
+        :param configid: config id in db
+        :param values: dict of name=value (as stored in db)
+        """
+        object.__setattr__(self, 'configid', configid)
+        object.__setattr__(self, '_values', dict(values) if values is not None else {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Config snapshot is read-only")
+
+    def __reduce__(self):
+        return (ConfigSnapshot, (self.configid, self._values))
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return "ConfigSnapshot(%r, %r)" % (self.configid, self._values)
+
+    def resolve(self, defaults):
+        """
+        Config values for a module converted to the types of its defaults
+        :param defaults: dict of name=default as from module getConfigurables
+        :return: OrderedDict of name=value (default used if not set)
+        """
+        cfg = OrderedDict()
+        for name in defaults.keys():
+            try:
+                cfg[name] = coerceValue(self._values.get(name), defaults[name])
+            except ValueError:
+                raise ValueError("Config value for %s is not valid (expected %s): %s"
+                                 % (name, type(defaults[name]).__name__, self._values.get(name)))
+        return cfg
+
+
+class ConnectionPool():
+    """
+    Connections to a db file - one per thread, shared by all DBI objects for that file in the thread
+    so that threads never wait on each other's connection and connections are not reopened for each use
+    """
+    # Pools by db file
+    pools = {}
+    lock = threading.Lock()
+    # Switch db to WAL journal mode on first connection so reads do not wait on writes
+    # - off by default as it changes the db file and does not work on network shares
+    wal = False
+
+    def __init__(self, dbfile):
+        self.dbfile = dbfile
+        self.local = threading.local()
+        self.prepared = False
+
+    @classmethod
+    def get(cls, dbfile):
+        """
+        Get shared pool for db file
+        :param dbfile: full path of db
+        :return: pool
+        """
+        key = abspath(dbfile)
+        with cls.lock:
+            if key not in cls.pools:
+                cls.pools[key] = ConnectionPool(dbfile)
+            return cls.pools[key]
+
+    def prepare(self, conn):
+        """
+        Set up db on first connection - WAL mode only if set (see wal) - skipped if db is read-only
+        """
+        if self.wal:
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError as e:
+                logging.warning("DBI: cannot set WAL mode for db %s: %s", self.dbfile, e)
+        self.prepared = True
+
+    def getconn(self):
+        """
+        Connection for this thread - opened if needed (or if closed)
+        :return: (connection, cursor)
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            try:
+                conn.total_changes
+            except sqlite3.ProgrammingError:
+                # closed directly
+                conn = None
+        if conn is None:
+            conn = sqlite3.connect(self.dbfile)
+            if not self.prepared:
+                self.prepare(conn)
+            self.local.conn = conn
+            self.local.cursor = conn.cursor()
+        return (conn, self.local.cursor)
+
+    def close(self):
+        """
+        Close connection for this thread
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+            self.local.cursor = None
+
+
 class DBI():
     def __init__(self, dbfile):
         """
-        Init for connection to config db
+        Init for connection to config db - connections are pooled per thread (see ConnectionPool)
         :param dbfile:
         """
         self.dbfile = dbfile
-        self.c = None
+        self.pool = ConnectionPool.get(dbfile)
+
+    @property
+    def conn(self):
+        return self.pool.getconn()[0]
+
+    @property
+    def c(self):
+        return self.pool.getconn()[1]
 
     def getconn(self):
-        self.conn = sqlite3.connect(self.dbfile)
-        self.c = self.conn.cursor()
+        self.pool.getconn()
 
     def closeconn(self):
-        self.conn.close()
+        """
+        Close connection for this thread - reopened if used again
+        """
+        self.pool.close()
 
     def getConfig(self, configid):
         """
         Get dict of config
         :return: name=value pairs or None
         """
-        if self.c is None:
-            self.getconn()
         self.c.execute("SELECT * FROM config WHERE configid=?",(configid,))
         config = {}
         for k,val,gp,desc in self.c.fetchall():
@@ -34,13 +196,50 @@ class DBI():
             config = None
         return config
 
+    def getConfigs(self, configid, names):
+        """
+        Get several config values in a single query
+        :param configid: config id
+        :param names: list of names
+        :return: dict of name=value (None if not found)
+        """
+        names = list(names)
+        config = dict([(n, None) for n in names])
+        if len(names) > 0:
+            qry = "SELECT name, value FROM config WHERE configid=? AND name IN (%s)" % ",".join(["?"] * len(names))
+            self.c.execute(qry, [configid] + names)
+            for k, val in self.c.fetchall():
+                config[k] = val
+        return config
+
+    def getConfigsForMany(self, configids):
+        """
+        Get config for several config ids in a single query
+        :param configids: list of config ids
+        :return: dict of configid=dict of name=value (empty if configid not found)
+        """
+        configids = list(configids)
+        configs = dict([(cid, {}) for cid in configids])
+        if len(configids) > 0:
+            qry = "SELECT configid, name, value FROM config WHERE configid IN (%s)" % ",".join(["?"] * len(configids))
+            self.c.execute(qry, configids)
+            for cid, k, val in self.c.fetchall():
+                configs[cid][k] = val
+        return configs
+
+    def getSnapshot(self, configid):
+        """
+        Get read-only snapshot of config loaded with a single query
+        :return: ConfigSnapshot (empty if configid not found)
+        """
+        config = self.getConfig(configid)
+        return ConfigSnapshot(configid, config)
+
     def getConfigALL(self, configid):
         """
         Get full dict of config for that configid/group
         :return: name=[value,description] or None
         """
-        if self.c is None:
-            self.getconn()
         self.c.execute("SELECT * FROM config WHERE configid=?",(configid,))
         config = {}
         for k,val,gp,desc in self.c.fetchall():
@@ -54,8 +253,6 @@ class DBI():
         Delete all IDs in table
         :return:
         """
-        if self.c is None:
-            self.getconn()
         if configid is None:
             cnt = self.c.execute("DELETE FROM config").rowcount
         else:
@@ -68,8 +265,6 @@ class DBI():
         :param idlist:
         :return: number of ids added (total)
         """
-        if self.c is None:
-            self.getconn()
         cids = self.getConfigIds()
         if configid in cids:
             self.deleteConfig(configid)
@@ -84,8 +279,6 @@ class DBI():
         :param sid:
         :return:
         """
-        if self.c is None:
-            self.getconn()
         self.c.execute('SELECT value FROM config WHERE configid=? AND name=?',(group,sid,))
         data = self.c.fetchone()
         if data is not None:
@@ -100,8 +293,6 @@ class DBI():
         :param sid:
         :return: array of values or empty array
         """
-        if self.c is None:
-            self.getconn()
         self.c.execute('SELECT DISTINCT configid FROM config',)
         qry = self.c.fetchall()
         data = [d[0] for d in qry]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Atomic File
+    1. Files are written to a temp file in the same directory then replace the file when complete
+       so readers (eg other workers or the next process) never see partial files
+    2. Temp files have unique names so several writers of the same file do not collide - the last one replaces it
+    3. The temp file is removed if writing fails and the file is left as it was
+    4. Written files have the usual permissions (as open) rather than private temp file permissions
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+from contextlib import contextmanager
+from os import close, chmod, remove, replace, umask
+from os.path import abspath, basename, dirname, exists
+from tempfile import mkstemp
+
+# Process umask - read once as it can only be read by setting it
+UMASK = umask(0)
+umask(UMASK)
+
+
+@contextmanager
+def atomicPath(filename):
+    """
+    Temp filename to write to - replaces filename when block completes
+    :param filename: full path filename
+    :return: temp filename (empty file)
+    """
+    filename = abspath(filename)
+    (fd, tmpfile) = mkstemp(dir=dirname(filename), prefix=basename(filename) + '.', suffix='.tmp')
+    close(fd)
+    try:
+        yield tmpfile
+        chmod(tmpfile, 0o666 & ~UMASK)
+        replace(tmpfile, filename)
+    except BaseException:
+        if exists(tmpfile):
+            remove(tmpfile)
+        raise
+
+
+@contextmanager
+def atomicOpen(filename, mode='wb', **kwargs):
+    """
+    Open temp file for writing - replaces filename when block completes (see atomicPath)
+    :param filename: full path filename
+    :param mode: write mode (as open)
+    :param kwargs: other args of open eg encoding
+    :return: open file
+    """
+    with atomicPath(filename) as tmpfile:
+        with open(tmpfile, mode, **kwargs) as f:
+            yield f
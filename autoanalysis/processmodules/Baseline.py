@@ -2,8 +2,9 @@
 """
 Normalized Baseline class
     1. Reads Traces_Processed.xlsx (created by Bleach module) and list of selected ROIs (from csv generated by Bleach and edited for selection)
+       - from a trace store (.npy) only the selected ROIs are read (see TraceStore)
     2. Subtracts bleach data from traces
-    3. Outputs data to excel (with raw, processed tabs) - including Time
+    3. Outputs data to excel (with raw, processed tabs) - including Time - or to binary container if .npz (see Container)
     4. Generates list of ROIs for selection
     5. Generates plots of each ROI as interactive html plots - multiple pages of 9 plots per page
 
@@ -19,11 +20,14 @@ import sys
 from os.path import join, basename, splitext
 from os import access,R_OK
 from collections import OrderedDict
+from multiprocessing import Pool, current_process
 import pandas as pd
 import numpy as np
 import xlsxwriter
 from autoanalysis.db.dbquery import DBI
 from autoanalysis.processmodules.DataParser import AutoData
+from autoanalysis.processmodules.Plotting import writeOverlay
+from autoanalysis.processmodules.TraceStore import isTraceStore, TraceStore
 import plotly.graph_objs as go
 from plotly import tools
 from plotly import offline
@@ -34,6 +38,85 @@ from matplotlib import pylab
 
 
 
+def estimateDecay(t, Y, mask):
+    """
+    Log-linear initial estimates of y = A*exp(-b*t) + c for each row of Y
+    - offset estimated just below the minimum of each trace then log(y-c) fitted as a line
+    :param t: time from peak per point (ROI x points)
+    :param Y: values (ROI x points)
+    :param mask: points in fit window (ROI x points)
+    :return: array of (A, b, c) per ROI
+    """
+    w = mask.astype(float)
+    ymax = np.where(mask, Y, -np.inf).max(axis=1)
+    ymin = np.where(mask, Y, np.inf).min(axis=1)
+    c = ymin - 0.01 * np.abs(ymax - ymin) - 1e-12
+    z = np.log(np.maximum(np.where(mask, Y, 0) - c[:, np.newaxis], 1e-12))
+    n = w.sum(axis=1)
+    st = (w * t).sum(axis=1)
+    stt = (w * t * t).sum(axis=1)
+    sz = (w * z).sum(axis=1)
+    stz = (w * t * z).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (n * stz - st * sz) / (n * stt - st * st)
+        intercept = (sz - slope * st) / n
+    slope = np.where(np.isfinite(slope), slope, 0)
+    intercept = np.where(np.isfinite(intercept), intercept, 0)
+    return np.column_stack((np.exp(intercept), -slope, c))
+
+
+def fitDecayBatch(args):
+    """
+    Fit y = A*exp(-b*t) + c to each row of Y with batched Levenberg-Marquardt iterations
+    - at module level so chunks of ROIs can be sent to a worker process
+    :param args: tuple of (t, Y, mask, maxiter)
+    :return: array of (A, b, c, R2) per ROI - NaN if not enough points to fit
+    """
+    (t, Y, mask, maxiter) = args
+    nrois = Y.shape[0]
+    w = mask.astype(float)
+    Y = np.where(mask, Y, 0)
+    p = estimateDecay(t, Y, mask)
+    lam = np.full(nrois, 1e-3)
+    eye = np.eye(3)
+
+    def sse(p):
+        r = w * (Y - (p[:, 0:1] * np.exp(-p[:, 1:2] * t) + p[:, 2:3]))
+        return (r * r).sum(axis=1)
+
+    err = sse(p)
+    active = np.ones(nrois, dtype=bool)
+    for i in range(maxiter):
+        e = np.exp(-p[:, 1:2] * t)
+        r = w * (Y - (p[:, 0:1] * e + p[:, 2:3]))
+        J = np.stack((w * e, -w * p[:, 0:1] * t * e, w), axis=2)
+        JtJ = np.einsum('rpi,rpj->rij', J, J)
+        Jtr = np.einsum('rpi,rp->ri', J, r)
+        A = JtJ + lam[:, np.newaxis, np.newaxis] * (JtJ * eye) + 1e-12 * eye
+        step = np.linalg.solve(A, Jtr[:, :, np.newaxis])[:, :, 0]
+        step[~active] = 0
+        pnew = p + step
+        errnew = sse(pnew)
+        better = np.isfinite(errnew) & (errnew < err)
+        # converged when no longer improving relative to current error
+        done = better & ((err - errnew) <= 1e-10 * np.maximum(err, 1e-30))
+        p = np.where(better[:, np.newaxis], pnew, p)
+        err = np.where(better, errnew, err)
+        lam = np.where(better, lam / 10, lam * 10)
+        active &= ~done & (lam < 1e10)
+        if not active.any():
+            break
+    # Goodness of fit
+    n = w.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ymean = (w * Y).sum(axis=1) / n
+        sstot = (w * (Y - ymean[:, np.newaxis]) ** 2).sum(axis=1)
+        r2 = 1 - err / sstot
+    results = np.column_stack((p, r2))
+    results[n < 3] = np.nan
+    return results
+
+
 class Normalized(AutoData):
     """
     Filter class for filtering a dataset based on a single column of data between min and max limits
@@ -43,15 +126,13 @@ class Normalized(AutoData):
         try:
             sheet = 'bleach subtracted'
             super().__init__(datafile, sheet, skiprows, headers)
-            msg = "BASELINE: Subtracted Data loaded from %s" % self.datafile
-            self.logandprint(msg)
-            self.sheet='raw'
-            self.rawdata = self.load_data()
-            msg = "BASELINE: Raw Data loaded  from %s" % self.datafile
-            self.logandprint(msg)
             # Output
             self.outputdir = outputdir
             self.showplots = showplots
+            # Output sheets per output file
+            self.outputs = {}
+            # Trace store if input is .npy (see loadData)
+            self.store = None
             # Set config defaults
             self.cfg = self.getConfigurables()
         except IOError as e:
@@ -61,14 +142,53 @@ class Normalized(AutoData):
             self.logandprint(e.args[0])
             raise e
 
+    @property
+    def rawdata(self):
+        """
+        Raw data sheet - loaded on first access
+        :return: dataframe
+        """
+        if 'raw' not in self.sheets:
+            self.loadData()
+        return self.getSheet('raw')
+
+    def loadData(self):
+        """
+        Load both sheets from workbook (opened once)
+        - or for a trace store, only per frame columns as raw data with traces read as selected (see getTraces)
+        """
+        if self.store is None and isTraceStore(self.datafile) and self.sheet not in self.sheets:
+            self.store = TraceStore(self.datafile)
+            self.sheets['raw'] = self.store.frames
+            msg = "BASELINE: Trace store opened %s (%d frames x %d ROIs)" % (self.datafile, self.store.shape[0], self.store.shape[1])
+            self.logandprint(msg)
+            return
+        self.getSheets([self.sheet, 'raw'])
+        msg = "BASELINE: Subtracted and Raw Data loaded from %s" % self.datafile
+        self.logandprint(msg)
+
+    def getTraces(self, roilist, start=None, stop=None):
+        """
+        Traces of selected ROIs for a window of frames - from trace store only these ROIs and frames are read
+        run reads all frames as the normalized and max depleted outputs, the average fit
+        and the search for the max (last half of each trace) cover the whole trace
+        :param roilist: list of ROI names
+        :param start: first frame (default 0)
+        :param stop: frame after last (default all)
+        :return: dataframe of frame x ROI
+        """
+        if self.store is not None:
+            return self.store.getTraces(roilist, start, stop)
+        return self.data[roilist].iloc[start:stop]
+
     def getConfigurables(self):
         '''
         List of configurable parameters in order with defaults
         :return:
         '''
         cfg = OrderedDict()
-        cfg['EXPT_EXCEL'] = '_Processed.xlsx'
-        cfg['EXPT_NORM'] = '_Normalized.xlsx'
+        cfg['EXPT_EXCEL'] = '_Processed.xlsx' # or .npz container or .npy trace store as output by Bleach
+        cfg['EXPT_NORM'] = '_Normalized.xlsx' # or .npz for binary container (see Container)
         #cfg['ROI_FILE'] = "_ROIlist.csv"
         cfg['SELECTED_ROIS'] = "_ROIlist_selected.csv"
         cfg['STIM_BELOW'] = 10
@@ -76,6 +196,11 @@ class Normalized(AutoData):
         cfg['MAX_BELOW'] = 5
         cfg['MAX_ABOVE'] = 6
         cfg['FIT_DECAY_PERIOD']=0.75 # Use 75% of trace for fitting decay
+        cfg['FIT_ROIS'] = False # Also fit decay to each ROI
+        cfg['FIT_PROCESSES'] = 1 # Number of processes for fitting ROIs
+        cfg['OVERLAY_POINTS'] = 2000 # Max points per trace in overlay plot (0 for all)
+        cfg['OVERLAY_BAND'] = False # Show ROIs in overlay as percentile bands (5-95%, 25-75%)
+        cfg['OVERLAY_ROIS'] = '' # ROIs also shown as individual traces with bands (comma separated)
 
         return cfg
 
@@ -112,14 +237,6 @@ class Normalized(AutoData):
         outputfile = join(self.outputdir,filename)
         return outputfile
 
-    def outputExcelData(self, outputfile,all):
-        writer = pd.ExcelWriter(outputfile, engine='xlsxwriter')
-        for field in all.keys():
-            df_all = all[field]
-            df_all.to_excel(writer, index=False, sheet_name=field)
-        else:
-            return outputfile
-
     def generatePlots(self,xt, df, title,outputfile):
         # Scatter plots
         fig = tools.make_subplots(rows=3, cols=3, shared_xaxes=True, subplot_titles=df.columns)
@@ -142,48 +259,16 @@ class Normalized(AutoData):
         return fig
 
     def generateOverlay(self, xt, df, title, outputfile, df_fit=None):
-        # Scatter plots
-        data = []
-
-        for col in df.columns:
-            if col.startswith('ROI'):
-                data.append(
-                    go.Scatter(
-                        x=xt,
-                        y=df[col].values,
-                        name=col,
-                        mode='markers'
-                    ))
-            elif col=='Average':
-                # Add Average with SD TODO
-                data.append(
-                    go.Scatter(
-                        x=xt,
-                        y=df[col].values,
-                        error_y=dict(
-                            type='data',
-                            array=df['SD'],
-                            visible=True),
-                        name=col,
-                        mode='lines+markers'
-                    ))
-        if df_fit is not None:
-            data.append(go.Scatter(
-                x=df_fit['x'].values,
-                y=df_fit['y_fit'].values,
-                name='Fit decay',
-                line=dict(
-                    color=('rgb(229, 61, 89)'),
-                    width=3)
-            ))
-        layout = dict(title=title,
-                      xaxis=dict(title='Time(s)'),
-                      yaxis=dict(title='Signal'),
-                      )
-
-        fig = dict(data=data, layout=layout)
-        offline.plot(fig, filename=outputfile)
-        return data
+        """
+        Overlay of ROIs with Average and fit - WebGL traces downsampled to OVERLAY_POINTS per trace
+        ROIs are shown as percentile bands if OVERLAY_BAND with any OVERLAY_ROIS as individual traces
+        """
+        npoints = int(self.cfg['OVERLAY_POINTS']) if self.cfg['OVERLAY_POINTS'] is not None else 0
+        band = str(self.cfg['OVERLAY_BAND']).lower() in ['true', '1', 'y', 'yes']
+        rois = self.cfg['OVERLAY_ROIS']
+        if isinstance(rois, str):
+            rois = [r.strip() for r in rois.split(',') if len(r.strip()) > 0]
+        self.addPlot(writeOverlay, xt, df, title, outputfile, df_fit, npoints, band, rois)
 
     def loadROIlist(self,roifile):
         try:
@@ -263,6 +348,76 @@ class Normalized(AutoData):
         col = col/avg
         return col
 
+    def getWindowMeans(self, values, start, stop):
+        """
+        Mean of each row of values over its own window [start:stop] - as for np.mean(col.iloc[start:stop])
+        Windows follow python slice rules (negative start counts from end) and NaNs are skipped
+        :param values: ROI x frame array
+        :param start: array of window starts per ROI
+        :param stop: array of window stops per ROI (not included)
+        :return: array of means per ROI
+        """
+        (nrois, n) = values.shape
+        # Convert to bounds as slice(start,stop).indices(n)
+        start = np.where(start < 0, np.maximum(start + n, 0), np.minimum(start, n))
+        stop = np.where(stop < 0, np.maximum(stop + n, 0), np.minimum(stop, n))
+        stop = np.maximum(stop, start)
+        width = int(np.max(stop - start)) if nrois > 0 else 0
+        positions = start[:, np.newaxis] + np.arange(width)
+        valid = positions < stop[:, np.newaxis]
+        window = values[np.arange(nrois)[:, np.newaxis], np.minimum(positions, max(n - 1, 0))]
+        valid &= ~np.isnan(window)
+        counts = valid.sum(axis=1)
+        sums = np.where(valid, window, 0).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        means[counts == 0] = np.nan
+        return means
+
+    def subtractAvgAll(self, df, idx, below=0, above=0):
+        """
+        Subtracts Avg above/below idx for all ROI columns at once (see subtractAvg)
+        :param df: dataframe of ROI columns
+        :param idx: stimulus index
+        :param below:
+        :param above:
+        :return: dataframe with baseline subtracted
+        """
+        values = df.values.astype(float).T
+        nrois = values.shape[0]
+        start = np.full(nrois, idx - below, dtype=int)
+        stop = np.full(nrois, idx + above, dtype=int)
+        avg = self.getWindowMeans(values, start, stop)
+        values = values - avg[:, np.newaxis]
+        return pd.DataFrame(values.T, index=df.index, columns=df.columns)
+
+    def divideMaxAvgAll(self, df, below=0, above=0):
+        """
+        Finds Depleted Max (> half-way in trace) for all ROI columns at once (see divideMaxAvg)
+        Calculates Max Avg above/below idx.
+        Divides values by max avg
+        :param df: dataframe of ROI columns
+        :param below: from this
+        :param above: upto but not including this
+        :return: dataframe divided by max avg
+        """
+        values = df.values.astype(float).T
+        n = values.shape[1]
+        lasthalf = int(n / 2)
+        # first frame matching max of last half (as index label)
+        maxvals = np.max(values[:, lasthalf:], axis=1)
+        idx = df.index.values[np.argmax(values == maxvals[:, np.newaxis], axis=1)].astype(int)
+        # If upper limit is more than rows > shift idx by difference (TODO check)
+        shift = (idx + above) - n
+        for i in np.flatnonzero(shift > 0):
+            msg = 'Warning: Max index for %s shifted by %d' % (df.columns[i], shift[i])
+            self.logandprint(msg)
+        idx = np.where(shift > 0, idx - shift, idx)
+        avg = self.getWindowMeans(values, idx - below, idx + above)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = values / avg[:, np.newaxis]
+        return pd.DataFrame(values.T, index=df.index, columns=df.columns)
+
     def exp_func(self,x, a, b, c):
         return a * np.exp(-b * x) + c
 
@@ -285,6 +440,54 @@ class Normalized(AutoData):
         df = pd.DataFrame.from_dict({'x': x, 'y': y, 'y_fit': self.exp_func(x, *popt)})
         return (peak,tau,df )
 
+    def fitDecayROIs(self, xdata, df, period=0.75, processes=1, maxiter=200):
+        """
+        Fit decay to each ROI from its own peak within expt period (as fitDecay) - all ROIs fitted together
+        :param xdata: time
+        :param df: dataframe of ROI columns
+        :param period: proportion of trace used for fitting
+        :param processes: number of worker processes to split ROIs over (serial if already in a worker process)
+        :param maxiter: max iterations of solver
+        :return: dataframe of ROI kinetics (one row per ROI)
+        """
+        values = df.values.astype(float).T
+        expt_period = int(round(values.shape[1] * period, 0))
+        Y = values[:, 0:expt_period]
+        x = np.asarray(xdata, dtype=float)[0:expt_period]
+        # fit from peak of each ROI
+        peak_idx = np.argmax(np.where(np.isnan(Y), -np.inf, Y), axis=1)
+        peak = Y[np.arange(len(Y)), peak_idx]
+        mask = (np.arange(expt_period) >= peak_idx[:, np.newaxis]) & ~np.isnan(Y)
+        t = x[np.newaxis, :] - x[peak_idx][:, np.newaxis]
+        if processes > 1 and current_process().daemon:
+            # already in a worker of a parallel run (NUM_PROCESSES) - workers cannot start processes
+            msg = "Fitting ROIs in this process - running in a worker process"
+            self.logandprint(msg)
+            processes = 1
+        if processes > 1 and len(Y) > processes:
+            chunks = np.array_split(np.arange(len(Y)), processes)
+            tasks = [(t[c], Y[c], mask[c], maxiter) for c in chunks]
+            pool = Pool(processes=processes)
+            try:
+                results = np.vstack(pool.map(fitDecayBatch, tasks))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = fitDecayBatch((t, Y, mask, maxiter))
+        with np.errstate(divide='ignore'):
+            tau = 1 / results[:, 1]
+        df_rois = pd.DataFrame(OrderedDict([('ROI', df.columns),
+                                            ('Peak', peak),
+                                            ('Peak Time', x[peak_idx]),
+                                            ('Amplitude', results[:, 0]),
+                                            ('Tau', tau),
+                                            ('Offset', results[:, 2]),
+                                            ('R2', results[:, 3])]))
+        msg = "Fitted decay for %d ROIs" % len(df_rois)
+        self.logandprint(msg)
+        return df_rois
+
     def fitPolynomial(self, xdata, ydata,deg=3):
         """
         Estimate polynomial fits of data - ?useful
@@ -304,19 +507,22 @@ class Normalized(AutoData):
         Insert and subtract bleachdata from data
         :return:
         """
-        if not self.data.empty:
+        self.loadData()
+        if self.store is not None or not self.data.empty:
             #Get selected ROIs from list
-            roilist = self.loadROIlist(self.getFilename('SELECTED_ROIS'))
-            df_selected = self.data[roilist]
+            roifile = self.getFilename('SELECTED_ROIS')
+            roilist = self.loadROIlist(roifile)
+            self.inputfiles.append(roifile)
+            df_selected = self.getTraces(roilist)
             # Normalize to baseline
             #Get stimulus index
             stimidx = self.getStimulusIndex()
             #Average 10 frames before stim for each ROI and subtract
-            df_norm = df_selected.apply(lambda col: self.subtractAvg(col,stimidx,
-                                        int(self.cfg['STIM_BELOW']),int(self.cfg['STIM_ABOVE'])))
+            df_norm = self.subtractAvgAll(df_selected,stimidx,
+                                          int(self.cfg['STIM_BELOW']),int(self.cfg['STIM_ABOVE']))
             #print("Normalized data: \n", df_norm)
             # Find max in normalized data
-            df_max = df_norm.apply(lambda col: self.divideMaxAvg(col,int(self.cfg['MAX_BELOW']),int(self.cfg['MAX_ABOVE'])))
+            df_max = self.divideMaxAvgAll(df_norm,int(self.cfg['MAX_BELOW']),int(self.cfg['MAX_ABOVE']))
             # Add Average data
             df_max['Average'] = df_max.mean(axis=1)
             df_max['SD'] = df_max.std(axis=1)
@@ -328,18 +534,29 @@ class Normalized(AutoData):
             (amplitude,tau, df_fit) = self.fitDecay(xdata,ydata,period)
 
             # Save data
-            all={'raw': self.rawdata, 'bleach subtracted': self.data, 'normalized': df_norm, 'max_depleted':df_max, 'fit_decay': df_fit}
+            if self.store is not None:
+                # traces stay in store
+                all = {'normalized': df_norm, 'max_depleted': df_max, 'fit_decay': df_fit}
+            else:
+                all={'raw': self.rawdata, 'bleach subtracted': self.data, 'normalized': df_norm, 'max_depleted':df_max, 'fit_decay': df_fit}
+            # Fit decay to each ROI
+            if str(self.cfg['FIT_ROIS']).lower() in ['true', '1', 'y', 'yes']:
+                processes = int(self.cfg['FIT_PROCESSES']) if self.cfg['FIT_PROCESSES'] is not None else 1
+                all['fit_rois'] = self.fitDecayROIs(xdata, df_max[roilist], period, processes)
             outputfile = self.getFilename('EXPT_NORM')
-            self.outputExcelData(outputfile, all)
+            # container of input only needs new tables
+            self.outputData(outputfile, all, self.datafile, ['raw', 'bleach subtracted'])
+            self.outputfiles.append(outputfile)
+            self.outputs[outputfile] = all
             print('Normalized data saved to: ', outputfile)
             #Plot overlay
             if self.showplots:
                 title = self.bname + ': ROIs normalized baseline and max depleted'
                 if tau is not None:
                     title += ' [Fit amplitude=%0.2f tau=%0.4f]' % (amplitude,tau)
-                plotfilename = outputfile.replace('.xlsx', '.html')
-                if 'Time' in self.data.columns:
-                    xt = self.data['Time']
+                plotfilename = splitext(outputfile)[0] + '.html'
+                if 'Time' in self.rawdata.columns:
+                    xt = self.rawdata['Time']
                     self.generateOverlay(xt,df_max, title, plotfilename, df_fit)
         else:
             print("No data found: ", self.datafile)
@@ -43,6 +43,8 @@ class AutoBatch:
         self.showplots = showplots
         self.n = 1  # generating id
         self.prefix =''
+        # Files written by run - recorded for incremental reruns (see Manifest)
+        self.outputfiles = []
 
     def getConfigurables(self):
         '''
@@ -56,7 +58,9 @@ class AutoBatch:
 
     def setConfigurables(self,cfg):
         if 'BATCH_COLUMN_NAMES' in cfg.keys() and cfg['BATCH_COLUMN_NAMES'] is not None:
-            self.colnames = cfg['BATCH_COLUMN_NAMES'].split(',')
+            self.colnames = cfg['BATCH_COLUMN_NAMES']
+            if not isinstance(self.colnames, list):
+                self.colnames = self.colnames.split(',')
         else:
             self.colnames =[]
         if 'BATCH_FILENAME' in cfg.keys() and cfg['BATCH_FILENAME'] is not None:
@@ -152,9 +156,11 @@ class AutoBatch:
                 fparts = [self.prefix] + fparts
             outputfilename = join(self.outputdir, "_".join(fparts))
             df.to_csv(outputfilename,index=False)
+            self.outputfiles.append(outputfilename)
             if self.showplots:
                 plotfilename = outputfilename.replace('.csv','.html')
                 self.generatePlots(df,plotfilename)
+                self.outputfiles.append(plotfilename)
         return outputfilename
 
 ################################################################################
@@ -4,9 +4,13 @@ Bleach class
     1. Read INPUTFILES as CSV (Traces data, Bleach data)
     - expects Time,Frame colums in Traces data and Average in Bleach data
     2. Subtracts bleach data from traces
-    3. Outputs data to excel (with raw, processed tabs) - including Time
+    3. Outputs data to excel (with raw, processed tabs) - including Time - or to binary container if .npz (see Container)
+       or, if .npy, subtracted traces only to a memory mapped trace store (see TraceStore)
     4. Generates list of ROIs for selection
     5. Generates plots of each ROI as interactive html plots - multiple pages of 9 plots per page
+    6. Optionally generates png contact sheets of all ROIs for checking ROIs before selection
+    7. Long recordings can be processed in chunks of rows (CHUNKSIZE) - each chunk is written to excel
+       as it is processed so memory depends on chunk size rather than recording length (no plots)
 
 
 Created on 23 Feb 2018
@@ -20,10 +24,15 @@ import sys
 from os.path import join, basename, splitext
 from os import access,R_OK
 from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import xlsxwriter
 from autoanalysis.db.dbquery import DBI
 from autoanalysis.processmodules.DataParser import AutoData
+from autoanalysis.processmodules.ExcelExport import ExcelStream
+from autoanalysis.processmodules.Container import isContainer
+from autoanalysis.processmodules.TraceStore import isTraceStore, saveTraces
+from autoanalysis.processmodules.Plotting import writeROIViewer, writeROIPages, writeContactSheets
 import plotly.graph_objs as go
 from plotly import tools
 from plotly import offline
@@ -37,13 +46,11 @@ class Bleach(AutoData):
         # Load data
         try:
             super().__init__(datafile, sheet, skiprows, headers)
-            #remove any extra lines
-            self.data = self.data.dropna()
-            msg = "BLEACH: Data loaded from %s" % self.datafile
-            self.logandprint(msg)
             # Output
             self.outputdir = outputdir
             self.showplots = showplots
+            # Output sheets per output file - passed on in memory in pipelines
+            self.outputs = {}
             # Set config defaults
             self.cfg = self.getConfigurables()
         except IOError as e:
@@ -53,15 +60,30 @@ class Bleach(AutoData):
             self.logandprint(e.args[0])
             raise e
 
+    def loadSheet(self, sheet):
+        """
+        Load data on first access
+        :param sheet: sheet name or number (ignored for csv)
+        :return: dataframe
+        """
+        #remove any extra lines
+        data = super().loadSheet(sheet).dropna()
+        msg = "BLEACH: Data loaded from %s" % self.datafile
+        self.logandprint(msg)
+        return data
+
     def getConfigurables(self):
         '''
         List of configurable parameters in order with defaults
         :return:
         '''
         cfg = OrderedDict()
-        cfg['EXPT_EXCEL']='_Processed.xlsx'
+        cfg['EXPT_EXCEL']='_Processed.xlsx' # or .npz for binary container (see Container) or .npy for trace store (see TraceStore)
         cfg['ROI_FILE'] = '_ROIlist.csv'
         cfg['BLEACH_FILENAME'] = 'Bleach Time Trace(s).csv'
+        cfg['PLOT_VIEWER'] = False # Single paged html of all ROIs (otherwise an html file per 9 ROIs)
+        cfg['PLOT_SHEETS'] = False # PNG contact sheets of all ROIs (100 per sheet) - with or without showplots
+        cfg['CHUNKSIZE'] = 0 # Rows per chunk for processing csv in chunks (0 to load whole file)
         return cfg
 
     def setConfigurables(self,cfg):
@@ -76,14 +98,6 @@ class Bleach(AutoData):
             self.cfg[cf]= cfg[cf]
         self.logandprint("Config loaded")
 
-    def outputExcelData(self, outputfile,all):
-        writer = pd.ExcelWriter(outputfile, engine='xlsxwriter')
-        for field in all.keys():
-            df_all = all[field]
-            df_all.to_excel(writer, index=False, sheet_name=field)
-        else:
-            return outputfile
-
     def generatePlots(self,xt, df, title,outputfile):
         # Scatter plots
         fig = tools.make_subplots(rows=3, cols=3, shared_xaxes=True, subplot_titles=df.columns)
@@ -112,6 +126,7 @@ class Bleach(AutoData):
                 if v.startswith('ROI'):
                     myfile.write(v)
                     myfile.write('\n')
+        self.outputfiles.append(roifile)
         msg = "ROI list saved: %s" % roifile
         self.logandprint(msg)
 
@@ -139,12 +154,19 @@ class Bleach(AutoData):
         """
         # Load bleach data
         bleachdatafile = self.getFilename('BLEACH_FILENAME', input=True)
-        if access(bleachdatafile,R_OK):
-            self.bleachdata = pd.read_csv(bleachdatafile, skip_blank_lines=True)
-            msg = "BLEACH: Data loaded  from %s" % bleachdatafile
-            self.logandprint(msg)
-        else:
+        if not access(bleachdatafile,R_OK):
             raise IOError('Bleach data not accessible:', bleachdatafile)
+        self.inputfiles.append(bleachdatafile)
+        chunksize = int(self.cfg['CHUNKSIZE']) if self.cfg['CHUNKSIZE'] is not None else 0
+        if chunksize > 0 and self.extension == '.csv':
+            if not isContainer(self.cfg['EXPT_EXCEL']) and not isTraceStore(self.cfg['EXPT_EXCEL']):
+                self.runChunked(bleachdatafile, chunksize)
+                return
+            msg = "BLEACH: CHUNKSIZE ignored for container or trace store output - data loaded whole"
+            self.logandprint(msg)
+        self.bleachdata = pd.read_csv(bleachdatafile, skip_blank_lines=True)
+        msg = "BLEACH: Data loaded  from %s" % bleachdatafile
+        self.logandprint(msg)
         if not self.data.empty:
             #subtract per row
             hdrs = [h for h in self.data.columns if h.startswith('ROI')]
@@ -156,9 +178,17 @@ class Bleach(AutoData):
             traces = {'raw': self.data, 'bleach subtracted': df_subtracted}
             try:
                 outputfile = self.getFilename('EXPT_EXCEL')
-                self.outputExcelData(outputfile,traces)
+                if isTraceStore(outputfile):
+                    # raw traces are in input - per frame columns kept with subtracted traces
+                    frames = self.data[[c for c in self.data.columns if c not in hdrs]]
+                    self.outputfiles += saveTraces(outputfile, df_subtracted[hdrs], frames)
+                else:
+                    self.outputData(outputfile,traces)
+                    self.outputfiles.append(outputfile)
                 msg = "Subtracted Data saved: %s" % outputfile
                 self.logandprint(msg)
+                # As loaded from excel output
+                self.outputs[outputfile] = {k: traces[k].reset_index(drop=True) for k in traces.keys()}
                 # Save ROI list to csv
                 self.saveROIlist(df_subtracted.columns.tolist())
 
@@ -168,28 +198,79 @@ class Bleach(AutoData):
                         xt = df_subtracted['Time']
                     else:
                         raise ValueError('Time column is missing - no plots generated')
-                    pagenum =1
-                    start=0
-                    endplot = 0
-                    n = len(df_subtracted.columns)
-                    for endplot in range(start,n,9):
-                        if endplot ==0:
-                            continue
-                        plotfilename = outputfile.replace('.xlsx',"_"+ str(pagenum) + '.html')
-                        self.generatePlots(xt,df_subtracted[df_subtracted.columns[start:endplot]], title, plotfilename)
-                        msg = "Subtracted Data plots: %s" % plotfilename
-                        self.logandprint(msg)
-                        pagenum += 1
-                        start += 9
-                    #remaining plots
-                    if endplot < n-1:
-                        plotfilename = outputfile.replace('.xlsx', "_" + str(pagenum) + '.html')
-                        self.generatePlots(xt, df_subtracted[df_subtracted.columns[endplot:n-1]], title, plotfilename)
-                        msg = "Subtracted Data plots: %s" % plotfilename
-                        self.logandprint(msg)
+                    plotfilename = splitext(outputfile)[0] + '.html'
+                    if str(self.cfg['PLOT_VIEWER']).lower() in ['true', '1', 'y', 'yes']:
+                        self.addPlot(writeROIViewer, xt, df_subtracted[hdrs], title, plotfilename)
+                    else:
+                        self.addPlot(writeROIPages, xt, df_subtracted[hdrs], title, plotfilename)
+                    msg = "Subtracted Data plots: %s" % plotfilename
+                    self.logandprint(msg)
+                if str(self.cfg['PLOT_SHEETS']).lower() in ['true', '1', 'y', 'yes']:
+                    title = self.bname + ': ROIs with Bleach Subtracted'
+                    if 'Time' in df_subtracted.columns:
+                        xt = df_subtracted['Time']
+                    else:
+                        xt = df_subtracted.index
+                    sheetfile = splitext(outputfile)[0] + '_ROIs.png'
+                    self.addPlot(writeContactSheets, xt, df_subtracted[hdrs], title, sheetfile)
+                    msg = "Subtracted Data contact sheets: %s" % sheetfile
+                    self.logandprint(msg)
             except IOError as e:
                 raise e
 
+    def runChunked(self, bleachdatafile, chunksize):
+        """
+        Subtract bleach data from traces in aligned chunks of rows - output as run
+        Each chunk is written to excel before the next is read (outputs are not kept for pipelines)
+        :param bleachdatafile: bleach data csv
+        :param chunksize: number of rows per chunk
+        :return: output file
+        """
+        outputfile = self.getFilename('EXPT_EXCEL')
+        # Frame is text as when loaded whole (STIM marker) - not only in the chunk with the marker
+        dtype = None
+        if 'Frame' in pd.read_csv(self.datafile, nrows=0).columns:
+            dtype = {'Frame': str}
+        traces = pd.read_csv(self.datafile, skip_blank_lines=True, chunksize=chunksize, dtype=dtype)
+        bleach = pd.read_csv(bleachdatafile, skip_blank_lines=True, chunksize=chunksize)
+        rows = 0
+        excel = ExcelStream(outputfile)
+        try:
+            for data in traces:
+                bleachdata = next(bleach, None)
+                # rows are aligned by index as read (continues over chunks)
+                if bleachdata is None:
+                    average = pd.Series(np.nan, index=data.index)
+                else:
+                    average = bleachdata['Average']
+                #remove any extra lines
+                data = data.dropna()
+                hdrs = [h for h in data.columns if h.startswith('ROI')]
+                df_subtracted = data[hdrs].subtract(average, axis=0)
+                data['Bleach Average'] = average
+                if 'Time' in data.columns:
+                    df_subtracted['Time'] = data['Time']
+                if rows == 0:
+                    excel.addSheet('raw', data.columns)
+                    excel.addSheet('bleach subtracted', df_subtracted.columns)
+                    # Save ROI list to csv
+                    self.saveROIlist(df_subtracted.columns.tolist())
+                excel.writeBlock('raw', data.values)
+                rows += excel.writeBlock('bleach subtracted', df_subtracted.values)
+        finally:
+            excel.close()
+            traces.close()
+            bleach.close()
+        if rows == 0:
+            raise ValueError("Data not loaded - check datafile")
+        self.outputfiles.append(outputfile)
+        msg = "Subtracted Data saved: %s (%d rows in chunks of %d)" % (outputfile, rows, chunksize)
+        self.logandprint(msg)
+        if self.showplots or str(self.cfg['PLOT_SHEETS']).lower() in ['true', '1', 'y', 'yes']:
+            msg = "BLEACH: Plots not generated for data processed in chunks (CHUNKSIZE)"
+            self.logandprint(msg)
+        return outputfile
+
 def create_parser():
     """
     Create commandline parser
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Experiment Container
+    1. Binary alternative to the excel outputs - used when the output filename in config ends with .npz
+       eg EXPT_EXCEL=_Processed.npz, EXPT_NORM=_Normalized.npz
+    2. Holds tables (as excel sheets) in a numpy npz: numeric columns as one float array per table,
+       text columns (eg Frame with STIM marker) as a string array with a mask of missing values and metadata as json
+       - int and bool columns are listed in metadata and restored to their type
+    3. Tables are loaded individually so only the tables needed are read
+    4. A container can link to tables in its source container (eg raw data) so data is stored once per experiment
+       - the source size and modification time are stored so a changed source is not read as the original
+       - source tables are copied if the source cannot be linked (eg on another drive)
+    5. Excel is exported on demand (toExcel) - run as script with container files
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import argparse
+import json
+import sys
+from collections import OrderedDict
+from os import stat
+from os.path import join, dirname, relpath, splitext
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.ExcelExport import writeExcel
+from autoanalysis.processmodules.AtomicFile import atomicOpen
+
+CONTAINER_EXT = '.npz'
+CONTAINER_VERSION = 2
+
+
+def isContainer(filename):
+    """
+    Check if filename is a container
+    :param filename: filename
+    :return: true if .npz
+    """
+    return splitext(filename)[1].lower() == CONTAINER_EXT
+
+
+def getStat(filename):
+    """
+    Size and modification time of file - to check a linked source is unchanged
+    :return: dict of size, mtime (ns)
+    """
+    st = stat(filename)
+    return {'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+
+def saveContainer(outputfile, tables, source=None, sourcetables=None, attrs=None):
+    """
+    Save tables to container (see atomicOpen)
+    :param outputfile: full path filename (.npz)
+    :param tables: dict of table name: dataframe
+    :param source: container with tables used by this one (eg input container)
+    :param sourcetables: list of tables in source to be included with these (eg on export)
+    :param attrs: dict of other metadata (json)
+    :return: outputfile
+    """
+    link = None
+    if source is not None:
+        try:
+            # relative so outputs can be moved together
+            link = relpath(source, dirname(outputfile))
+        except ValueError:
+            # eg on another drive - source tables copied instead of linked
+            tables = OrderedDict(list(loadContainer(source, sourcetables).items()) + list(tables.items()))
+            (source, sourcetables) = (None, None)
+    arrays = {}
+    metadata = {'version': CONTAINER_VERSION,
+                'tables': OrderedDict(),
+                'source': link,
+                'sourcestat': getStat(source) if source is not None else None,
+                'sourcetables': sourcetables if sourcetables is not None else [],
+                'attrs': attrs if attrs is not None else {}}
+    for (i, name) in enumerate(tables.keys()):
+        df = tables[name]
+        numeric = [c for c in df.columns if df[c].dtype.kind in 'fiub']
+        text = [c for c in df.columns if c not in numeric]
+        metadata['tables'][name] = {'columns': [str(c) for c in df.columns],
+                                    'numeric': [str(c) for c in numeric],
+                                    'int': [str(c) for c in numeric if df[c].dtype.kind in 'iu'],
+                                    'bool': [str(c) for c in numeric if df[c].dtype.kind == 'b'],
+                                    'text': [str(c) for c in text]}
+        arrays['table%d' % i] = df[numeric].values.astype(float)
+        if len(text) > 0:
+            arrays['table%d_text' % i] = df[text].astype(str).values.astype(np.str_)
+            # missing values are not stored as text 'nan'
+            arrays['table%d_null' % i] = df[text].isnull().values
+    arrays['metadata'] = np.array(json.dumps(metadata))
+    with atomicOpen(outputfile) as f:
+        np.savez(f, **arrays)
+    return outputfile
+
+
+def getMetadata(filename):
+    """
+    Metadata of container
+    :param filename: container file
+    :return: dict with tables (name: columns) and source
+    """
+    with np.load(filename) as npz:
+        return json.loads(str(npz['metadata']), object_pairs_hook=OrderedDict)
+
+
+def getTableNames(filename):
+    """
+    Tables in container - not including linked source tables
+    :return: list of names
+    """
+    return list(getMetadata(filename)['tables'].keys())
+
+
+def loadTable(filename, name=0):
+    """
+    Load a table from container
+    :param filename: container file
+    :param name: table name or number (as sheets of excel)
+    :return: dataframe
+    """
+    with np.load(filename) as npz:
+        metadata = json.loads(str(npz['metadata']), object_pairs_hook=OrderedDict)
+        names = list(metadata['tables'].keys())
+        if isinstance(name, int):
+            if name >= len(names):
+                raise ValueError("Table %d not found in %s" % (name, filename))
+            name = names[name]
+        if name not in names:
+            if name in metadata['sourcetables'] and metadata['source'] is not None:
+                source = join(dirname(filename), metadata['source'])
+                if metadata.get('sourcestat') is not None and getStat(source) != metadata['sourcestat']:
+                    raise ValueError("Source of %s has changed since it was written - rerun to update: %s"
+                                     % (filename, source))
+                return loadTable(source, name)
+            raise ValueError("Table %s not found in %s" % (name, filename))
+        i = names.index(name)
+        table = metadata['tables'][name]
+        df = pd.DataFrame(npz['table%d' % i], columns=table['numeric'])
+        for c in table['int']:
+            if not df[c].isnull().any():
+                df[c] = df[c].astype(int)
+        # not in version 1
+        for c in table.get('bool', []):
+            df[c] = df[c].astype(bool)
+        if len(table['text']) > 0:
+            text = npz['table%d_text' % i].astype(object)
+            if 'table%d_null' % i in npz.files:
+                text[npz['table%d_null' % i]] = np.nan
+            for (j, c) in enumerate(table['text']):
+                df[c] = text[:, j]
+    return df[table['columns']]
+
+
+def loadContainer(filename, names=None):
+    """
+    Load tables from container including linked source tables
+    :param filename: container file
+    :param names: list of tables (default all - source tables first)
+    :return: OrderedDict of table name: dataframe
+    """
+    if names is None:
+        metadata = getMetadata(filename)
+        names = metadata['sourcetables'] + list(metadata['tables'].keys())
+    return OrderedDict([(name, loadTable(filename, name)) for name in names])
+
+
+def toExcel(filename, outputfile=None):
+    """
+    Export container to excel - sheets as written by modules with excel output
+    :param filename: container file
+    :param outputfile: excel file (default container filename with .xlsx)
+    :return: outputfile
+    """
+    if outputfile is None:
+        outputfile = splitext(filename)[0] + '.xlsx'
+    return writeExcel(outputfile, loadContainer(filename))
+
+
+def create_parser():
+    """
+    Create commandline parser
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog=sys.argv[0],
+                                     description='''\
+            Exports experiment containers (.npz) to Excel
+
+             ''')
+    parser.add_argument('files', nargs='+', help='Container files')
+    return parser
+
+
+####################################################################################################################
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+    for f in args.files:
+        print("Exported: ", toExcel(f))
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Data Cache class
+    1. Stores parsed data (per file and sheet) as binary columnar files (numpy npz - one array per column)
+    2. Entries are keyed by path, sheet, skiprows, headers, mtime and size so edited files are reparsed
+    3. Least recently used entries are evicted when the cache is larger than the size limit
+    4. Object columns (eg Frame with STIM labels) are stored as strings with a type code per value
+       so cache files are loaded without pickle
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from os import access, R_OK, stat, makedirs, listdir, remove, utime
+from os.path import join, abspath, expanduser, getsize, getmtime
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.AtomicFile import atomicOpen
+
+CACHE_DIR = join(expanduser('~'), '.qbi_autoanalysis', 'cache')
+CACHE_SIZE = 2048  # MB
+EXT = '.npz'
+# Cache file format - part of key so files of other formats are not read
+CACHE_VERSION = 2
+# Type codes of values in object columns
+OBJECT_TYPES = {'n': lambda v: None, 'b': lambda v: v == 'True', 'i': int, 'f': float, 's': str}
+
+
+def encodeObjects(values):
+    """
+    Object array as strings with a type code per value - no pickle needed to load
+    :param values: array of None, bool, int, float or str values
+    :return: (array of strings, array of type codes)
+    """
+    types = []
+    for v in values:
+        if v is None:
+            types.append('n')
+        elif isinstance(v, (bool, np.bool_)):
+            types.append('b')
+        elif isinstance(v, (int, np.integer)):
+            types.append('i')
+        elif isinstance(v, (float, np.floating)):
+            types.append('f')
+        elif isinstance(v, str):
+            types.append('s')
+        else:
+            raise TypeError("Cannot cache value of type %s" % type(v).__name__)
+    strings = np.array([str(v) for v in values], dtype=str)
+    return (strings, np.array(types, dtype='U1'))
+
+
+def decodeObjects(strings, types):
+    """
+    Object array from strings and type codes (see encodeObjects)
+    :return: array of objects
+    """
+    values = np.empty(len(strings), dtype=object)
+    values[:] = [OBJECT_TYPES[t](v) for (v, t) in zip(strings.tolist(), types.tolist())]
+    return values
+
+
+class DataCache():
+    def __init__(self, cachedir=None, maxsize=CACHE_SIZE):
+        """
+        Init cache
+        :param cachedir: directory for cache files (created if needed) - default in user's home dir
+        :param maxsize: size limit in MB - least recently used files are evicted above this
+        """
+        if cachedir is None or len(cachedir) <= 0:
+            cachedir = CACHE_DIR
+        self.cachedir = cachedir
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # cache location is logged on first save
+        self.logged = False
+
+    def getKey(self, datafile, sheet=0, skiprows=0, headers=None):
+        """
+        Generate key from file location, parse options and current file mtime/size
+        :return: key as hex string
+        """
+        st = stat(datafile)
+        key = "|".join([str(CACHE_VERSION), abspath(datafile), str(sheet), str(skiprows), str(headers), str(st.st_mtime), str(st.st_size)])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def getCachefile(self, key):
+        return join(self.cachedir, key + EXT)
+
+    def get(self, datafile, sheet=0, skiprows=0, headers=None):
+        """
+        Load data from cache
+        :return: dataframe or None if not cached
+        """
+        data = None
+        try:
+            cachefile = self.getCachefile(self.getKey(datafile, sheet, skiprows, headers))
+            if access(cachefile, R_OK):
+                data = self.read(cachefile)
+                # mark as recently used
+                utime(cachefile, None)
+                self.hits += 1
+                logging.debug("DataCache: loaded %s [%s] from %s", datafile, str(sheet), cachefile)
+            else:
+                self.misses += 1
+        except Exception as e:
+            logging.warning("DataCache: cannot read cache for %s: %s", datafile, e)
+            data = None
+        return data
+
+    def put(self, datafile, data, sheet=0, skiprows=0, headers=None):
+        """
+        Save data to cache then evict old entries if over size limit
+        :return: cache filename or None if not saved
+        """
+        cachefile = None
+        try:
+            makedirs(self.cachedir, exist_ok=True)
+            if not self.logged:
+                logging.info("DataCache: parsed data cached in %s (max %s MB) - set USE_CACHE to False to disable",
+                             self.cachedir, str(self.maxsize))
+                self.logged = True
+            cachefile = self.getCachefile(self.getKey(datafile, sheet, skiprows, headers))
+            self.write(cachefile, data)
+            self.evict()
+        except Exception as e:
+            logging.warning("DataCache: cannot save cache for %s: %s", datafile, e)
+            cachefile = None
+        return cachefile
+
+    def write(self, cachefile, data):
+        """
+        Write dataframe as columns to npz (see atomicOpen)
+        Object arrays are written as strings with type codes (name_types)
+        :param cachefile: full path of cache file
+        :param data: dataframe
+        """
+        arrays = OrderedDict()
+        columns = [('columns', np.array(list(data.columns), dtype=object))]
+        if not isinstance(data.index, pd.RangeIndex):
+            columns.append(('index', np.asarray(data.index.values)))
+        for i, col in enumerate(data.columns):
+            columns.append(('c%d' % i, np.asarray(data.iloc[:, i].values)))
+        for (name, values) in columns:
+            if values.dtype == object:
+                (arrays[name], arrays[name + '_types']) = encodeObjects(values)
+            else:
+                arrays[name] = values
+        with atomicOpen(cachefile) as f:
+            np.savez(f, **arrays)
+
+    def read(self, cachefile):
+        """
+        Read dataframe from npz written by write
+        :param cachefile: full path of cache file
+        :return: dataframe
+        """
+        with np.load(cachefile, allow_pickle=False) as arrays:
+            columns = self.readArray(arrays, 'columns').tolist()
+            data = pd.DataFrame(OrderedDict([(i, self.readArray(arrays, 'c%d' % i)) for i in range(len(columns))]))
+            data.columns = columns
+            if 'index' in arrays.files:
+                data.index = self.readArray(arrays, 'index')
+        return data
+
+    def readArray(self, arrays, name):
+        """
+        Array of npz - object arrays decoded from strings and type codes
+        :param arrays: loaded npz
+        :param name: array name
+        :return: array
+        """
+        if name + '_types' in arrays.files:
+            return decodeObjects(arrays[name], arrays[name + '_types'])
+        return arrays[name]
+
+    def getFiles(self):
+        """
+        List cache files
+        :return: list of (mtime, size, filename) with least recently used first
+        """
+        files = []
+        if access(self.cachedir, R_OK):
+            for f in listdir(self.cachedir):
+                if f.endswith(EXT):
+                    cachefile = join(self.cachedir, f)
+                    files.append((getmtime(cachefile), getsize(cachefile), cachefile))
+        return sorted(files)
+
+    def size(self):
+        """
+        Total size of cache
+        :return: bytes
+        """
+        return sum([f[1] for f in self.getFiles()])
+
+    def evict(self, maxsize=None):
+        """
+        Remove least recently used files until cache is within size limit
+        :param maxsize: limit in MB (default is cache maxsize)
+        :return: number of files removed
+        """
+        if maxsize is None:
+            maxsize = self.maxsize
+        limit = maxsize * 1024 * 1024
+        files = self.getFiles()
+        total = sum([f[1] for f in files])
+        cnt = 0
+        for (mtime, fsize, cachefile) in files:
+            if total <= limit:
+                break
+            try:
+                remove(cachefile)
+                total -= fsize
+                cnt += 1
+            except OSError as e:
+                logging.warning("DataCache: cannot remove %s: %s", cachefile, e)
+        if cnt > 0:
+            logging.info("DataCache: evicted %d files", cnt)
+        return cnt
+
+    def clear(self):
+        """
+        Remove all cache files
+        :return: number of files removed
+        """
+        return self.evict(maxsize=0)
@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 """
 Auto Data class
-    1. Read INPUTFILE as CSV or Excel (sheet, skiprows, headers)
+    1. Read INPUTFILE as CSV (or tab delimited .txt) or Excel (sheet, skiprows, headers)
+    2. Parsed data is cached (see DataCache) so later loads of an unchanged file skip parsing
+    3. Sheets are loaded on first access and kept so each is parsed at most once per instance
+    4. Plots are written as run or, if deferred, queued as jobs for a separate plot stage (see controller.PlotStage)
+    5. Experiment containers (.npz) are read per table (see Container) and written in place of excel if configured
+    6. Trace stores (.npy) are read whole as a sheet of traces with per frame columns (see TraceStore)
+    7. Files may be read ahead while the previous file is processed (see Prefetch) - fetched sheets are used first
 
 Created on 7 Feb 2018
 
@@ -9,12 +15,108 @@ Created on 7 Feb 2018
 """
 
 import logging
+from collections import OrderedDict
 import pandas as pd
 from os.path import join, basename, splitext, dirname
 from os import access,R_OK
+from autoanalysis.processmodules.DataCache import DataCache, CACHE_SIZE
+from autoanalysis.processmodules.ExcelExport import waitExport, exportExcel, isExporting
+from autoanalysis.processmodules.Container import isContainer, loadTable, saveContainer, getTableNames
+from autoanalysis.processmodules.TraceStore import isTraceStore, TraceStore
+from autoanalysis.processmodules.Prefetch import Prefetcher, PREFETCH_FILES, PREFETCH_SIZE
+
+
+def configureCache(config):
+    """
+    Set data cache from config values - USE_CACHE, CACHE_DIR, CACHE_SIZE (MB)
+    :param config: dict of config name=value (missing values use defaults)
+    :return: cache or None if disabled
+    """
+    if config is None:
+        config = {}
+    if str(config.get('USE_CACHE', True)).lower() in ['false', '0', 'n', 'no']:
+        AutoData.cache = None
+    else:
+        try:
+            maxsize = float(config.get('CACHE_SIZE', CACHE_SIZE))
+        except (TypeError, ValueError):
+            maxsize = CACHE_SIZE
+        AutoData.cache = DataCache(config.get('CACHE_DIR'), maxsize)
+    return AutoData.cache
+
+
+def configurePrefetch(config):
+    """
+    Set prefetch from config values - PREFETCH_FILES (number of files read ahead, 0 to disable), PREFETCH_SIZE (MB)
+    :param config: dict of config name=value (missing values use defaults)
+    :return: prefetcher or None if disabled
+    """
+    if config is None:
+        config = {}
+    try:
+        ahead = int(config.get('PREFETCH_FILES', PREFETCH_FILES))
+    except (TypeError, ValueError):
+        ahead = PREFETCH_FILES
+    try:
+        maxsize = float(config.get('PREFETCH_SIZE', PREFETCH_SIZE))
+    except (TypeError, ValueError):
+        maxsize = PREFETCH_SIZE
+    if ahead > 0:
+        AutoData.prefetch = Prefetcher(readSheets, ahead, maxsize)
+    else:
+        AutoData.prefetch = None
+    return AutoData.prefetch
+
+
+def readSheets(datafile):
+    """
+    Parse all sheets of datafile as loaded by AutoData (default skiprows, headers) - used to prefetch files
+    Sheets in the data cache are read from there and parsed sheets are cached
+    :param datafile: csv, excel or container file
+    :return: dict of sheet: dataframe or None if not read ahead (trace stores are memory mapped)
+    """
+    if isTraceStore(datafile):
+        return None
+    cache = AutoData.cache
+    sheets = OrderedDict()
+    (bname, extension) = splitext(basename(datafile))
+    waitExport(datafile)
+    if isContainer(datafile):
+        for name in getTableNames(datafile):
+            sheets[name] = loadTable(datafile, name)
+    elif '.xls' in extension:
+        workbook = pd.ExcelFile(datafile)
+        try:
+            for name in workbook.sheet_names:
+                data = cache.get(datafile, name) if cache is not None else None
+                if data is None:
+                    data = workbook.parse(sheet_name=name, skiprows=0, skip_blank_lines=True)
+                    if cache is not None and not data.empty:
+                        cache.put(datafile, data, name)
+                sheets[name] = data
+        finally:
+            if hasattr(workbook, 'close'):
+                workbook.close()
+    elif extension in ['.csv', '.txt']:
+        data = cache.get(datafile) if cache is not None else None
+        if data is None:
+            data = pd.read_csv(datafile, sep='\t' if extension == '.txt' else ',', skip_blank_lines=True)
+            if cache is not None and not data.empty:
+                cache.put(datafile, data)
+        sheets[0] = data
+    else:
+        return None
+    return sheets
 
 
 class AutoData():
+    # Cache of parsed data shared by all instances - set to None to disable
+    cache = DataCache()
+    # Queue plots in plotjobs rather than writing them in run
+    deferplots = False
+    # Files read ahead by process thread - set by configurePrefetch
+    prefetch = None
+
     def __init__(self, datafile, sheet=0, skiprows=0, headers=None):
         self.datafile = datafile
         self.inputdir = dirname(self.datafile)
@@ -22,10 +124,65 @@ class AutoData():
         self.headers = headers
         self.sheet = sheet
         self.skiprows = skiprows
-        # Load data
-        self.data = self.load_data()
+        # Check file can be read - parsed on first access (output of a previous module may still be exporting)
+        if not access(self.datafile, R_OK) and not isExporting(self.datafile):
+            raise IOError("ERROR: Cannot access datafile:", self.datafile)
+        # Loaded sheets - each parsed at most once (see getSheet)
+        self.sheets = {}
+        self.workbook = None
+        self._data = None
+        # Files read and written by run - recorded for incremental reruns (see Manifest)
+        self.inputfiles = [self.datafile]
+        self.outputfiles = []
+        # Deferred plots as (function, args)
+        self.plotjobs = []
 
+    @property
+    def data(self):
+        """
+        Data from default sheet - loaded on first access
+        :return: dataframe
+        """
+        if self._data is None:
+            self._data = self.getSheet(self.sheet)
+        return self._data
 
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+    def getSheet(self, sheet=None):
+        """
+        Get data from sheet (or csv) - parsed on first request then kept
+        :param sheet: sheet name or number (default is sheet of this instance)
+        :return: dataframe
+        """
+        if sheet is None:
+            sheet = self.sheet
+        if sheet not in self.sheets:
+            self.sheets[sheet] = self.loadSheet(sheet)
+        return self.sheets[sheet]
+
+    def getSheets(self, sheets):
+        """
+        Get data from several sheets with workbook opened only once
+        :param sheets: list of sheet names or numbers
+        :return: list of dataframes
+        """
+        try:
+            data = [self.getSheet(sheet) for sheet in sheets]
+        finally:
+            self.closeWorkbook()
+        return data
+
+    def closeWorkbook(self):
+        """
+        Release workbook if open - loaded sheets are kept
+        """
+        if self.workbook is not None:
+            if hasattr(self.workbook, 'close'):
+                self.workbook.close()
+            self.workbook = None
 
     def load_data(self):
         """
@@ -33,22 +190,64 @@ class AutoData():
         :param datafile: Input data as csv or excel
         :return: dataframe
         """
+        return self.getSheet(self.sheet)
+
+    def loadSheet(self, sheet):
+        """
+        Parse sheet from datafile (or from cache if unchanged since last parsed)
+        :param sheet: sheet name or number (ignored for csv)
+        :return: dataframe
+        """
         data = pd.DataFrame()
+        # output of a previous module may still be being written
+        waitExport(self.datafile)
         try:
             if access(self.datafile,R_OK):
+                if isTraceStore(self.datafile):
+                    # all traces - use TraceStore directly to select
+                    data = TraceStore(self.datafile).toDataFrame()
+                    msg = "... load complete (trace store)"
+                    self.logandprint(msg)
+                    return data
+                if isContainer(self.datafile):
+                    # binary tables load directly - not cached
+                    data = loadTable(self.datafile, sheet)
+                    msg = "... load complete (container)"
+                    self.logandprint(msg)
+                    return data
+                if self.prefetch is not None and self.skiprows == 0 and self.headers is None:
+                    fetched = self.prefetch.get(self.datafile, sheet)
+                    if fetched is not None and not fetched.empty:
+                        msg = "... load complete (prefetched)"
+                        self.logandprint(msg)
+                        return fetched
+                if self.cache is not None:
+                    cached = self.cache.get(self.datafile, sheet, self.skiprows, self.headers)
+                    if cached is not None:
+                        msg = "... load complete (from cache)"
+                        self.logandprint(msg)
+                        return cached
                 if '.xls' in self.extension:
+                    # Open workbook once for all sheets
+                    if self.workbook is None:
+                        self.workbook = pd.ExcelFile(self.datafile)
                     if self.headers is None:
-                        data = pd.read_excel(self.datafile, skiprows=self.skiprows, sheet_name=self.sheet,skip_blank_lines=True)
+                        data = self.workbook.parse(sheet_name=sheet, skiprows=self.skiprows, skip_blank_lines=True)
                     else:
-                        data = pd.read_excel(self.datafile, skiprows=self.skiprows, sheet_name=self.sheet,skip_blank_lines=True, header=self.headers)
+                        data = self.workbook.parse(sheet_name=sheet, skiprows=self.skiprows, skip_blank_lines=True, header=self.headers)
                 elif self.extension == '.csv':
                     data = pd.read_csv(self.datafile, skip_blank_lines=True)
+                elif self.extension == '.txt':
+                    # tab delimited as exported from tracking
+                    data = pd.read_csv(self.datafile, sep='\t', skip_blank_lines=True)
                 # Check loaded
                 if data.empty:
                     raise ValueError("Data not loaded - check datafile")
                 else:
                     msg = "... load complete"
                     self.logandprint(msg)
+                    if self.cache is not None:
+                        self.cache.put(self.datafile, data, sheet, self.skiprows, self.headers)
             else:
                 raise IOError("ERROR: Cannot access datafile:", self.datafile)
         except Exception as e:
@@ -56,6 +255,33 @@ class AutoData():
         return data
 
 
+    def outputData(self, outputfile, all, source=None, sourcetables=None):
+        """
+        Write tables as container if outputfile is .npz otherwise to excel (in background - see ExcelExport)
+        :param outputfile: full path filename
+        :param all: dict of sheet name: dataframe - not changed after
+        :param source: container of input data - tables in sourcetables are linked rather than written again
+        :param sourcetables: list of tables in all which are also in source
+        :return: outputfile
+        """
+        if isContainer(outputfile):
+            if source is not None and isContainer(source) and sourcetables is not None:
+                tables = {k: all[k] for k in all.keys() if k not in sourcetables}
+                return saveContainer(outputfile, tables, source, sourcetables)
+            return saveContainer(outputfile, all)
+        return exportExcel(outputfile, all)
+
+    def addPlot(self, func, *args):
+        """
+        Write plot now or, if plots are deferred, queue it for the plot stage
+        :param func: module level function writing plot files and returning list of files written (see Plotting)
+        :param args: args for func - must be picklable as jobs are run in worker processes
+        """
+        if self.deferplots:
+            self.plotjobs.append((func, args))
+        else:
+            self.outputfiles += func(*args)
+
     def logandprint(self, msg, info=True):
         """
         Utility method to enable both logging and printing - can update for Python2 or 3
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Diffusion class
+    1. Reads MSD per track (TRACKMSD_FILENAME as output by MSD) - track id then MSD for lags of 1, 2, .. frames
+    2. Fits MSD = 2 x DIMENSIONS x D x t + c over the first MSD_POINTS lags (t from TIME_INTERVAL)
+    3. All tracks are fitted at once by closed form least squares - lags without MSD (short tracks) are masked
+    4. Outputs D (DIFF_COLUMN) and log10 D (LOG_COLUMN) per track (DIFF_FILENAME) for filter and histogram processes
+       - named so the tracker's own D export (DATA_FILENAME) in the same directory is not overwritten
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import argparse
+import sys
+from collections import OrderedDict
+from os.path import join, splitext
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.DataParser import AutoData
+
+
+def fitLinear(t, Y):
+    """
+    Least squares fit of Y = slope x t + intercept for each row - NaN values are excluded
+    :param t: array of x values (lags)
+    :param Y: 2D array of rows to fit (tracks x lags)
+    :return: (slope, intercept, number of points) per row - NaN if fewer than 2 points
+    """
+    Y = np.asarray(Y, dtype=float)
+    mask = np.isfinite(Y)
+    T = np.where(mask, t, 0.0)
+    Y = np.where(mask, Y, 0.0)
+    n = mask.sum(axis=1)
+    st = T.sum(axis=1)
+    sy = Y.sum(axis=1)
+    stt = (T * T).sum(axis=1)
+    sty = (T * Y).sum(axis=1)
+    det = n * stt - st * st
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(n > 1, (n * sty - st * sy) / det, np.nan)
+        intercept = np.where(n > 1, (sy - slope * st) / n, np.nan)
+    return (slope, intercept, n)
+
+
+def fitDiffusion(msd, interval, points=0, dimensions=2):
+    """
+    Diffusion coefficient of each track from linear fit of MSD over first lags
+    :param msd: 2D array of MSD (tracks x lags of 1, 2, .. frames)
+    :param interval: time between frames (s)
+    :param points: number of lags fitted (0 for all)
+    :param dimensions: number of dimensions of positions
+    :return: (D, intercept, number of points) per track
+    """
+    msd = np.asarray(msd, dtype=float)
+    if points > 0:
+        msd = msd[:, :points]
+    t = np.arange(1, msd.shape[1] + 1) * interval
+    (slope, intercept, n) = fitLinear(t, msd)
+    return (slope / (2 * dimensions), intercept, n)
+
+
+class AutoDiffusion(AutoData):
+    """
+    Diffusion coefficients of tracks from MSD
+    """
+    def __init__(self, datafile, outputdir, sheet=0, skiprows=0, headers=None, showplots=False):
+        super().__init__(datafile, sheet, skiprows, headers)
+        self.outputdir = outputdir
+        self.showplots = showplots
+        self.cfg = self.getConfigurables()
+
+    def getConfigurables(self):
+        '''
+        List of configurable parameters in order with defaults
+        :return:
+        '''
+        cfg = OrderedDict()
+        cfg['TRACKMSD_FILENAME'] = 'Track_MSD.txt'
+        cfg['DIFF_FILENAME'] = 'Track_D.txt' # not DATA_FILENAME (tracker D export)
+        cfg['MSD_POINTS'] = 10 # Number of lags fitted - 0 for all
+        cfg['TIME_INTERVAL'] = 0.02 # Time between frames (s)
+        cfg['DIMENSIONS'] = 2 # Dimensions of positions tracked
+        cfg['DIFF_COLUMN'] = u'D(µm²/s)'
+        cfg['LOG_COLUMN'] = 'log10D'
+        return cfg
+
+    def setConfigurables(self, cfg):
+        '''
+        Merge any variables set externally
+        :param cfg:
+        :return:
+        '''
+        if self.cfg is None:
+            self.cfg = self.getConfigurables()
+        for cf in cfg.keys():
+            self.cfg[cf] = cfg[cf]
+        self.logandprint("Config loaded")
+
+    def getFilename(self, cfgparam):
+        '''
+        Compile filename from config
+        - if starts with underscore then append to basename otherwise use this name
+        :param cfgparam: config param var eg DIFF_FILENAME as found in cfg and db
+        :return: full path filename
+        '''
+        filename = self.cfg[cfgparam]
+        if filename.startswith('_'):
+            filename = self.bname + filename
+        return join(self.outputdir, filename)
+
+    def run(self):
+        """
+        Fit D for all tracks and save with log10 D
+        :return: dataframe of results
+        """
+        points = int(self.cfg['MSD_POINTS']) if self.cfg['MSD_POINTS'] is not None else 0
+        interval = float(self.cfg['TIME_INTERVAL'])
+        dimensions = int(self.cfg['DIMENSIONS'])
+        # track id then MSD per lag
+        trackcol = self.data.columns[0]
+        msd = self.data[self.data.columns[1:]].apply(pd.to_numeric, errors='coerce').values
+        (D, intercept, n) = fitDiffusion(msd, interval, points, dimensions)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logD = np.where(D > 0, np.log10(D), np.nan)
+        results = pd.DataFrame(OrderedDict([(trackcol, self.data[trackcol].values), (self.cfg['DIFF_COLUMN'], D),
+                                            (self.cfg['LOG_COLUMN'], logD), ('Intercept', intercept), ('Points', n)]))
+        msg = "DIFFUSION: %d tracks fitted (%d without D > 0)" % (len(results), np.isnan(logD).sum())
+        self.logandprint(msg)
+        outputfile = self.getFilename('DIFF_FILENAME')
+        if splitext(outputfile)[1] == '.txt':
+            results.to_csv(outputfile, sep='\t', index=False)
+        else:
+            results.to_csv(outputfile, index=False)
+        self.outputfiles.append(outputfile)
+        msg = "Diffusion coefficients saved: %s" % outputfile
+        self.logandprint(msg)
+        return results
+
+
+def create_parser():
+    """
+    Create commandline parser
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog=sys.argv[0],
+                                     description='''\
+            Fits diffusion coefficient to MSD of each track
+
+             ''')
+    parser.add_argument('--datafile', action='store', help='MSD data file', default="Track_MSD.txt")
+    parser.add_argument('--outputdir', action='store', help='Output directory', default=".")
+    parser.add_argument('--points', action='store', help='Number of MSD points fitted', default="10")
+    parser.add_argument('--interval', action='store', help='Time interval between frames (s)', default="0.02")
+    return parser
+
+
+####################################################################################################################
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    print("Input:", args.datafile)
+    print("Output:", args.outputdir)
+
+    try:
+        mod = AutoDiffusion(args.datafile, args.outputdir)
+        cfg = mod.getConfigurables()
+        cfg['MSD_POINTS'] = args.points
+        cfg['TIME_INTERVAL'] = args.interval
+        for c in cfg.keys():
+            print("config set: ", c, "=", cfg[c])
+        mod.setConfigurables(cfg)
+        mod.run()
+
+    except Exception as e:
+        print(e)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Directory Index class
+    1. Lists all files under a root directory in one pass (os.scandir) - hidden files and dirs are skipped as with glob
+    2. Indexes are kept per root and shared - a root inside an indexed root uses that index
+    3. On reuse only directories whose mtime has changed are listed again
+    4. Linked directories are listed once - a link back to a parent (loop) is not followed
+    5. Answers name, suffix, substring and glob queries on filenames without walking the tree again
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import logging
+import threading
+from fnmatch import fnmatch
+from os import scandir, stat
+from os.path import abspath, normcase, sep, basename, realpath
+
+
+class DirIndex():
+    # Shared indexes by root
+    indexes = {}
+    lock = threading.Lock()
+
+    def __init__(self, root):
+        """
+        Build index of root
+        :param root: top level directory
+        """
+        self.root = abspath(root)
+        # dir: (mtime, files, subdirs)
+        self.dirs = {}
+        self.refresh()
+
+    @classmethod
+    def lookup(cls, root):
+        """
+        Find shared index containing directory
+        :param root: directory
+        :return: index or None if not yet indexed
+        """
+        root = abspath(root)
+        with cls.lock:
+            for indexroot in cls.indexes.keys():
+                if root == indexroot or root.startswith(indexroot.rstrip(sep) + sep):
+                    return cls.indexes[indexroot]
+        return None
+
+    @classmethod
+    def get(cls, root, refresh=True):
+        """
+        Get shared index for directory - created if not yet indexed
+        :param root: directory
+        :param refresh: update changed directories of an existing index
+        :return: index containing root (use find with under=root)
+        """
+        index = cls.lookup(root)
+        if index is not None:
+            if refresh:
+                index.refresh()
+            return index
+        index = DirIndex(root)
+        with cls.lock:
+            # replaces any indexes of subdirs
+            prefix = index.root.rstrip(sep) + sep
+            for indexroot in [r for r in cls.indexes.keys() if r.startswith(prefix)]:
+                del cls.indexes[indexroot]
+            cls.indexes[index.root] = index
+        return index
+
+    @classmethod
+    def getIndexes(cls, roots):
+        """
+        Get shared indexes for several directories - each index is created or updated only once
+        :param roots: list of directories
+        :return: dict of directory: index
+        """
+        indexes = {}
+        updated = []
+        # parents first so subdirs use the same index
+        for root in sorted(set([abspath(r) for r in roots])):
+            index = cls.lookup(root)
+            if index is None:
+                index = cls.get(root)
+                updated.append(index)
+            elif index not in updated:
+                index.refresh()
+                updated.append(index)
+            indexes[root] = index
+        return indexes
+
+    @classmethod
+    def clear(cls):
+        """
+        Remove all shared indexes
+        """
+        with cls.lock:
+            cls.indexes = {}
+
+    def scanDir(self, path):
+        """
+        List files and subdirs of a single directory
+        :return: (mtime, files, subdirs)
+        """
+        files = []
+        subdirs = []
+        mtime = stat(path).st_mtime
+        with scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    else:
+                        files.append(entry.path)
+                except OSError as e:
+                    logging.warning("DirIndex: cannot access %s: %s", entry.path, e)
+        return (mtime, files, subdirs)
+
+    def refresh(self):
+        """
+        Update index - directories are listed again only if modified (or new)
+        :return: number of directories listed
+        """
+        dirs = {}
+        cnt = 0
+        # real paths of dirs listed - symlinked dirs (eg loops) only once
+        visited = set()
+        stack = [self.root]
+        while len(stack) > 0:
+            path = stack.pop()
+            try:
+                real = realpath(path)
+                if real in visited:
+                    logging.debug("DirIndex: already listed %s as %s", path, real)
+                    continue
+                visited.add(real)
+                entry = self.dirs.get(path)
+                if entry is None or stat(path).st_mtime != entry[0]:
+                    entry = self.scanDir(path)
+                    cnt += 1
+            except OSError as e:
+                # removed since last listed
+                logging.debug("DirIndex: cannot list %s: %s", path, e)
+                continue
+            dirs[path] = entry
+            stack.extend(entry[2])
+        self.dirs = dirs
+        logging.debug("DirIndex: %s listed %d of %d dirs", self.root, cnt, len(dirs))
+        return cnt
+
+    def getFiles(self, under=None):
+        """
+        All files in index
+        :param under: only files in this directory (and subdirs)
+        :return: sorted list of files
+        """
+        if under is None:
+            under = self.root
+        files = []
+        stack = [abspath(under)]
+        while len(stack) > 0:
+            entry = self.dirs.get(stack.pop())
+            if entry is not None:
+                files.extend(entry[1])
+                stack.extend(entry[2])
+        return sorted(files)
+
+    def find(self, name=None, suffix=None, contains=None, pattern=None, under=None):
+        """
+        Files matching all given criteria on filename (case insensitive where the filesystem is)
+        :param name: exact filename
+        :param suffix: filename ends with
+        :param contains: filename includes
+        :param pattern: glob pattern for filename eg *.csv
+        :param under: only files in this directory (and subdirs)
+        :return: sorted list of files
+        """
+        if name is not None:
+            name = normcase(name)
+        if suffix is not None:
+            suffix = normcase(suffix)
+        if contains is not None:
+            contains = normcase(contains)
+        matched = []
+        for f in self.getFiles(under):
+            bname = normcase(basename(f))
+            if name is not None and bname != name:
+                continue
+            if suffix is not None and not bname.endswith(suffix):
+                continue
+            if contains is not None and contains not in bname:
+                continue
+            if pattern is not None and not fnmatch(bname, pattern):
+                continue
+            matched.append(f)
+        return matched
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Excel Export
+    1. ExcelStream writes sheets row by row with xlsxwriter constant_memory mode so only the current row
+       of each sheet is held in memory - blocks of rows can be written as they are produced (eg chunks of a file)
+    2. Rows must be written in order within each sheet but sheets may be written alternately
+    3. Dataframes are exported in blocks of rows by a background thread so the next file can be processed
+       while the last is written - the queue is bounded so only a few outputs are held in memory
+    4. Files being exported are finalized before they are read (see waitExport) and before a process completes
+    5. A failed export is raised for that file by waitExport, else by the next exportExcel or flushExports
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from os import getpid
+from os.path import abspath
+from queue import Queue
+import xlsxwriter
+
+# Max rows of a sheet (including header)
+MAX_ROWS = 1048576
+INF = float('inf')
+# Rows of dataframe converted for writing at a time
+BLOCK_ROWS = 1000
+# Exports waiting for background writer
+QUEUE_SIZE = 2
+
+
+def formatValue(v):
+    """
+    Value as written by to_excel - NaN is blank and infinity as text
+    """
+    if isinstance(v, float):
+        # NaN != NaN
+        if v != v:
+            return None
+        if abs(v) == INF:
+            return 'inf' if v > 0 else '-inf'
+    return v
+
+
+class ExcelStream():
+    def __init__(self, outputfile):
+        """
+        Open workbook for writing - use as context manager (or call close) so the file is finalized
+        :param outputfile: full path filename (.xlsx)
+        """
+        self.outputfile = outputfile
+        self.workbook = xlsxwriter.Workbook(outputfile, {'constant_memory': True})
+        # sheet name: [worksheet, next row]
+        self.sheets = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def addSheet(self, name, columns):
+        """
+        Add sheet with header row (as to_excel with index=False)
+        :param name: sheet name
+        :param columns: column names
+        """
+        worksheet = self.workbook.add_worksheet(name)
+        worksheet.write_row(0, 0, [str(c) for c in columns])
+        self.sheets[name] = [worksheet, 1]
+
+    def writeBlock(self, name, values):
+        """
+        Append rows to sheet - NaN values are left blank and infinity as text (as to_excel)
+        :param name: sheet name
+        :param values: 2D array (or list of rows)
+        :return: number of rows written
+        """
+        (worksheet, row) = self.sheets[name]
+        if row + len(values) > MAX_ROWS:
+            raise ValueError("Too many rows for Excel sheet %s: %d" % (name, row + len(values) - 1))
+        # python types for xlsxwriter
+        if hasattr(values, 'tolist'):
+            values = values.tolist()
+        for r in values:
+            worksheet.write_row(row, 0, [formatValue(v) for v in r])
+            row += 1
+        self.sheets[name][1] = row
+        return len(values)
+
+    def close(self):
+        """
+        Finalize file
+        """
+        if self.workbook is not None:
+            self.workbook.close()
+            self.workbook = None
+
+
+def writeExcel(outputfile, sheets):
+    """
+    Write dataframes to excel (as to_excel with index=False) - streamed in blocks of rows
+    :param outputfile: full path filename (.xlsx)
+    :param sheets: dict of sheet name: dataframe
+    :return: outputfile
+    """
+    with ExcelStream(outputfile) as excel:
+        for name in sheets.keys():
+            df = sheets[name]
+            excel.addSheet(name, df.columns)
+            for start in range(0, len(df), BLOCK_ROWS):
+                excel.writeBlock(name, df.iloc[start:start + BLOCK_ROWS].values)
+    return outputfile
+
+
+class ExcelExporter():
+    """
+    Writes excel files in a background thread - one per process, started on first export
+    """
+
+    def __init__(self, queuesize=QUEUE_SIZE):
+        self.queuesize = queuesize
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        # files queued or being written
+        self.pending = set()
+        # failed exports: full path filename: (outputfile, exception)
+        self.errors = OrderedDict()
+        self.condition = threading.Condition()
+
+    def start(self):
+        """
+        Start writer thread if not running in this process (eg after fork to worker process)
+        """
+        if self.pid != getpid():
+            # copied from parent process
+            self.condition = threading.Condition()
+            self.pending = set()
+            self.errors = OrderedDict()
+            self.thread = None
+        if self.thread is None or not self.thread.is_alive():
+            self.queue = Queue(maxsize=self.queuesize)
+            self.pid = getpid()
+            self.thread = threading.Thread(target=self.run, name='ExcelExporter', daemon=True)
+            self.thread.start()
+
+    def submit(self, outputfile, sheets):
+        """
+        Queue export - waits if queue is full
+        :param outputfile: full path filename (.xlsx)
+        :param sheets: dict of sheet name: dataframe - must not be changed after submit
+        """
+        self.start()
+        # earlier failed exports are raised before queueing more
+        self.raiseErrors()
+        with self.condition:
+            self.pending.add(abspath(outputfile))
+        self.queue.put((outputfile, sheets))
+
+    def run(self):
+        while True:
+            (outputfile, sheets) = self.queue.get()
+            try:
+                writeExcel(outputfile, sheets)
+                logging.debug("Excel export: %s", outputfile)
+            except Exception as e:
+                logging.error("Excel export failed: %s: %s", outputfile, e)
+                with self.condition:
+                    self.errors[abspath(outputfile)] = (outputfile, e)
+            finally:
+                with self.condition:
+                    self.pending.discard(abspath(outputfile))
+                    self.condition.notify_all()
+                self.queue.task_done()
+
+    def isPending(self, filename):
+        """
+        Check if file is queued or being written
+        :param filename: full path filename
+        """
+        with self.condition:
+            return abspath(filename) in self.pending and self.pid == getpid()
+
+    def raiseErrors(self, filename=None):
+        """
+        Raise failed export (first if more than one) - cleared once raised
+        :param filename: only raise if export of this file failed (full path filename)
+        """
+        with self.condition:
+            if self.pid != getpid() or len(self.errors) <= 0:
+                return
+            if filename is None:
+                errors = list(self.errors.values())
+                self.errors = OrderedDict()
+            elif abspath(filename) in self.errors:
+                errors = [self.errors.pop(abspath(filename))]
+            else:
+                return
+        raise IOError("Excel export failed: %s (%s)" % (errors[0][0], errors[0][1]))
+
+    def wait(self, filename):
+        """
+        Wait until file is written if it is being exported - raises IOError if export of file failed
+        :param filename: full path filename
+        """
+        filename = abspath(filename)
+        with self.condition:
+            while filename in self.pending and self.pid == getpid():
+                self.condition.wait()
+        self.raiseErrors(filename)
+
+    def flush(self):
+        """
+        Wait for all queued exports - any errors are raised
+        """
+        if self.queue is not None and self.pid == getpid():
+            self.queue.join()
+        self.raiseErrors()
+
+
+# Shared by all modules in process
+exporter = ExcelExporter()
+atexit.register(exporter.flush)
+
+
+def exportExcel(outputfile, sheets):
+    """
+    Write dataframes to excel in background (see ExcelExporter) - raises IOError if an earlier export failed
+    :param outputfile: full path filename (.xlsx)
+    :param sheets: dict of sheet name: dataframe
+    :return: outputfile
+    """
+    exporter.submit(outputfile, sheets)
+    return outputfile
+
+
+def waitExport(filename):
+    """
+    Wait for file if being exported - call before reading a file
+    - raises IOError if export of file failed
+    """
+    exporter.wait(filename)
+
+
+def isExporting(filename):
+    """
+    Check if file is queued or being written by background export - it may not exist yet
+    """
+    return exporter.isPending(filename)
+
+
+def flushExports():
+    """
+    Wait for all exports so all files are finalized - raises IOError if any failed
+    """
+    exporter.flush()
@@ -32,7 +32,6 @@ class AutoFilter(AutoData):
         # Load data
         self.outputdir = outputdir
         msg = "Filter: Loading data from %s" % self.datafile
-        self.data = self.load_data()
         self.logandprint(msg)
         self.suffix = 'FILTERED.csv'
 
@@ -95,6 +94,7 @@ class AutoFilter(AutoData):
                     filtered.to_csv(fdata, index=False)
                 else:
                     filtered.to_csv(fdata, columns=[self.column], index=False)  # with or without original index numbers
+                self.outputfiles.append(fdata)
                 msg = "Filtered Data saved: %s" % fdata
                 self.logandprint(msg)
             except IOError as e:
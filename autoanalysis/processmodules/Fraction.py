@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+AutoFraction class
+    1. Reads filtered data of each cell (FILTERED_FILENAME as output by AutoFilter) in chunks - only LOG_COLUMN is read
+    2. Classifies tracks as immobile (LOG_COLUMN < THRESHOLD) or mobile
+    3. Counts are accumulated per cell and per group as files are read so memory does not grow with number of files
+       - per cell rows are written as each file is read
+    4. Outputs a single summary table (FRACTION_FILENAME) with a row per cell then a row per group
+       with pooled fractions and mean/SEM of cell immobile fractions
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import argparse
+import csv
+import sys
+from collections import OrderedDict
+from os.path import join, basename, dirname, commonpath, relpath, splitext, sep
+import numpy as np
+import pandas as pd
+
+# Rows read at a time from each file
+READ_CHUNKSIZE = 100000
+FRACTION_COLUMNS = ['Group', 'Cell', 'Cells', 'Tracks', 'Mobile', 'Immobile', 'Mobile_Fraction', 'Immobile_Fraction',
+                    'Immobile_Mean', 'Immobile_SEM']
+
+
+def classifyTracks(values, threshold):
+    """
+    Count mobile and immobile tracks - missing values are not counted
+    :param values: array of log10D
+    :param threshold: log10D below which tracks are immobile
+    :return: (mobile, immobile)
+    """
+    values = np.asarray(values, dtype=float)
+    immobile = np.count_nonzero(values < threshold)
+    mobile = np.count_nonzero(values >= threshold)
+    return (mobile, immobile)
+
+
+class AutoFraction:
+    # Run once with files of all groups (dict of group: files) for a single summary table
+    grouped = True
+
+    def __init__(self, inputfiles, outputdir, showplots=False):
+        """
+        :param inputfiles: list of filtered files of a group or dict of group: list of files
+        :param outputdir: output directory - common directory of input files if empty
+        :param showplots: not used
+        """
+        if isinstance(inputfiles, dict):
+            self.groups = OrderedDict([(g, inputfiles[g]) for g in inputfiles.keys()
+                                       if g != 'all' and len(inputfiles[g]) > 0])
+            self.inputfiles = [f for g in self.groups.keys() for f in self.groups[g]]
+        else:
+            self.groups = None
+            self.inputfiles = inputfiles
+        self.base = commonpath([dirname(f) for f in self.inputfiles])
+        if len(outputdir) <= 0:
+            self.outputdir = self.base
+        else:
+            self.outputdir = outputdir
+        self.showplots = showplots
+        self.prefix = ''
+        # Files written by run - recorded for incremental reruns (see Manifest)
+        self.outputfiles = []
+        self.cfg = self.getConfigurables()
+
+    def getConfigurables(self):
+        '''
+        List of configurable parameters in order with defaults
+        :return:
+        '''
+        cfg = OrderedDict()
+        cfg['FILTERED_FILENAME'] = 'Filtered_log10D.csv'
+        cfg['LOG_COLUMN'] = 'log10D'
+        cfg['THRESHOLD'] = -1.6 # log10D below which tracks are immobile
+        cfg['FRACTION_FILENAME'] = 'Fraction_log10D.csv'
+        return cfg
+
+    def setConfigurables(self, cfg):
+        '''
+        Merge any variables set externally
+        :param cfg:
+        :return:
+        '''
+        for cf in cfg.keys():
+            if cfg[cf] is not None:
+                self.cfg[cf] = cfg[cf]
+
+    def getCellID(self, filename):
+        """
+        Cell from directory of file relative to common directory (processed subdir is not included)
+        :param filename: full path filename
+        :return: cell id
+        """
+        path = dirname(filename)
+        if basename(path) == 'processed':
+            path = dirname(path)
+        cell = relpath(path, self.base) if len(self.base) > 0 else path
+        if cell == '.' or cell.startswith('..'):
+            cell = basename(path)
+        if len(cell) <= 0 or cell == '.':
+            cell = splitext(basename(filename))[0]
+        return cell.replace(sep, '_')
+
+    def readColumn(self, filename, column):
+        """
+        Column of data file in chunks
+        :param filename: csv or tab delimited txt
+        :param column: column name
+        :return: iterator of arrays
+        """
+        delimiter = '\t' if splitext(filename)[1] == '.txt' else ','
+        for chunk in pd.read_csv(filename, sep=delimiter, usecols=[column], chunksize=READ_CHUNKSIZE):
+            yield pd.to_numeric(chunk[column], errors='coerce').values
+
+    def getOutputfile(self):
+        """
+        Summary filename - group prefix if run for a single group
+        :return: full path filename
+        """
+        fparts = [self.base.split(sep)[-1], self.cfg['FRACTION_FILENAME']]
+        if len(self.prefix) > 0:
+            fparts = [self.prefix] + fparts
+        return join(self.outputdir, "_".join(fparts))
+
+    def run(self):
+        """
+        Classify tracks of each file and write summary of cells and groups
+        :return: outputfilename
+        """
+        column = self.cfg['LOG_COLUMN']
+        threshold = float(self.cfg['THRESHOLD'])
+        groups = self.groups
+        if groups is None:
+            groups = OrderedDict([(self.prefix, self.inputfiles)])
+        outputfilename = self.getOutputfile()
+        # running counts per group: cells, tracks, mobile, immobile, sum and sum of squares of cell immobile fractions
+        totals = OrderedDict()
+        with open(outputfilename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(FRACTION_COLUMNS)
+            for group in groups.keys():
+                counts = totals.setdefault(group, np.zeros(6))
+                for filename in groups[group]:
+                    (mobile, immobile) = (0, 0)
+                    for values in self.readColumn(filename, column):
+                        (m, i) = classifyTracks(values, threshold)
+                        mobile += m
+                        immobile += i
+                    tracks = mobile + immobile
+                    if tracks > 0:
+                        fraction = immobile / tracks
+                        counts += [1, tracks, mobile, immobile, fraction, fraction * fraction]
+                        writer.writerow([group, self.getCellID(filename), 1, tracks, mobile, immobile,
+                                         mobile / tracks, fraction, '', ''])
+                    else:
+                        writer.writerow([group, self.getCellID(filename), 1, 0, 0, 0, '', '', '', ''])
+                    print("Fraction: %s %d of %d tracks immobile" % (filename, immobile, tracks))
+            for group in totals.keys():
+                (cells, tracks, mobile, immobile, fsum, fsumsq) = totals[group]
+                if tracks > 0:
+                    mean = fsum / cells
+                    sem = np.sqrt(max(fsumsq - cells * mean * mean, 0) / (cells - 1) / cells) if cells > 1 else ''
+                    writer.writerow([group, 'All', int(cells), int(tracks), int(mobile), int(immobile),
+                                     mobile / tracks, immobile / tracks, mean, sem])
+                else:
+                    writer.writerow([group, 'All', 0, 0, 0, 0, '', '', '', ''])
+        self.outputfiles.append(outputfilename)
+        print("Fraction summary saved: %s" % outputfilename)
+        return outputfilename
+
+
+################################################################################
+def create_parser():
+    """
+    Create commandline parser
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog=sys.argv[0],
+                                     description='''\
+            Mobile and immobile fractions of tracks per cell and group from filtered log10D files
+
+             ''')
+    parser.add_argument('files', nargs='+', help='Filtered data files')
+    parser.add_argument('--outputdir', action='store', help='Output directory', default="")
+    parser.add_argument('--threshold', action='store', help='log10D threshold', default="-1.6")
+    parser.add_argument('--group', action='store', help='Group name', default="")
+    return parser
+
+
+####################################################################################################################
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    try:
+        mod = AutoFraction(args.files, args.outputdir)
+        cfg = mod.getConfigurables()
+        cfg['THRESHOLD'] = args.threshold
+        for c in cfg.keys():
+            print("config set: ", c, "=", cfg[c])
+        mod.setConfigurables(cfg)
+        mod.prefix = args.group
+        mod.run()
+
+    except Exception as e:
+        print(e)
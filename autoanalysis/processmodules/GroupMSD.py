@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+AutoGroupMSD class
+    1. Reads average MSD of each cell (AVGMSD_FILENAME as output by MSD) - Time and MSD columns
+    2. Folds each cell's MSD curve into running mean and variance per lag (Welford) for its group
+       so only one curve is held at a time - memory does not grow with number of cells
+    3. Lags without MSD in a cell (NaN) are not counted so cells may have different numbers of lags
+       - times of the same lag must be the same in all files (eg same frame interval)
+    4. Outputs MSD averaged over cells with SD and SEM per lag for each group (GROUPMSD_FILENAME)
+    5. Outputs of several runs (eg shards of cells) are merged by combining accumulators per group
+       - the output table holds the accumulator state (Cells, MSD, SD) - run as script with --merge
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import argparse
+import sys
+from collections import OrderedDict
+from os.path import join, dirname, commonpath, sep
+import numpy as np
+import pandas as pd
+
+GROUPMSD_COLUMNS = ['Group', 'Time', 'MSD', 'SD', 'SEM', 'Cells']
+
+
+class Welford():
+    """
+    Running mean and variance of curves per lag - accumulators may be merged (Chan et al)
+    """
+    def __init__(self, nlags=0):
+        self.count = np.zeros(nlags, dtype=np.int64)
+        self.mean = np.zeros(nlags)
+        self.m2 = np.zeros(nlags)
+
+    def resize(self, nlags):
+        """
+        Extend to nlags - new lags have no values
+        :param nlags: number of lags
+        """
+        extra = nlags - len(self.count)
+        if extra > 0:
+            self.count = np.append(self.count, np.zeros(extra, dtype=np.int64))
+            self.mean = np.append(self.mean, np.zeros(extra))
+            self.m2 = np.append(self.m2, np.zeros(extra))
+
+    def add(self, values):
+        """
+        Fold curve into accumulators - NaN values are skipped
+        :param values: array of value per lag
+        """
+        values = np.asarray(values, dtype=float)
+        self.resize(len(values))
+        n = len(values)
+        mask = np.isfinite(values)
+        count = self.count[:n] + mask
+        delta = np.where(mask, values - self.mean[:n], 0.0)
+        mean = self.mean[:n] + np.where(mask, delta / np.maximum(count, 1), 0.0)
+        self.m2[:n] += np.where(mask, delta * (values - mean), 0.0)
+        self.mean[:n] = mean
+        self.count[:n] = count
+
+    def merge(self, other):
+        """
+        Combine with accumulators of other values (eg from another worker or shard)
+        :param other: Welford
+        """
+        n = max(len(self.count), len(other.count))
+        self.resize(n)
+        # other is not changed - its arrays are extended as copies
+        extra = n - len(other.count)
+        ocount = np.append(other.count, np.zeros(extra, dtype=np.int64))
+        omean = np.append(other.mean, np.zeros(extra))
+        om2 = np.append(other.m2, np.zeros(extra))
+        count = self.count + ocount
+        delta = omean - self.mean
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(count > 0, ocount / count, 0.0)
+        self.mean = self.mean + delta * ratio
+        self.m2 = self.m2 + om2 + delta * delta * self.count * ratio
+        self.count = count
+
+    def getMean(self):
+        return np.where(self.count > 0, self.mean, np.nan)
+
+    def getSD(self):
+        """
+        Sample standard deviation per lag - NaN for fewer than 2 values
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+    def getSEM(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.getSD() / np.sqrt(self.count)
+
+    @classmethod
+    def fromSummary(cls, count, mean, sd):
+        """
+        Accumulators from summary as output (number of values, mean and SD per lag)
+        :return: Welford
+        """
+        acc = cls(len(count))
+        acc.count = np.asarray(count, dtype=np.int64)
+        acc.mean = np.where(acc.count > 0, np.nan_to_num(np.asarray(mean, dtype=float)), 0.0)
+        sd = np.nan_to_num(np.asarray(sd, dtype=float))
+        acc.m2 = np.where(acc.count > 1, sd * sd * (acc.count - 1), 0.0)
+        return acc
+
+
+def mergeTimes(times, other, filename):
+    """
+    Lag times of all curves - times of lags in both must be the same
+    :param times: lag times so far
+    :param other: lag times of file
+    :param filename: file of other (for error)
+    :return: longer of times and other
+    :raises ValueError: if times of the same lag differ
+    """
+    other = np.asarray(other, dtype=float)
+    n = min(len(times), len(other))
+    if not np.allclose(times[:n], other[:n], equal_nan=True):
+        raise ValueError("Lag times of %s differ from other files - MSD not averaged over different lag times" % filename)
+    return other if len(other) > len(times) else times
+
+
+def toTable(groups, times):
+    """
+    Summary table of accumulators
+    :param groups: dict of group: Welford
+    :param times: array of lag times (longest curve)
+    :return: dataframe of GROUPMSD_COLUMNS
+    """
+    tables = []
+    for group in groups.keys():
+        acc = groups[group]
+        n = len(acc.count)
+        tables.append(pd.DataFrame(OrderedDict([('Group', [group] * n), ('Time', times[:n]), ('MSD', acc.getMean()),
+                                                ('SD', acc.getSD()), ('SEM', acc.getSEM()), ('Cells', acc.count)])))
+    if len(tables) <= 0:
+        return pd.DataFrame(columns=GROUPMSD_COLUMNS)
+    return pd.concat(tables, ignore_index=True)
+
+
+def mergeTables(filenames):
+    """
+    Merge outputs of several runs - accumulators of the same group are combined
+    :param filenames: list of GROUPMSD_FILENAME outputs
+    :return: (dict of group: Welford, times)
+    """
+    groups = OrderedDict()
+    times = np.zeros(0)
+    for filename in filenames:
+        df = pd.read_csv(filename)
+        df['Group'] = df['Group'].fillna('').astype(str)
+        for (group, rows) in df.groupby('Group', sort=False):
+            acc = Welford.fromSummary(rows['Cells'].values, rows['MSD'].values, rows['SD'].values)
+            groups.setdefault(group, Welford()).merge(acc)
+            times = mergeTimes(times, rows['Time'].values, filename)
+    return (groups, times)
+
+
+class AutoGroupMSD:
+    # Run once with files of all groups (dict of group: files) for a single output
+    grouped = True
+
+    def __init__(self, inputfiles, outputdir, showplots=False):
+        """
+        :param inputfiles: list of average MSD files of a group or dict of group: list of files
+        :param outputdir: output directory - common directory of input files if empty
+        :param showplots: not used
+        """
+        if isinstance(inputfiles, dict):
+            self.groups = OrderedDict([(g, inputfiles[g]) for g in inputfiles.keys()
+                                       if g != 'all' and len(inputfiles[g]) > 0])
+            self.inputfiles = [f for g in self.groups.keys() for f in self.groups[g]]
+        else:
+            self.groups = None
+            self.inputfiles = inputfiles
+        self.base = commonpath([dirname(f) for f in self.inputfiles])
+        if len(outputdir) <= 0:
+            self.outputdir = self.base
+        else:
+            self.outputdir = outputdir
+        self.showplots = showplots
+        self.prefix = ''
+        # Files written by run - recorded for incremental reruns (see Manifest)
+        self.outputfiles = []
+        self.cfg = self.getConfigurables()
+
+    def getConfigurables(self):
+        '''
+        List of configurable parameters in order with defaults
+        :return:
+        '''
+        cfg = OrderedDict()
+        cfg['AVGMSD_FILENAME'] = 'Avg_MSD.csv'
+        cfg['GROUPMSD_FILENAME'] = 'Group_MSD.csv'
+        return cfg
+
+    def setConfigurables(self, cfg):
+        '''
+        Merge any variables set externally
+        :param cfg:
+        :return:
+        '''
+        for cf in cfg.keys():
+            if cfg[cf] is not None:
+                self.cfg[cf] = cfg[cf]
+
+    def getOutputfile(self):
+        """
+        Output filename - group prefix if run for a single group
+        :return: full path filename
+        """
+        fparts = [self.base.split(sep)[-1], self.cfg['GROUPMSD_FILENAME']]
+        if len(self.prefix) > 0:
+            fparts = [self.prefix] + fparts
+        return join(self.outputdir, "_".join(fparts))
+
+    def run(self):
+        """
+        Average MSD of cells per group
+        :return: outputfilename
+        """
+        groups = self.groups
+        if groups is None:
+            groups = OrderedDict([(self.prefix, self.inputfiles)])
+        accumulators = OrderedDict()
+        times = np.zeros(0)
+        for group in groups.keys():
+            acc = accumulators.setdefault(group, Welford())
+            for filename in groups[group]:
+                df = pd.read_csv(filename, usecols=['Time', 'MSD'])
+                times = mergeTimes(times, df['Time'].values, filename)
+                acc.add(pd.to_numeric(df['MSD'], errors='coerce').values)
+            print("Group MSD: %s averaged over %d cells" % (group, len(groups[group])))
+        outputfilename = self.getOutputfile()
+        toTable(accumulators, times).to_csv(outputfilename, index=False)
+        self.outputfiles.append(outputfilename)
+        print("Group MSD saved: %s" % outputfilename)
+        return outputfilename
+
+
+################################################################################
+def create_parser():
+    """
+    Create commandline parser
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog=sys.argv[0],
+                                     description='''\
+            Average MSD over cells of a group or merges outputs of several runs (--merge)
+
+             ''')
+    parser.add_argument('files', nargs='+', help='Average MSD files of cells or group MSD outputs to merge')
+    parser.add_argument('--outputdir', action='store', help='Output directory', default="")
+    parser.add_argument('--group', action='store', help='Group name', default="")
+    parser.add_argument('--merge', action='store', help='Merge group MSD outputs into this file')
+    return parser
+
+
+####################################################################################################################
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    try:
+        if args.merge is not None:
+            (groups, times) = mergeTables(args.files)
+            toTable(groups, times).to_csv(args.merge, index=False)
+            print("Merged: ", args.merge)
+        else:
+            mod = AutoGroupMSD(args.files, args.outputdir)
+            mod.setConfigurables(mod.getConfigurables())
+            mod.prefix = args.group
+            mod.run()
+
+    except Exception as e:
+        print(e)
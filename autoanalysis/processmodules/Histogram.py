@@ -30,8 +30,6 @@ class AutoHistogram(AutoData):
         super().__init__(datafile, sheet, skiprows, headers)
         self.showplots = showplots
         self.outputdir = outputdir
-        # Load data
-        self.data = self.load_data()
         self.fig = None
 
 
@@ -103,6 +101,7 @@ class AutoHistogram(AutoData):
         outputfile = join(self.outputdir, hist_title)
         # outputplot = outputfile.replace(".csv",".html")
         histdata.to_csv(outputfile, index=False)
+        self.outputfiles.append(outputfile)
         print("Saved histogram data to ", outputfile)
         return outputfile
 
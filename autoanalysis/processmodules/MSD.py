@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+MSD class
+    1. Reads tracking data (TRACK_FILENAME) with a row per localization - track id, frame and position columns
+       (TRACK_COLUMNS) - tab delimited if .txt - or a binary trajectories file (.trk)
+    2. Computes mean squared displacement (MSD) of every track for lags of 1 to MSD_POINTS frames
+       using FFT correlations - O(N log N) per track rather than a loop over lags
+    3. Tracks are ragged - they are grouped by FFT length and computed together as arrays
+       with missing frames masked so tracks with gaps give the MSD of the pairs present
+    4. Outputs MSD per track (TRACKMSD_FILENAME) and average MSD over tracks (AVGMSD_FILENAME) with lag time
+       from TIME_INTERVAL - named so the tracker's own MSD export (MSD_FILENAME) next to the tracking data is not overwritten
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import argparse
+import sys
+from collections import OrderedDict
+from os.path import join, splitext
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.DataParser import AutoData
+from autoanalysis.processmodules.Trajectories import Trajectories, isTracksFile
+
+# Max array size (elements) of tracks computed together
+BLOCK_SIZE = 1 << 22
+
+
+def trajectoryMSD(tracks, maxlag=0):
+    """
+    MSD of each track from FFT correlations of masked positions
+    MSD(m) = sum over pairs k, k+m present of |r(k+m) - r(k)|^2 / number of pairs
+    where with mask w and D = w|r|^2 the sum is corr(D, w) + corr(w, D) - 2 corr(wr, wr)
+    :param tracks: Trajectories
+    :param maxlag: number of lags in frames (0 for longest track)
+    :return: (msd as tracks x lags (NaN where no pairs), number of pairs as tracks x lags)
+    """
+    starts = tracks.starts
+    lengths = tracks.lengths
+    offsets = tracks.getOffsets()
+    # relative to start of track so large coordinates do not lose precision in the correlations
+    positions = tracks.getPoints()[1]
+    positions = positions - np.repeat(positions[starts], lengths, axis=0)
+    spans = tracks.getSpans()
+    if maxlag <= 0:
+        maxlag = max(int(spans.max()) - 1, 1) if len(spans) > 0 else 1
+    msd = np.full((len(tracks), maxlag), np.nan)
+    pairs = np.zeros((len(tracks), maxlag), dtype=np.int64)
+    # FFT length per track - at least twice the span so correlations do not wrap
+    nfft = 2 ** np.ceil(np.log2(2 * spans)).astype(int)
+    for n in np.unique(nfft):
+        rows = np.flatnonzero(nfft == n)
+        nlags = min(maxlag, n // 2)
+        for block in range(0, len(rows), max(BLOCK_SIZE // n, 1)):
+            trows = rows[block:block + max(BLOCK_SIZE // n, 1)]
+            # localizations of these tracks
+            tlengths = lengths[trows]
+            r = np.repeat(np.arange(len(trows)), tlengths)
+            idx = np.repeat(starts[trows] - np.cumsum(tlengths) + tlengths, tlengths) + np.arange(tlengths.sum())
+            c = offsets[idx]
+            w = np.zeros((len(trows), n))
+            w[r, c] = 1
+            d = np.zeros((len(trows), n))
+            d[r, c] = (positions[idx] ** 2).sum(axis=1)
+            W = np.fft.rfft(w, axis=1)
+            D = np.fft.rfft(d, axis=1)
+            S = 2 * (np.conj(D) * W).real
+            for dim in range(positions.shape[1]):
+                x = np.zeros((len(trows), n))
+                x[r, c] = positions[idx, dim]
+                X = np.fft.rfft(x, axis=1)
+                S -= 2 * (np.conj(X) * X).real
+            sums = np.fft.irfft(S, n, axis=1)[:, 1:nlags + 1]
+            counts = np.rint(np.fft.irfft((np.conj(W) * W).real, n, axis=1)[:, 1:nlags + 1]).astype(np.int64)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                msd[trows, :nlags] = np.where(counts > 0, sums / counts, np.nan)
+            pairs[trows, :nlags] = counts
+    return (msd, pairs)
+
+
+def computeMSD(ids, frames, positions, maxlag=0):
+    """
+    MSD of each track from localizations in any order (see trajectoryMSD)
+    :param ids: array of track id per localization
+    :param frames: array of frame number per localization
+    :param positions: 2D array of position (eg x, y) per localization
+    :param maxlag: number of lags in frames (0 for longest track)
+    :return: (track ids, msd as tracks x lags (NaN where no pairs), number of pairs as tracks x lags)
+    """
+    tracks = Trajectories.fromArrays(ids, frames, positions)
+    (msd, pairs) = trajectoryMSD(tracks, maxlag)
+    return (tracks.ids, msd, pairs)
+
+
+class AutoMSD(AutoData):
+    """
+    Mean squared displacement of tracks
+    """
+    def __init__(self, datafile, outputdir, sheet=0, skiprows=0, headers=None, showplots=False):
+        super().__init__(datafile, sheet, skiprows, headers)
+        self.outputdir = outputdir
+        self.showplots = showplots
+        self.cfg = self.getConfigurables()
+
+    def getConfigurables(self):
+        '''
+        List of configurable parameters in order with defaults
+        :return:
+        '''
+        cfg = OrderedDict()
+        cfg['TRACK_FILENAME'] = 'AllROI-Tracks.txt'
+        cfg['TRACK_COLUMNS'] = 'Trajectory,Frame,x,y' # track id, frame then position columns (um)
+        cfg['TRACKMSD_FILENAME'] = 'Track_MSD.txt' # not MSD_FILENAME (tracker MSD export)
+        cfg['AVGMSD_FILENAME'] = 'Avg_MSD.csv'
+        cfg['MSD_POINTS'] = 10 # Number of lags (frames) - 0 for all
+        cfg['TIME_INTERVAL'] = 0.02 # Time between frames (s)
+        return cfg
+
+    def setConfigurables(self, cfg):
+        '''
+        Merge any variables set externally
+        :param cfg:
+        :return:
+        '''
+        if self.cfg is None:
+            self.cfg = self.getConfigurables()
+        for cf in cfg.keys():
+            self.cfg[cf] = cfg[cf]
+        self.logandprint("Config loaded")
+
+    def loadSheet(self, sheet):
+        """
+        Load tracks on first access
+        :param sheet: sheet name or number (ignored for csv or txt)
+        :return: dataframe
+        """
+        data = super().loadSheet(sheet)
+        msg = "MSD: Data loaded from %s" % self.datafile
+        self.logandprint(msg)
+        return data
+
+    def getFilename(self, cfgparam):
+        '''
+        Compile filename from config
+        - if starts with underscore then append to basename otherwise use this name
+        :param cfgparam: config param var eg TRACKMSD_FILENAME as found in cfg and db
+        :return: full path filename
+        '''
+        filename = self.cfg[cfgparam]
+        if filename.startswith('_'):
+            filename = self.bname + filename
+        return join(self.outputdir, filename)
+
+    def getColumns(self):
+        """
+        Track columns from config
+        :return: list of track id, frame then position columns
+        """
+        columns = self.cfg['TRACK_COLUMNS']
+        if isinstance(columns, str):
+            columns = [c.strip() for c in columns.split(',') if len(c.strip()) > 0]
+        if len(columns) < 3:
+            raise ValueError("TRACK_COLUMNS requires track id, frame and position columns: %s" % ",".join(columns))
+        return columns
+
+    def getTrajectories(self):
+        """
+        Tracks from binary trajectories file (.trk) or tracking data
+        :return: Trajectories
+        """
+        if isTracksFile(self.datafile):
+            tracks = Trajectories.open(self.datafile)
+            msg = "MSD: Data loaded from %s" % self.datafile
+            self.logandprint(msg)
+            return tracks
+        columns = self.getColumns()
+        missing = [c for c in columns if c not in self.data.columns]
+        if len(missing) > 0:
+            raise ValueError("Columns not found in %s: %s" % (self.datafile, ", ".join(missing)))
+        return Trajectories.fromDataFrame(self.data, columns)
+
+    def writeTable(self, outputfile, df):
+        """
+        Write table - tab delimited if .txt otherwise csv
+        :param outputfile: full path filename
+        :param df: dataframe
+        :return: outputfile
+        """
+        if splitext(outputfile)[1] == '.txt':
+            df.to_csv(outputfile, sep='\t', index=False)
+        else:
+            df.to_csv(outputfile, index=False)
+        self.outputfiles.append(outputfile)
+        return outputfile
+
+    def run(self):
+        """
+        Compute MSD of each track and average over tracks
+        :return:
+        """
+        tracks = self.getTrajectories()
+        maxlag = int(self.cfg['MSD_POINTS']) if self.cfg['MSD_POINTS'] is not None else 0
+        interval = float(self.cfg['TIME_INTERVAL'])
+        (msd, pairs) = trajectoryMSD(tracks, maxlag)
+        lags = np.arange(1, msd.shape[1] + 1) * interval
+        msg = "MSD: %d tracks for %d lags" % (len(tracks), msd.shape[1])
+        self.logandprint(msg)
+        # Per track
+        df_msd = pd.DataFrame(msd, columns=['%g' % t for t in lags])
+        df_msd.insert(0, tracks.columns[0], tracks.ids)
+        outputfile = self.writeTable(self.getFilename('TRACKMSD_FILENAME'), df_msd)
+        msg = "MSD data saved: %s" % outputfile
+        self.logandprint(msg)
+        # Average over tracks with each lag
+        counts = np.isfinite(msd).sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            sd = np.nanstd(msd, axis=0, ddof=1) if len(tracks) > 1 else np.full(len(lags), np.nan)
+            df_avg = pd.DataFrame(OrderedDict([('Time', lags), ('MSD', np.nanmean(msd, axis=0)), ('SD', sd),
+                                               ('SEM', sd / np.sqrt(counts)), ('Tracks', counts)]))
+        outputfile = self.writeTable(self.getFilename('AVGMSD_FILENAME'), df_avg)
+        msg = "Average MSD saved: %s" % outputfile
+        self.logandprint(msg)
+        return df_avg
+
+
+def create_parser():
+    """
+    Create commandline parser
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog=sys.argv[0],
+                                     description='''\
+            Computes MSD of each track in tracking data with average MSD
+
+             ''')
+    parser.add_argument('--datafile', action='store', help='Tracking data file', default="AllROI-Tracks.txt")
+    parser.add_argument('--outputdir', action='store', help='Output directory', default=".")
+    parser.add_argument('--points', action='store', help='Number of MSD points', default="10")
+    parser.add_argument('--interval', action='store', help='Time interval between frames (s)', default="0.02")
+    return parser
+
+
+####################################################################################################################
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    print("Input:", args.datafile)
+    print("Output:", args.outputdir)
+
+    try:
+        mod = AutoMSD(args.datafile, args.outputdir)
+        cfg = mod.getConfigurables()
+        cfg['MSD_POINTS'] = args.points
+        cfg['TIME_INTERVAL'] = args.interval
+        for c in cfg.keys():
+            print("config set: ", c, "=", cfg[c])
+        mod.setConfigurables(cfg)
+        mod.run()
+
+    except Exception as e:
+        print(e)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Manifest class
+    1. Records for each process run on an input (file or batch group) the files read and written,
+       with their fingerprints (mtime, size), the config values used and a hash of the module code
+       including the processmodules it imports (eg DataParser, Plotting) so shared code changes invalidate records
+    2. A rerun is skipped if it is up to date, ie all inputs, config and code are unchanged
+       and all outputs still exist unmodified since they were written
+    3. Records are stored as json files in a hidden subdir of the output directory
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import hashlib
+import importlib
+import json
+import logging
+from types import ModuleType
+from os import access, R_OK, stat, makedirs, remove
+from os.path import join, abspath
+from autoanalysis.processmodules.AtomicFile import atomicOpen
+
+MANIFEST_DIR = '.manifest'
+# Package of modules included in code version
+CODE_PACKAGE = 'autoanalysis.processmodules'
+
+
+def isIncremental(config):
+    """
+    Check if incremental reruns are set in config - INCREMENTAL (default false)
+    :param config: dict of config name=value
+    :return: true or false
+    """
+    if config is None:
+        return False
+    return str(config.get('INCREMENTAL')).lower() in ['true', '1', 'y', 'yes']
+
+
+def getFingerprint(filename):
+    """
+    Fingerprint of file as modified time and size
+    :param filename: full path filename
+    :return: [mtime, size] or None if not accessible
+    """
+    try:
+        st = stat(filename)
+        return [st.st_mtime, st.st_size]
+    except OSError:
+        return None
+
+
+def getDependencies(module_name, package=CODE_PACKAGE):
+    """
+    Modules of package used by module - directly or by the modules it uses
+    Found from names imported by each module (modules, functions, classes)
+    :param module_name: full module name
+    :param package: only modules of this package are included
+    :return: sorted list of module names including module_name
+    """
+    found = set()
+    todo = [module_name]
+    while len(todo) > 0:
+        name = todo.pop()
+        if name in found:
+            continue
+        found.add(name)
+        for v in vars(importlib.import_module(name)).values():
+            dep = v.__name__ if isinstance(v, ModuleType) else getattr(v, '__module__', None)
+            if isinstance(dep, str) and dep.startswith(package + '.') and dep not in found:
+                todo.append(dep)
+    return sorted(found)
+
+
+def getCodeVersion(module_name):
+    """
+    Hash of source code of module and the processmodules it uses (see getDependencies)
+    - changed code invalidates all records for that module
+    :param module_name: full module name eg autoanalysis.processmodules.Bleach
+    :return: hex string (empty if source not available eg frozen dist)
+    """
+    try:
+        code = hashlib.sha1()
+        for name in getDependencies(module_name):
+            with open(importlib.import_module(name).__file__, 'rb') as f:
+                code.update(name.encode('utf-8'))
+                code.update(f.read())
+        return code.hexdigest()
+    except Exception as e:
+        logging.debug("Manifest: no code version for %s: %s", module_name, e)
+        return ''
+
+
+class Manifest():
+    def __init__(self, outputdir):
+        """
+        Init manifest
+        :param outputdir: output directory of process - records are in subdir MANIFEST_DIR
+        """
+        self.manifestdir = join(outputdir, MANIFEST_DIR)
+
+    def getRecordfile(self, process, key):
+        """
+        Record location for process and input
+        :param process: module and class name
+        :param key: input file or batch group
+        :return: full path filename
+        """
+        name = hashlib.sha1("|".join([process, key]).encode('utf-8')).hexdigest()
+        return join(self.manifestdir, name + '.json')
+
+    def load(self, process, key):
+        """
+        Load record
+        :return: dict or None if not found
+        """
+        recordfile = self.getRecordfile(process, key)
+        record = None
+        if access(recordfile, R_OK):
+            try:
+                with open(recordfile, 'r') as f:
+                    record = json.load(f)
+            except Exception as e:
+                logging.warning("Manifest: cannot read %s: %s", recordfile, e)
+        return record
+
+    def isUpToDate(self, process, key, inputs, config, code):
+        """
+        Check if outputs of a previous run are up to date
+        :param process: module and class name
+        :param key: input file or batch group
+        :param inputs: list of input files (or batch files) for this run
+        :param config: dict of config values for this run
+        :param code: code version of module
+        :return: record if up to date otherwise None
+        """
+        record = self.load(process, key)
+        if record is None:
+            return None
+        if record.get('code') != code or record.get('config') != config:
+            return None
+        if sorted(record.get('sources', [])) != sorted([abspath(f) for f in inputs]):
+            return None
+        recorded = record.get('inputs', {})
+        # Recorded inputs include extra files read by module (eg bleach data, ROI list)
+        for files in [recorded, record.get('outputs', {})]:
+            for f in files.keys():
+                if getFingerprint(f) != files[f]:
+                    return None
+        if len(record.get('outputs', {})) <= 0:
+            return None
+        return record
+
+    def record(self, process, key, sources, inputs, outputs, config, code):
+        """
+        Save record of run (see atomicOpen)
+        :param sources: list of input files (or batch files) given for this run
+        :param inputs: list of all files read
+        :param outputs: list of files written
+        :return: record file
+        """
+        record = {'process': process,
+                  'key': key,
+                  'code': code,
+                  'config': config,
+                  'sources': [abspath(f) for f in sources],
+                  'inputs': dict([(abspath(f), getFingerprint(f)) for f in sources + inputs]),
+                  'outputs': dict([(abspath(f), getFingerprint(f)) for f in outputs])}
+        makedirs(self.manifestdir, exist_ok=True)
+        recordfile = self.getRecordfile(process, key)
+        with atomicOpen(recordfile, 'w') as f:
+            json.dump(record, f, indent=1)
+        return recordfile
+
+    def delete(self, process, key):
+        """
+        Remove record so next run is not skipped
+        """
+        recordfile = self.getRecordfile(process, key)
+        if access(recordfile, R_OK):
+            remove(recordfile)
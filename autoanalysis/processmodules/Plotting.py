@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Plotting functions
+    1. plotly.js is written once per output directory and shared by all plots there
+    2. ROI viewer - trace data is stored once in a compact sidecar (float32 as base64) and a single html page
+       renders pages of plots (3x3) on demand
+    3. ROI pages - html file per page of 9 ROIs (each with plotly.js included)
+    4. Overlay - WebGL traces downsampled with largest-triangle-three-buckets (LTTB) to a point budget,
+       with ROIs optionally collapsed into percentile bands
+    5. Contact sheets - static png of ROIs in a grid (10x10 per sheet) for checking ROIs quickly
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import base64
+import json
+import warnings
+import webbrowser
+from html import escape
+from os import access, R_OK
+from os.path import join, dirname, basename, abspath
+from urllib.parse import quote
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.image import imsave
+import plotly.graph_objs as go
+from plotly import offline
+from plotly import tools
+from autoanalysis.processmodules.AtomicFile import atomicOpen
+
+PLOTLYJS = 'plotly.min.js'
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{{TITLE}}</title>
+<script src="{{PLOTLYJS}}"></script>
+<script src="{{DATAFILE}}"></script>
+<style>
+body { font-family: sans-serif; margin: 10px; }
+#grid { display: grid; grid-template-columns: repeat({{COLS}}, 1fr); grid-gap: 4px; }
+.plot { height: 300px; }
+</style>
+</head>
+<body>
+<h3 id="title"></h3>
+<div>
+<button onclick="showPage(page - 1)">&lt; Prev</button>
+<span id="pageinfo"></span>
+<button onclick="showPage(page + 1)">Next &gt;</button>
+&nbsp; Go to ROI: <input id="roi" size="8" onchange="findROI(this.value)">
+</div>
+<div id="grid"></div>
+<script>
+function decode(b64) {
+    var s = atob(b64), n = s.length, bytes = new Uint8Array(n);
+    for (var i = 0; i < n; i++) { bytes[i] = s.charCodeAt(i); }
+    return new Float32Array(bytes.buffer);
+}
+var x = Array.prototype.slice.call(decode(ROIDATA.x));
+var y = decode(ROIDATA.y);
+var nframes = x.length, perpage = {{ROWS}} * {{COLS}}, nrois = ROIDATA.names.length;
+var npages = Math.ceil(nrois / perpage), page = 0;
+document.getElementById('title').textContent = ROIDATA.title;
+function showPage(p) {
+    if (p < 0 || p >= npages) { return; }
+    page = p;
+    var grid = document.getElementById('grid');
+    while (grid.firstChild) { Plotly.purge(grid.firstChild); grid.removeChild(grid.firstChild); }
+    for (var k = p * perpage; k < Math.min((p + 1) * perpage, nrois); k++) {
+        var div = document.createElement('div');
+        div.className = 'plot';
+        grid.appendChild(div);
+        var yk = Array.prototype.slice.call(y.subarray(k * nframes, (k + 1) * nframes));
+        Plotly.newPlot(div, [{x: x, y: yk, name: ROIDATA.names[k], mode: 'markers', type: 'scatter', marker: {size: 4}}],
+            {title: ROIDATA.names[k], margin: {l: 40, r: 10, t: 30, b: 30}, xaxis: {title: ROIDATA.xlabel}},
+            {displaylogo: false});
+    }
+    document.getElementById('pageinfo').textContent = 'Page ' + (p + 1) + ' of ' + npages;
+}
+function findROI(name) {
+    var k = ROIDATA.names.indexOf(name);
+    if (k >= 0) { showPage(Math.floor(k / perpage)); }
+}
+showPage(0);
+</script>
+</body>
+</html>
+"""
+
+OVERLAY_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{{TITLE}}</title>
+<script src="{{PLOTLYJS}}"></script>
+</head>
+<body>
+{{PLOT}}
+</body>
+</html>
+"""
+
+# Percentile bands of ROIs in overlay as (lower, upper, fill colour)
+OVERLAY_BANDS = [(5, 95, 'rgba(31, 119, 180, 0.15)'), (25, 75, 'rgba(31, 119, 180, 0.3)')]
+
+
+def writePlotlyJS(outputdir):
+    """
+    Write plotly.js to output directory if not already there - shared by all plots in directory
+    :param outputdir: output directory
+    :return: full path of plotly.js
+    """
+    jsfile = join(outputdir, PLOTLYJS)
+    if not access(jsfile, R_OK):
+        # several workers may write to the same directory
+        with atomicOpen(jsfile, 'w', encoding='utf-8') as f:
+            f.write(offline.get_plotlyjs())
+    return jsfile
+
+
+def encodeArray(values):
+    """
+    Encode values as base64 string of float32 (little endian) - decoded in browser as Float32Array
+    :param values: array of numbers
+    :return: string
+    """
+    return base64.b64encode(np.ascontiguousarray(values, dtype='<f4').tobytes()).decode('ascii')
+
+
+def openPlot(outputfile):
+    """
+    Open html in browser (as offline.plot)
+    """
+    webbrowser.open('file://' + abspath(outputfile))
+
+
+def writeROIViewer(xt, df, title, outputfile, rows=3, cols=3, xlabel='Time (s)', auto_open=True):
+    """
+    Write paged viewer of ROI traces - single html with data sidecar and shared plotly.js
+    :param xt: x values (Time)
+    :param df: dataframe with a column per ROI
+    :param title: title of page
+    :param outputfile: html filename - data is saved as _data.js with same name
+    :param rows: rows of plots per page
+    :param cols: columns of plots per page
+    :param xlabel: x axis title
+    :param auto_open: open in browser
+    :return: list of files written (html, data, plotly.js)
+    """
+    outputdir = dirname(outputfile)
+    jsfile = writePlotlyJS(outputdir)
+    datafile = outputfile.replace('.html', '_data.js')
+    data = {'title': title,
+            'xlabel': xlabel,
+            'names': [str(c) for c in df.columns],
+            'x': encodeArray(np.asarray(xt, dtype=float)),
+            # all ROIs in one block as ROI x frame
+            'y': encodeArray(np.asarray(df.values, dtype=float).T)}
+    with open(datafile, 'w', encoding='utf-8') as f:
+        f.write('var ROIDATA = ')
+        json.dump(data, f)
+        f.write(';\n')
+    page = VIEWER_HTML
+    for (k, v) in [('{{TITLE}}', escape(title)), ('{{PLOTLYJS}}', quote(basename(jsfile))), ('{{DATAFILE}}', quote(basename(datafile))),
+                   ('{{ROWS}}', str(rows)), ('{{COLS}}', str(cols))]:
+        page = page.replace(k, v)
+    with open(outputfile, 'w', encoding='utf-8') as f:
+        f.write(page)
+    if auto_open:
+        openPlot(outputfile)
+    return [outputfile, datafile, jsfile]
+
+
+def writeROIPage(xt, df, title, outputfile, xlabel='Time (s)', auto_open=True):
+    """
+    Write scatter plots of up to 9 ROIs (3x3) to a single html
+    :param xt: x values (Time)
+    :param df: dataframe with a column per ROI
+    :param title: title of page
+    :param outputfile: html filename
+    :return: list of files written
+    """
+    fig = tools.make_subplots(rows=3, cols=3, shared_xaxes=True, subplot_titles=df.columns)
+    pnum = 0
+    for row in range(1, 4):
+        for col in range(1, 4):
+            if pnum < len(df.columns):
+                fig.append_trace(
+                    go.Scatter(
+                        x=xt,
+                        y=df[df.columns[pnum]].values,
+                        name=df[df.columns[pnum]].name,
+                        mode='markers'
+                    ), row=row, col=col)
+                pnum += 1
+    fig['layout']['title'] = title
+    fig['layout']['xaxis2']['title'] = xlabel
+    offline.plot(fig, filename=outputfile, auto_open=auto_open)
+    return [outputfile]
+
+
+def writeROIPages(xt, df, title, outputfile, auto_open=True):
+    """
+    Write scatter plots of ROIs as html files of 9 ROIs each - numbered from outputfile eg _1.html, _2.html
+    :param xt: x values (Time)
+    :param df: dataframe with a column per ROI
+    :param title: title of pages
+    :param outputfile: html filename
+    :return: list of files written
+    """
+    files = []
+    for (pagenum, start) in enumerate(range(0, len(df.columns), 9)):
+        plotfilename = outputfile.replace('.html', "_" + str(pagenum + 1) + '.html')
+        files += writeROIPage(xt, df[df.columns[start:start + 9]], title, plotfilename, auto_open=auto_open)
+    return files
+
+
+def getLTTBIndices(x, Y, npoints):
+    """
+    Largest-triangle-three-buckets downsampling - indices of points to keep for each row of Y.
+    First and last points are kept, then from each bucket the point forming the largest triangle
+    with the previous kept point and the average of the next bucket. Rows are processed together.
+    :param x: x values (n)
+    :param Y: array of rows of y values (rows x n) - NaNs are never chosen unless a bucket is all NaN
+    :param npoints: number of points to keep per row (all points if 0 or not less than n)
+    :return: array of indices (rows x npoints)
+    """
+    x = np.asarray(x, dtype=float)
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    (nrows, n) = Y.shape
+    if npoints <= 0 or npoints >= n or n < 3:
+        return np.tile(np.arange(n), (nrows, 1))
+    npoints = max(npoints, 3)
+    rows = np.arange(nrows)
+    # bucket edges for points between first and last
+    edges = (np.floor(np.arange(npoints - 1) * (n - 2) / (npoints - 2)) + 1).astype(int)
+    edges[-1] = n - 1
+    indices = np.zeros((nrows, npoints), dtype=int)
+    indices[:, -1] = n - 1
+    a = np.zeros(nrows, dtype=int)
+    with warnings.catch_warnings():
+        # all NaN buckets
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        for i in range(npoints - 2):
+            (start, stop) = (edges[i], edges[i + 1])
+            # average of next bucket (last point for last bucket)
+            nextstop = edges[i + 2] if i + 2 < len(edges) else n
+            cx = np.mean(x[stop:nextstop])
+            cy = np.nanmean(Y[:, stop:nextstop], axis=1)
+            ax = x[a]
+            ay = Y[rows, a]
+            bx = x[start:stop]
+            by = Y[:, start:stop]
+            area = np.abs((ax - cx)[:, np.newaxis] * (by - ay[:, np.newaxis])
+                          - (ax[:, np.newaxis] - bx) * (cy - ay)[:, np.newaxis])
+            a = start + np.argmax(np.where(np.isnan(area), -1, area), axis=1)
+            indices[:, i + 1] = a
+    return indices
+
+
+def writeOverlay(xt, df, title, outputfile, df_fit=None, npoints=2000, band=True, rois=None,
+                 xlabel='Time(s)', ylabel='Signal', auto_open=True):
+    """
+    Write overlay of ROI traces with Average (+/- SD) and fitted decay - WebGL traces with shared plotly.js
+    :param xt: x values (Time)
+    :param df: dataframe with ROI columns (ROI...) and optionally Average and SD
+    :param title: title of plot
+    :param outputfile: html filename
+    :param df_fit: dataframe of fit with x, y_fit
+    :param npoints: max points per trace (0 for all points)
+    :param band: show ROIs as percentile bands instead of individual traces
+    :param rois: list of ROIs also shown as individual traces when band is shown
+    :param xlabel: x axis title
+    :param ylabel: y axis title
+    :param auto_open: open in browser
+    :return: list of files written (html, plotly.js)
+    """
+    x = np.asarray(xt, dtype=float)
+    roicols = [c for c in df.columns if str(c).startswith('ROI')]
+    if band:
+        tracecols = [c for c in roicols if rois is not None and c in rois]
+    else:
+        tracecols = roicols
+    data = []
+    if band and len(roicols) > 0:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            percentiles = np.nanpercentile(df[roicols].values.astype(float), [p for b in OVERLAY_BANDS for p in b[0:2]], axis=1)
+        idx = getLTTBIndices(x, percentiles, npoints)
+        for (i, (lower, upper, colour)) in enumerate(OVERLAY_BANDS):
+            (li, ui) = (idx[2 * i], idx[2 * i + 1])
+            # closed polygon of upper edge then lower edge reversed
+            data.append(go.Scatter(
+                x=np.concatenate((x[ui], x[li][::-1])),
+                y=np.concatenate((percentiles[2 * i + 1][ui], percentiles[2 * i][li][::-1])),
+                name='ROIs %d-%d%%' % (lower, upper),
+                fill='toself',
+                fillcolor=colour,
+                line=dict(width=0),
+                hoverinfo='name',
+                mode='lines'))
+    if len(tracecols) > 0:
+        Y = df[tracecols].values.astype(float).T
+        idx = getLTTBIndices(x, Y, npoints)
+        for (i, col) in enumerate(tracecols):
+            data.append(go.Scattergl(x=x[idx[i]], y=Y[i][idx[i]], name=col, mode='markers'))
+    if 'Average' in df.columns:
+        y = df['Average'].values.astype(float)
+        idx = getLTTBIndices(x, y, npoints)[0]
+        trace = dict(x=x[idx], y=y[idx], name='Average', mode='lines+markers')
+        if 'SD' in df.columns:
+            trace['error_y'] = dict(type='data', array=df['SD'].values[idx], visible=True)
+        data.append(go.Scattergl(**trace))
+    if df_fit is not None:
+        (xf, yf) = (df_fit['x'].values.astype(float), df_fit['y_fit'].values.astype(float))
+        idx = getLTTBIndices(xf, yf, npoints)[0]
+        data.append(go.Scattergl(x=xf[idx], y=yf[idx], name='Fit decay', mode='lines',
+                                 line=dict(color='rgb(229, 61, 89)', width=3)))
+    layout = dict(title=title,
+                  xaxis=dict(title=xlabel),
+                  yaxis=dict(title=ylabel),
+                  )
+    fig = dict(data=data, layout=layout)
+    jsfile = writePlotlyJS(dirname(outputfile))
+    div = offline.plot(fig, output_type='div', include_plotlyjs=False)
+    page = OVERLAY_HTML
+    for (k, v) in [('{{TITLE}}', escape(title)), ('{{PLOTLYJS}}', quote(basename(jsfile))), ('{{PLOT}}', div)]:
+        page = page.replace(k, v)
+    with open(outputfile, 'w', encoding='utf-8') as f:
+        f.write(page)
+    if auto_open:
+        openPlot(outputfile)
+    return [outputfile, jsfile]
+
+
+def writeContactSheets(xt, df, title, outputfile, rows=10, cols=10, size=1.6, dpi=72):
+    """
+    Write png contact sheets of ROI traces - grid of rows x cols ROIs per sheet
+    Each ROI is scaled to its own range (shown after name) so all axes have the same limits:
+    one figure is drawn once as background and only the traces and labels are drawn for each sheet (blitting)
+    :param xt: x values (Time)
+    :param df: dataframe with a column per ROI
+    :param title: title of sheets
+    :param outputfile: png filename - sheets are numbered eg _1.png, _2.png
+    :param rows: rows of ROIs per sheet
+    :param cols: columns of ROIs per sheet
+    :param size: size of each plot (inches)
+    :param dpi: resolution
+    :return: list of files written
+    """
+    x = np.asarray(xt, dtype=float)
+    Y = df.values.astype(float).T
+    with warnings.catch_warnings():
+        # all NaN ROIs
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        ymin = np.nanmin(Y, axis=1)
+        ymax = np.nanmax(Y, axis=1)
+    span = ymax - ymin
+    span[~(span > 0)] = 1
+    Y = (Y - ymin[:, np.newaxis]) / span[:, np.newaxis]
+    # fewer rows if all ROIs fit on one sheet
+    rows = max(min(rows, int(np.ceil(len(df.columns) / cols))), 1)
+    fig = Figure(figsize=(cols * size, rows * size), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    fig.subplots_adjust(left=0.01, right=0.99, bottom=0.01, top=0.95, wspace=0.05, hspace=0.2)
+    heading = fig.suptitle('', animated=True)
+    lines = []
+    labels = []
+    for ax in fig.subplots(rows, cols, squeeze=False).flatten():
+        ax.set_xlim(np.nanmin(x), np.nanmax(x))
+        ax.set_ylim(-0.05, 1.05)
+        ax.set_xticks([])
+        ax.set_yticks([])
+        # animated artists are left out of the background
+        lines.append(ax.plot([], [], linewidth=0.5, animated=True)[0])
+        labels.append(ax.text(0.02, 0.97, '', transform=ax.transAxes, va='top', fontsize=6, animated=True))
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    (width, height) = canvas.get_width_height()
+    perpage = rows * cols
+    npages = int(np.ceil(len(df.columns) / perpage))
+    files = []
+    for page in range(npages):
+        canvas.restore_region(background)
+        heading.set_text('%s [%d of %d]' % (title, page + 1, npages))
+        fig.draw_artist(heading)
+        for (j, k) in enumerate(range(page * perpage, (page + 1) * perpage)):
+            if k < len(df.columns):
+                lines[j].set_data(x, Y[k])
+                labels[j].set_text('%s %.2g' % (df.columns[k], ymax[k] - ymin[k]))
+            else:
+                lines[j].set_data([], [])
+                labels[j].set_text('')
+            lines[j].axes.draw_artist(lines[j])
+            lines[j].axes.draw_artist(labels[j])
+        image = np.frombuffer(canvas.buffer_rgba(), dtype=np.uint8).reshape((height, width, 4))
+        sheetfile = outputfile.replace('.png', "_" + str(page + 1) + '.png')
+        imsave(sheetfile, image)
+        files.append(sheetfile)
+    return files
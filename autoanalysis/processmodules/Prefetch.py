@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Prefetch class
+    1. Reads and parses the next files of a run in a small pool of threads while the current file is processed
+       so file (or network share) latency overlaps with processing
+    2. Parsed sheets are held in memory until requested (see AutoData.loadSheet) - each is handed over once
+    3. Files are only fetched within a memory budget - estimated from file size when submitted (scaled for
+       zipped excel files) then checked against the parsed size: data over the budget is dropped and the file
+       is read when processed instead
+    4. Hits (including waits for a fetch in progress) and misses are counted for the log
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import stat
+from os.path import abspath, splitext
+
+# Files fetched ahead of current file
+PREFETCH_FILES = 2
+# Memory budget for fetched data (MB)
+PREFETCH_SIZE = 512
+# Parsed size estimated as file size times this for excel files (zipped xml)
+EXCEL_EXPANSION = 10
+
+
+def getFileKey(datafile):
+    """
+    File identity - fetched data is only used if file unchanged
+    :return: (full path, mtime, size)
+    """
+    st = stat(datafile)
+    return (abspath(datafile), st.st_mtime, st.st_size)
+
+
+def getEstimate(datafile, size):
+    """
+    Estimate of memory used by parsed file before it is parsed
+    :param datafile: data file
+    :param size: file size in bytes
+    :return: size in bytes
+    """
+    if '.xls' in splitext(datafile)[1].lower():
+        return size * EXCEL_EXPANSION
+    return size
+
+
+def getDataSize(sheets):
+    """
+    Memory used by parsed sheets - including contents of object (text) columns
+    :param sheets: dict of sheet: dataframe
+    :return: size in bytes
+    """
+    return sum([int(df.memory_usage(index=True, deep=True).sum()) for df in sheets.values()])
+
+
+class Prefetcher():
+    def __init__(self, loader, ahead=PREFETCH_FILES, maxsize=PREFETCH_SIZE):
+        """
+        Init prefetcher - threads are started on first fetch
+        :param loader: function(datafile) returning dict of sheet: dataframe (or None if not prefetched)
+        :param ahead: number of files fetched ahead (also number of threads)
+        :param maxsize: memory budget in MB
+        """
+        self.loader = loader
+        self.ahead = ahead
+        self.maxsize = maxsize * 1024 * 1024
+        self.pool = None
+        # full path: (file key, future, size)
+        self.entries = {}
+        self.used = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.waits = 0
+        self.misses = 0
+        self.skipped = 0
+        # time spent waiting for fetches in progress
+        self.waittime = 0.0
+
+    def fetch(self, files):
+        """
+        Start fetching files not already fetched - in order until the memory budget is used
+        :param files: list of next files to be processed
+        """
+        for datafile in files[:self.ahead]:
+            path = abspath(datafile)
+            try:
+                key = getFileKey(datafile)
+            except OSError:
+                continue
+            with self.lock:
+                if path in self.entries:
+                    continue
+                # estimate until parsed (see load)
+                estimate = getEstimate(datafile, key[2])
+                if self.used + estimate > self.maxsize:
+                    self.skipped += 1
+                    logging.debug("Prefetch: over budget - not fetched %s", datafile)
+                    break
+                if self.pool is None:
+                    self.pool = ThreadPoolExecutor(max_workers=max(self.ahead, 1))
+                future = self.pool.submit(self.load, path, estimate)
+                self.entries[path] = (key, future, estimate)
+                self.used += estimate
+
+    def load(self, path, estimate):
+        """
+        Parse file in pool thread - memory used is updated from estimate to size of parsed data
+        Data is dropped (counted as skipped) if it would take memory used over the budget
+        :return: dict of sheet: dataframe or None
+        """
+        sheets = None
+        try:
+            sheets = self.loader(path)
+        except Exception as e:
+            logging.warning("Prefetch: cannot load %s: %s", path, e)
+        size = getDataSize(sheets) if sheets is not None else 0
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[2] == estimate:
+                if self.used - estimate + size > self.maxsize:
+                    self.skipped += 1
+                    logging.debug("Prefetch: over budget when parsed - dropped %s", path)
+                    (sheets, size) = (None, 0)
+                self.entries[path] = (entry[0], entry[1], size)
+                self.used += size - estimate
+            elif entry is None:
+                # released or closed while loading
+                sheets = None
+        return sheets
+
+    def get(self, datafile, sheet=0):
+        """
+        Fetched sheet of file - waits if fetch in progress. The sheet is removed so is only returned once
+        :param datafile: data file
+        :param sheet: sheet name or number (any for csv)
+        :return: dataframe or None if not fetched (miss)
+        """
+        path = abspath(datafile)
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry is None:
+            self.misses += 1
+            return None
+        (key, future, size) = entry
+        if not future.done():
+            self.waits += 1
+            start = time.time()
+        else:
+            start = None
+        sheets = future.result()
+        if start is not None:
+            self.waittime += time.time() - start
+        data = None
+        if sheets is not None and key == getFileKey(datafile):
+            if sheet in sheets:
+                data = sheets.pop(sheet)
+            elif isinstance(sheet, int) and sheet < len(sheets):
+                data = sheets.pop(list(sheets.keys())[sheet])
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.lock:
+            if len(sheets) <= 0:
+                self.discard(datafile)
+        return data
+
+    def discard(self, datafile):
+        """
+        Release fetched data of file (eg when processed) - call with lock held
+        """
+        entry = self.entries.pop(abspath(datafile), None)
+        if entry is not None:
+            self.used -= entry[2]
+
+    def release(self, datafile):
+        """
+        Release any sheets of file not requested
+        :param datafile: data file
+        """
+        with self.lock:
+            self.discard(datafile)
+
+    def close(self):
+        """
+        Stop threads and release all fetched data
+        """
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        with self.lock:
+            self.entries = {}
+            self.used = 0
+
+    def getStats(self):
+        """
+        Summary for log
+        :return: message
+        """
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total > 0 else 0
+        return "Prefetch: %d hits (%d waited %.1fs), %d misses (%d percent hit), %d not fetched over budget" % (
+            self.hits, self.waits, self.waittime, self.misses, rate, self.skipped)
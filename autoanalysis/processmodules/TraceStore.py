@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Trace Store
+    1. Compact store of ROI traces - used when the output filename in config ends with .npy
+       eg EXPT_EXCEL=_Processed.npy
+    2. Traces are saved as a float32 matrix of ROI x frame (.npy) with a json sidecar of the same name (.json)
+       holding ROI names and per frame columns (Time, Frame with STIM marker etc)
+    3. The matrix is opened with numpy.memmap so selecting ROIs or a window of frames only reads the pages needed
+       - each ROI is a contiguous row so recordings larger than memory can be used
+    4. Selected traces are returned as a dataframe of frame x ROI (as loaded from excel)
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import json
+from collections import OrderedDict
+from os.path import splitext
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.AtomicFile import atomicPath
+
+STORE_EXT = '.npy'
+SIDECAR_EXT = '.json'
+
+
+def isTraceStore(filename):
+    """
+    Check if filename is a trace store
+    :param filename: filename
+    :return: true if .npy
+    """
+    return splitext(filename)[1].lower() == STORE_EXT
+
+
+def getSidecar(filename):
+    """
+    Sidecar filename of trace store
+    :param filename: store filename (.npy)
+    :return: json filename
+    """
+    return splitext(filename)[0] + SIDECAR_EXT
+
+
+def saveTraces(outputfile, traces, frames):
+    """
+    Save traces to store - matrix then sidecar replaced when both are written (see atomicPath)
+    :param outputfile: full path filename (.npy)
+    :param traces: dataframe of frame x ROI
+    :param frames: dataframe of per frame columns eg Time, Frame (same rows as traces)
+    :return: list of files written (store and sidecar)
+    """
+    if len(frames) != len(traces):
+        raise ValueError("Frames (%d) do not match traces (%d)" % (len(frames), len(traces)))
+    sidecar = getSidecar(outputfile)
+    with atomicPath(sidecar) as tmpsidecar:
+        with atomicPath(outputfile) as tmpfile:
+            # ROI x frame so each ROI is contiguous
+            matrix = np.lib.format.open_memmap(tmpfile, mode='w+', dtype=np.float32,
+                                               shape=(traces.shape[1], traces.shape[0]))
+            matrix[:] = traces.values.T
+            matrix.flush()
+            del matrix
+            metadata = OrderedDict([('rois', [str(c) for c in traces.columns]),
+                                    ('frames', OrderedDict([(str(c), [None if v != v else v for v in frames[c].tolist()])
+                                                            for c in frames.columns]))])
+            with open(tmpsidecar, 'w') as f:
+                json.dump(metadata, f)
+    return [outputfile, sidecar]
+
+
+class TraceStore():
+    def __init__(self, filename):
+        """
+        Open store - matrix is memory mapped (read only) and sidecar loaded
+        :param filename: store filename (.npy)
+        """
+        self.filename = filename
+        with open(getSidecar(filename), 'r') as f:
+            metadata = json.load(f, object_pairs_hook=OrderedDict)
+        self.rois = metadata['rois']
+        self.frames = pd.DataFrame(metadata['frames'], columns=list(metadata['frames'].keys()))
+        self.matrix = np.load(filename, mmap_mode='r')
+        if self.matrix.shape != (len(self.rois), len(self.frames)):
+            raise ValueError("Trace store does not match sidecar: %s" % filename)
+        self.index = dict([(r, i) for (i, r) in enumerate(self.rois)])
+
+    @property
+    def shape(self):
+        """
+        :return: (number of frames, number of ROIs) as dataframe
+        """
+        return (self.matrix.shape[1], self.matrix.shape[0])
+
+    def getStimulusIndex(self):
+        """
+        Frame with STIM marked
+        :return: index or None if not marked
+        """
+        if 'Frame' in self.frames.columns:
+            stims = [i for (i, x) in enumerate(self.frames['Frame']) if str(x).startswith('STIM')]
+            if len(stims) > 0:
+                return stims[0]
+        return None
+
+    def getTraces(self, rois=None, start=None, stop=None):
+        """
+        Traces of ROIs for a window of frames - only these rows (and columns) of the matrix are read
+        :param rois: list of ROI names (default all)
+        :param start: first frame (default 0)
+        :param stop: frame after last (default all)
+        :return: dataframe of frame x ROI (float) with index of frames
+        """
+        if rois is None:
+            rois = self.rois
+        missing = [r for r in rois if r not in self.index]
+        if len(missing) > 0:
+            raise KeyError("ROIs not found in trace store: %s" % ", ".join(missing))
+        window = slice(start, stop)
+        values = np.empty((len(rois), len(range(*window.indices(self.matrix.shape[1])))))
+        # one row per ROI so only its pages are read
+        for (i, r) in enumerate(rois):
+            values[i] = self.matrix[self.index[r], window]
+        return pd.DataFrame(values.T, columns=list(rois), index=self.frames.index[window])
+
+    def toDataFrame(self):
+        """
+        All traces with per frame columns - as the sheet the store was saved from
+        :return: dataframe
+        """
+        df = self.getTraces()
+        for c in self.frames.columns:
+            df[c] = self.frames[c].values
+        return df
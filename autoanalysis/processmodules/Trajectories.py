@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Trajectories class
+    1. Holds all tracks as flat arrays of frames and positions sorted by track then frame
+       with an index of offsets (start of each track) - track i is rows offsets[i] to offsets[i+1]
+    2. Tracks are accessed as views (Track) and a slice of tracks is a Trajectories sharing the same arrays
+       - no data is copied
+    3. Loaded from tracking exports (tab delimited .txt or csv with track id, frame and position columns)
+    4. Saved to and loaded from a binary file (.trk - numpy npz) - run as script to convert exports
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+
+import argparse
+import json
+import sys
+from os.path import splitext
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.AtomicFile import atomicOpen
+
+TRACKS_EXT = '.trk'
+TRACK_COLUMNS = ['Trajectory', 'Frame', 'x', 'y']
+
+
+def isTracksFile(filename):
+    """
+    Check if filename is a binary trajectories file
+    :return: true if .trk
+    """
+    return splitext(filename)[1].lower() == TRACKS_EXT
+
+
+class Track():
+    """
+    View of a single track - arrays are slices of the trajectories arrays
+    """
+    __slots__ = ('id', 'frames', 'positions')
+
+    def __init__(self, id, frames, positions):
+        self.id = id
+        self.frames = frames
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __repr__(self):
+        return "Track(%s, %d points)" % (str(self.id), len(self.frames))
+
+
+class Trajectories():
+    def __init__(self, ids, offsets, frames, positions, columns=None):
+        """
+        Tracks as flat arrays - use fromArrays, load or open to create
+        :param ids: array of track ids
+        :param offsets: array of start of each track in frames and positions (len ids + 1)
+        :param frames: array of frame per point (sorted by track then frame)
+        :param positions: 2D array of position per point (points x dimensions)
+        :param columns: names of track id, frame and position columns
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.frames = frames
+        self.positions = positions
+        if columns is None:
+            columns = TRACK_COLUMNS[0:2] + ['p%d' % i for i in range(positions.shape[1])]
+        self.columns = list(columns)
+
+    @classmethod
+    def fromArrays(cls, ids, frames, positions, columns=None):
+        """
+        Create from rows of points in any order
+        :param ids: array of track id per point
+        :param frames: array of frame per point
+        :param positions: 2D array of position per point
+        :param columns: names of track id, frame and position columns
+        :return: Trajectories
+        :raises ValueError: if a track has more than one point in a frame
+        """
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim == 1:
+            positions = positions[:, np.newaxis]
+        order = np.lexsort((frames, ids))
+        ids = np.asarray(ids)[order]
+        frames = np.asarray(frames)[order].astype(np.int64)
+        # points of a track in the same frame are adjacent once sorted
+        duplicated = (ids[1:] == ids[:-1]) & (frames[1:] == frames[:-1])
+        if duplicated.any():
+            dups = np.unique(ids[1:][duplicated])
+            names = ", ".join([str(t) for t in dups[:10]]) + (" ..." if len(dups) > 10 else "")
+            raise ValueError("Tracks with more than one point in a frame (%d): %s" % (len(dups), names))
+        (tracks, starts) = np.unique(ids, return_index=True)
+        offsets = np.append(starts, len(ids)).astype(np.int64)
+        return cls(tracks, offsets, frames, positions[order], columns)
+
+    @classmethod
+    def fromDataFrame(cls, df, columns=TRACK_COLUMNS):
+        """
+        Create from dataframe of points - rows with missing values are dropped
+        :param df: dataframe
+        :param columns: track id, frame then position columns
+        :return: Trajectories
+        """
+        missing = [c for c in columns if c not in df.columns]
+        if len(missing) > 0:
+            raise ValueError("Track columns not found: %s" % ", ".join(missing))
+        df = df[columns].dropna()
+        return cls.fromArrays(df[columns[0]].values, df[columns[1]].values, df[columns[2:]].values, columns)
+
+    @classmethod
+    def load(cls, filename, columns=TRACK_COLUMNS):
+        """
+        Load tracking export - only track columns are read
+        :param filename: tab delimited .txt or csv
+        :param columns: track id, frame then position columns
+        :return: Trajectories
+        """
+        sep = '\t' if splitext(filename)[1] == '.txt' else ','
+        return cls.fromDataFrame(pd.read_csv(filename, sep=sep, usecols=columns, skip_blank_lines=True), columns)
+
+    @classmethod
+    def open(cls, filename):
+        """
+        Load binary file written by save
+        :param filename: full path filename (.trk)
+        :return: Trajectories
+        """
+        with np.load(filename) as npz:
+            columns = json.loads(str(npz['columns']))
+            return cls(npz['ids'], npz['offsets'], npz['frames'], npz['positions'], columns)
+
+    def save(self, filename):
+        """
+        Save to binary file (see atomicOpen)
+        :param filename: full path filename (.trk)
+        :return: filename
+        """
+        (start, stop) = (self.offsets[0], self.offsets[-1])
+        with atomicOpen(filename) as f:
+            np.savez(f, ids=self.ids, offsets=self.offsets - start, frames=self.frames[start:stop],
+                     positions=self.positions[start:stop], columns=np.array(json.dumps(self.columns)))
+        return filename
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        """
+        Track by position or tracks by slice (views of the same arrays)
+        :param i: int or slice with step 1
+        :return: Track or Trajectories
+        """
+        if isinstance(i, slice):
+            (start, stop, step) = i.indices(len(self))
+            if step != 1:
+                raise ValueError("Trajectories slices must be contiguous")
+            stop = max(start, stop)
+            return Trajectories(self.ids[start:stop], self.offsets[start:stop + 1], self.frames, self.positions,
+                                self.columns)
+        if i < 0:
+            i += len(self)
+        (start, stop) = (self.offsets[i], self.offsets[i + 1])
+        return Track(self.ids[i], self.frames[start:stop], self.positions[start:stop])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return "Trajectories(%d tracks, %d points)" % (len(self), self.npoints)
+
+    @property
+    def npoints(self):
+        return int(self.offsets[-1] - self.offsets[0])
+
+    @property
+    def lengths(self):
+        """
+        Number of points per track
+        """
+        return np.diff(self.offsets)
+
+    @property
+    def starts(self):
+        """
+        Start of each track in points of these tracks (from 0)
+        """
+        return self.offsets[:-1] - self.offsets[0]
+
+    def getPoints(self):
+        """
+        Frames and positions of these tracks (views)
+        :return: (frames, positions)
+        """
+        (start, stop) = (self.offsets[0], self.offsets[-1])
+        return (self.frames[start:stop], self.positions[start:stop])
+
+    def getOffsets(self):
+        """
+        Frame of each point from first frame of its track
+        :return: array of points
+        """
+        (frames, positions) = self.getPoints()
+        return frames - np.repeat(frames[self.starts], self.lengths)
+
+    def getSpans(self):
+        """
+        Number of frames from first to last frame of each track (including any gaps)
+        """
+        (frames, positions) = self.getPoints()
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return frames[self.starts + self.lengths - 1] - frames[self.starts] + 1
+
+    def toDataFrame(self):
+        """
+        Points as rows of track id, frame and positions
+        :return: dataframe
+        """
+        (frames, positions) = self.getPoints()
+        df = pd.DataFrame(positions, columns=self.columns[2:])
+        df.insert(0, self.columns[1], frames)
+        df.insert(0, self.columns[0], np.repeat(self.ids, self.lengths))
+        return df
+
+
+def create_parser():
+    """
+    Create commandline parser
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog=sys.argv[0],
+                                     description='''\
+            Converts tracking exports to binary trajectories files (.trk)
+
+             ''')
+    parser.add_argument('files', nargs='+', help='Tracking data files')
+    parser.add_argument('--columns', action='store', help='Track id, frame and position columns',
+                        default=",".join(TRACK_COLUMNS))
+    return parser
+
+
+####################################################################################################################
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+    columns = [c.strip() for c in args.columns.split(',')]
+    for f in args.files:
+        tracks = Trajectories.load(f, columns)
+        print("Saved: ", tracks.save(splitext(f)[0] + TRACKS_EXT), tracks)
@@ -0,0 +1,35 @@
+import unittest2 as unittest
+from os import listdir
+from os.path import join
+from autoanalysis.processmodules.AtomicFile import atomicOpen, atomicPath
+from autoanalysis.tests.testutils import TempDirTestCase
+
+class TestAtomicFile(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outputfile = join(self.tmpdir, 'test.json')
+
+    def test_atomicOpen(self):
+        with atomicOpen(self.outputfile, 'w') as f:
+            f.write('first')
+            # not replaced until complete
+            self.assertEqual([], [n for n in listdir(self.tmpdir) if n == 'test.json'])
+        with open(self.outputfile) as f:
+            self.assertEqual('first', f.read())
+
+    def test_failed(self):
+        with atomicOpen(self.outputfile, 'w') as f:
+            f.write('first')
+        # file left as it was and no temp files
+        with self.assertRaises(ValueError):
+            with atomicPath(self.outputfile) as tmpfile:
+                with open(tmpfile, 'w') as f:
+                    f.write('second')
+                raise ValueError('failed')
+        self.assertEqual(['test.json'], listdir(self.tmpdir))
+        with open(self.outputfile) as f:
+            self.assertEqual('first', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest2 as unittest
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.Baseline import Normalized
+
+def fitInWorker(processes):
+    # as run by a worker of a parallel run
+    mod = Normalized.__new__(Normalized)
+    mod.logandprint = lambda msg: None
+    x = np.arange(400) * 0.1
+    df = pd.DataFrame({'ROI%d' % i: np.where(x < 5, 0, 1.5 * np.exp(-(x - 5) / tau) + 0.1)
+                       for i, tau in enumerate([2.0, 5.0, 8.0, 3.0])})
+    return mod.fitDecayROIs(pd.Series(x), df, period=0.75, processes=processes)['Tau'].values
+
+class TestBaseline(unittest.TestCase):
+    def setUp(self):
+        # Test without loading a datafile
+        self.mod = Normalized.__new__(Normalized)
+        self.mod.logandprint = lambda msg: None
+        rng = np.random.RandomState(42)
+        self.data = pd.DataFrame(rng.normal(10, 2, size=(200, 12)),
+                                 columns=['ROI%d' % i for i in range(12)])
+        # max in last rows forces a shifted max index
+        self.data.iloc[-2, 3] = 50
+
+    def test_subtractAvgAll(self):
+        expected = self.data.apply(lambda col: self.mod.subtractAvg(col, 50, 10, 0))
+        data = self.mod.subtractAvgAll(self.data, 50, 10, 0)
+        self.assertTrue(np.array_equal(expected.values, data.values))
+
+    def test_divideMaxAvgAll(self):
+        df_norm = self.mod.subtractAvgAll(self.data, 50, 10, 0)
+        expected = df_norm.apply(lambda col: self.mod.divideMaxAvg(col, 5, 6))
+        data = self.mod.divideMaxAvgAll(df_norm, 5, 6)
+        self.assertTrue(np.array_equal(expected.values, data.values))
+        self.assertEqual(expected.columns.tolist(), data.columns.tolist())
+
+    def test_windowMeans_nan(self):
+        values = np.array([[1.0, np.nan, 3.0, 4.0], [np.nan, np.nan, 1.0, 1.0]])
+        data = self.mod.getWindowMeans(values, np.array([0, 0]), np.array([3, 2]))
+        self.assertEqual(2.0, data[0])
+        self.assertTrue(np.isnan(data[1]))
+
+    def test_fitDecayROIs(self):
+        x = np.arange(400) * 0.1
+        taus = [2.0, 5.0, 8.0]
+        df = pd.DataFrame({'ROI%d' % i: np.where(x < 5, 0, 1.5 * np.exp(-(x - 5) / tau) + 0.1)
+                           for i, tau in enumerate(taus)})
+        data = self.mod.fitDecayROIs(pd.Series(x), df, period=0.75)
+        self.assertEqual(['ROI0', 'ROI1', 'ROI2'], data['ROI'].tolist())
+        self.assertTrue(np.allclose(taus, data['Tau'].values, rtol=1e-3))
+        self.assertTrue(np.allclose(1.5, data['Amplitude'].values, rtol=1e-3))
+
+    def test_fitDecayROIs_worker(self):
+        # no nested pool in worker processes
+        pool = Pool(processes=1)
+        try:
+            taus = pool.apply(fitInWorker, (2,))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertTrue(np.allclose([2.0, 5.0, 8.0, 3.0], taus, rtol=1e-3))
@@ -0,0 +1,82 @@
+import unittest2 as unittest
+from unittest import mock
+from os import makedirs, remove
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.Container import isContainer, saveContainer, loadTable, loadContainer, getTableNames, toExcel
+from autoanalysis.tests.testutils import TempDirTestCase
+
+class TestContainer(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outputfile = join(self.tmpdir, 'test_Processed.npz')
+        self.df = pd.DataFrame({'Frame': ['STIM' if i == 2 else str(i) for i in range(10)],
+                                'Time': np.arange(10) * 0.1, 'ROI1': np.random.rand(10), 'Count': np.arange(10)},
+                               columns=['Frame', 'Time', 'ROI1', 'Count'])
+        self.df.loc[3, 'ROI1'] = np.nan
+
+    def test_isContainer(self):
+        self.assertTrue(isContainer(self.outputfile))
+        self.assertFalse(isContainer('test_Processed.xlsx'))
+
+    def test_saveContainer(self):
+        saveContainer(self.outputfile, {'raw': self.df, 'bleach subtracted': self.df[['ROI1', 'Time']]})
+        self.assertEqual(['raw', 'bleach subtracted'], getTableNames(self.outputfile))
+        data = loadTable(self.outputfile, 'raw')
+        self.assertEqual(list(self.df.columns), list(data.columns))
+        self.assertEqual(self.df['Frame'].tolist(), data['Frame'].tolist())
+        self.assertEqual(self.df['Count'].tolist(), data['Count'].tolist())
+        np.testing.assert_array_equal(self.df['ROI1'].values, data['ROI1'].values)
+        # by number as sheets
+        self.assertEqual(['ROI1', 'Time'], list(loadTable(self.outputfile, 1).columns))
+        self.assertRaises(ValueError, loadTable, self.outputfile, 'normalized')
+
+    def test_roundtrip(self):
+        # missing text and bool columns as loaded from excel
+        df = pd.DataFrame({'Frame': ['1', np.nan, 'STIM', None], 'Selected': [True, False, True, True],
+                           'Time': np.arange(4) * 0.1}, columns=['Frame', 'Selected', 'Time'])
+        saveContainer(self.outputfile, {'raw': df})
+        data = loadTable(self.outputfile, 'raw')
+        self.assertEqual(bool, data['Selected'].dtype)
+        self.assertEqual([True, False, True, True], data['Selected'].tolist())
+        self.assertEqual([False, True, False, True], data['Frame'].isnull().tolist())
+        self.assertEqual(['1', 'STIM'], data['Frame'].dropna().tolist())
+
+    def test_source(self):
+        saveContainer(self.outputfile, {'raw': self.df})
+        outputdir = join(self.tmpdir, 'output')
+        makedirs(outputdir)
+        normfile = join(outputdir, 'test_Normalized.npz')
+        saveContainer(normfile, {'normalized': self.df[['ROI1']]}, self.outputfile, ['raw'])
+        self.assertEqual(['normalized'], getTableNames(normfile))
+        tables = loadContainer(normfile)
+        self.assertEqual(['raw', 'normalized'], list(tables.keys()))
+        self.assertEqual(self.df['Frame'].tolist(), tables['raw']['Frame'].tolist())
+        # export with source tables
+        sheets = pd.read_excel(toExcel(normfile), sheet_name=None)
+        self.assertEqual(['raw', 'normalized'], list(sheets.keys()))
+        np.testing.assert_allclose(self.df['Time'].values, sheets['raw']['Time'].values)
+
+    def test_sourceChanged(self):
+        saveContainer(self.outputfile, {'raw': self.df})
+        normfile = join(self.tmpdir, 'test_Normalized.npz')
+        saveContainer(normfile, {'normalized': self.df[['ROI1']]}, self.outputfile, ['raw'])
+        # source rewritten (eg Bleach rerun)
+        saveContainer(self.outputfile, {'raw': self.df.iloc[:5]})
+        self.assertRaises(ValueError, loadTable, normfile, 'raw')
+        self.assertEqual(['ROI1'], list(loadTable(normfile, 'normalized').columns))
+
+    def test_sourceNotLinked(self):
+        saveContainer(self.outputfile, {'raw': self.df})
+        normfile = join(self.tmpdir, 'test_Normalized.npz')
+        # as for source on another drive
+        with mock.patch('autoanalysis.processmodules.Container.relpath', side_effect=ValueError('different drives')):
+            saveContainer(normfile, {'normalized': self.df[['ROI1']]}, self.outputfile, ['raw'])
+        self.assertEqual(['raw', 'normalized'], getTableNames(normfile))
+        remove(self.outputfile)
+        self.assertEqual(self.df['Frame'].tolist(), loadTable(normfile, 'raw')['Frame'].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
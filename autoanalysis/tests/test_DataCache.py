@@ -0,0 +1,53 @@
+import unittest2 as unittest
+from os import utime
+from os.path import join, getmtime
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.DataCache import DataCache
+from autoanalysis.tests.testutils import TempDirTestCase
+
+class TestDataCache(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = DataCache(join(self.tmpdir, 'cache'), maxsize=100)
+        self.datafile = join(self.tmpdir, 'test.csv')
+        self.data = pd.DataFrame({'Time': np.arange(10) * 0.5,
+                                  'Frame': [1, 2, 'STIM_3', 4, 5, 6, 7, 8, 9, 10],
+                                  'ROI1': np.random.rand(10)})
+        self.data.to_csv(self.datafile, index=False)
+
+    def test_roundtrip(self):
+        self.assertIsNone(self.cache.get(self.datafile))
+        self.cache.put(self.datafile, self.data)
+        data = self.cache.get(self.datafile)
+        self.assertTrue(self.data.equals(data))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_objects(self):
+        # mixed values of object columns and index stored without pickle
+        data = pd.DataFrame({'Frame': [1, 'STIM', None, 2.5, np.nan, True, ''], 'Time': np.arange(7) * 0.5},
+                            index=['a', 'b', 'c', 'd', 'e', 'f', 'g'])
+        cachefile = self.cache.put(self.datafile, data)
+        with np.load(cachefile, allow_pickle=False) as arrays:
+            self.assertEqual('U', arrays['c0'].dtype.kind)
+        cached = self.cache.get(self.datafile)
+        self.assertTrue(data.equals(cached))
+        self.assertEqual([int, str, type(None), float, float, bool, str], [type(v) for v in cached['Frame']])
+        self.assertEqual(list(data.index), list(cached.index))
+
+    def test_modified(self):
+        self.cache.put(self.datafile, self.data)
+        mtime = getmtime(self.datafile) + 10
+        utime(self.datafile, (mtime, mtime))
+        self.assertIsNone(self.cache.get(self.datafile))
+
+    def test_sheet(self):
+        self.cache.put(self.datafile, self.data, sheet='raw')
+        self.assertIsNone(self.cache.get(self.datafile, sheet='bleach subtracted'))
+        self.assertIsNotNone(self.cache.get(self.datafile, sheet='raw'))
+
+    def test_evict(self):
+        self.cache.put(self.datafile, self.data)
+        self.assertGreater(self.cache.size(), 0)
+        self.assertEqual(1, self.cache.clear())
+        self.assertEqual(0, self.cache.size())
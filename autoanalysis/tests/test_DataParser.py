@@ -0,0 +1,44 @@
+import unittest2 as unittest
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.DataParser import AutoData
+from autoanalysis.tests.testutils import TempDirTestCase
+
+class TestDataParser(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.datafile = join(self.tmpdir, 'test_Processed.xlsx')
+        writer = pd.ExcelWriter(self.datafile, engine='xlsxwriter')
+        pd.DataFrame({'ROI1': np.arange(5)}).to_excel(writer, index=False, sheet_name='bleach subtracted')
+        pd.DataFrame({'Time': np.arange(5) * 0.5}).to_excel(writer, index=False, sheet_name='raw')
+        writer.close()
+        # No cache so all loads are parsed
+        self.cache = AutoData.cache
+        AutoData.cache = None
+
+    def tearDown(self):
+        AutoData.cache = self.cache
+        super().tearDown()
+
+    def test_lazyload(self):
+        mod = AutoData(self.datafile, sheet='bleach subtracted')
+        self.assertEqual({}, mod.sheets)
+        self.assertEqual(['ROI1'], mod.data.columns.tolist())
+        self.assertEqual(['bleach subtracted'], list(mod.sheets.keys()))
+
+    def test_missing(self):
+        # checked when created rather than when first loaded
+        self.assertRaises(IOError, AutoData, join(self.tmpdir, 'missing.xlsx'))
+
+    def test_getSheets(self):
+        mod = AutoData(self.datafile, sheet='bleach subtracted')
+        loaded = []
+        load = mod.loadSheet
+        mod.loadSheet = lambda sheet: loaded.append(sheet) or load(sheet)
+        (data, raw) = mod.getSheets(['bleach subtracted', 'raw'])
+        mod.getSheet('raw')
+        self.assertIs(data, mod.data)
+        self.assertEqual(['Time'], raw.columns.tolist())
+        self.assertEqual(['bleach subtracted', 'raw'], loaded)
+        self.assertIsNone(mod.workbook)
@@ -0,0 +1,56 @@
+import unittest2 as unittest
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.Diffusion import AutoDiffusion, fitLinear, fitDiffusion
+from autoanalysis.tests.testutils import TempDirTestCase, configuredModule
+
+class TestDiffusion(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.t = np.arange(1, 11) * 0.02
+        self.D = np.array([0.01, 0.1, 0.5, 0.05])
+        # 2D MSD with offset
+        self.msd = 4 * self.D[:, np.newaxis] * self.t + 0.003
+
+    def test_fitLinear(self):
+        Y = np.array([[1, 3, 5, 7], [2, np.nan, 4, np.nan], [1, np.nan, np.nan, np.nan]], dtype=float)
+        (slope, intercept, n) = fitLinear(np.arange(4), Y)
+        np.testing.assert_allclose([2, 1], slope[:2])
+        np.testing.assert_allclose([1, 2], intercept[:2])
+        self.assertEqual([4, 2, 1], n.tolist())
+        # one point - no fit
+        self.assertTrue(np.isnan(slope[2]))
+        # as least squares
+        Y = np.random.RandomState(1).rand(5, 10)
+        (slope, intercept, n) = fitLinear(self.t, Y)
+        np.testing.assert_allclose(np.polyfit(self.t, Y.T, 1)[0], slope)
+
+    def test_fitDiffusion(self):
+        (D, intercept, n) = fitDiffusion(self.msd, 0.02)
+        np.testing.assert_allclose(self.D, D)
+        np.testing.assert_allclose(0.003, intercept)
+        # first points only
+        msd = self.msd.copy()
+        msd[:, 5:] = 0
+        (D, intercept, n) = fitDiffusion(msd, 0.02, 5)
+        np.testing.assert_allclose(self.D, D)
+        self.assertEqual([5] * 4, n.tolist())
+
+    def test_run(self):
+        datafile = join(self.tmpdir, 'Track_MSD.txt')
+        df = pd.DataFrame(self.msd, columns=['%g' % t for t in self.t])
+        df.insert(0, 'Trajectory', [1, 2, 3, 4])
+        df.iloc[3, 1:] = -df.iloc[3, 1:]
+        df.to_csv(datafile, sep='\t', index=False)
+        mod = configuredModule(AutoDiffusion, datafile, self.tmpdir)
+        mod.run()
+        results = pd.read_csv(join(self.tmpdir, 'Track_D.txt'), sep='\t')
+        self.assertEqual(['Trajectory', u'D(µm²/s)', 'log10D', 'Intercept', 'Points'], list(results.columns))
+        np.testing.assert_allclose(np.log10(self.D[:3]), results['log10D'].values[:3])
+        # no log for D <= 0
+        self.assertTrue(np.isnan(results['log10D'].values[3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
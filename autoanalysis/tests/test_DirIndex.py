@@ -0,0 +1,59 @@
+import unittest2 as unittest
+import time
+from os import makedirs, utime, remove, symlink
+from os.path import join
+from autoanalysis.processmodules.DirIndex import DirIndex
+from autoanalysis.tests.testutils import TempDirTestCase
+
+class TestDirIndex(TempDirTestCase):
+    def setUp(self):
+        DirIndex.clear()
+        super().setUp()
+        self.exptdir = join(self.tmpdir, 'Control', 'EXP1')
+        makedirs(join(self.exptdir, 'processed'))
+        makedirs(join(self.exptdir, '.manifest'))
+        self.files = [join(self.exptdir, 'EXP1_Time Trace(s).csv'),
+                      join(self.exptdir, 'Bleach Time Trace(s).csv'),
+                      join(self.exptdir, 'processed', 'EXP1_Time Trace(s)_Processed.xlsx'),
+                      join(self.exptdir, '.manifest', 'hidden.json')]
+        for f in self.files:
+            open(f, 'w').close()
+
+    def tearDown(self):
+        DirIndex.clear()
+        super().tearDown()
+
+    def test_symlinkLoop(self):
+        # link back to parent is not followed
+        symlink(self.exptdir, join(self.exptdir, 'processed', 'loop'))
+        index = DirIndex.get(self.tmpdir)
+        self.assertEqual(3, len(index.getFiles()))
+
+    def test_find(self):
+        index = DirIndex.get(self.tmpdir)
+        self.assertEqual(3, len(index.getFiles()))
+        self.assertEqual([self.files[2]], index.find(suffix='_Processed.xlsx'))
+        self.assertEqual([self.files[1]], index.find(name='Bleach Time Trace(s).csv', under=self.exptdir))
+        self.assertEqual(2, len(index.find(pattern='*.csv')))
+        self.assertEqual([], index.find(contains='EXP1', under=join(self.tmpdir, 'Treatment1')))
+
+    def test_shared(self):
+        index = DirIndex.get(self.tmpdir)
+        self.assertIs(index, DirIndex.get(self.exptdir))
+        indexes = DirIndex.getIndexes([self.exptdir, join(self.exptdir, 'processed')])
+        self.assertIs(index, indexes[join(self.exptdir, 'processed')])
+
+    def test_refresh(self):
+        index = DirIndex.get(self.exptdir)
+        self.assertEqual(0, index.refresh())
+        newfile = join(self.exptdir, 'processed', 'EXP1_Time Trace(s)_Normalized.xlsx')
+        open(newfile, 'w').close()
+        # ensure mtime changed on coarse filesystems
+        mtime = time.time() + 10
+        utime(join(self.exptdir, 'processed'), (mtime, mtime))
+        self.assertEqual(1, index.refresh())
+        self.assertIn(newfile, index.getFiles())
+        remove(newfile)
+        utime(join(self.exptdir, 'processed'), (mtime + 10, mtime + 10))
+        DirIndex.get(self.exptdir)
+        self.assertNotIn(newfile, index.getFiles())
@@ -0,0 +1,58 @@
+import unittest2 as unittest
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.ExcelExport import ExcelStream, writeExcel, exportExcel, waitExport, flushExports, exporter
+from autoanalysis.tests.testutils import TempDirTestCase
+
+class TestExcelExport(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outputfile = join(self.tmpdir, 'test_Processed.xlsx')
+        self.df = pd.DataFrame({'Time': np.arange(10) * 0.1, 'ROI1': np.random.rand(10)}, columns=['Time', 'ROI1'])
+        self.df.loc[3, 'ROI1'] = np.nan
+
+    def test_stream(self):
+        with ExcelStream(self.outputfile) as excel:
+            excel.addSheet('raw', self.df.columns)
+            excel.addSheet('other', ['Frame'])
+            # in blocks with sheets alternating
+            self.assertEqual(4, excel.writeBlock('raw', self.df.values[0:4]))
+            excel.writeBlock('other', [['STIM']])
+            excel.writeBlock('raw', self.df.values[4:])
+        sheets = pd.read_excel(self.outputfile, sheet_name=None)
+        self.assertEqual(['raw', 'other'], list(sheets.keys()))
+        np.testing.assert_allclose(self.df.values, sheets['raw'].values)
+        self.assertEqual('STIM', sheets['other']['Frame'][0])
+
+    def test_writeExcel(self):
+        self.df['Frame'] = ['STIM' if i == 2 else str(i) for i in range(10)]
+        writeExcel(self.outputfile, {'raw': self.df, 'empty': self.df.iloc[0:0]})
+        sheets = pd.read_excel(self.outputfile, sheet_name=None)
+        np.testing.assert_allclose(self.df[['Time', 'ROI1']].values, sheets['raw'][['Time', 'ROI1']].values)
+        self.assertEqual(self.df['Frame'].tolist(), [str(f) for f in sheets['raw']['Frame']])
+        self.assertEqual(list(self.df.columns), list(sheets['empty'].columns))
+
+    def test_exportExcel(self):
+        exportExcel(self.outputfile, {'raw': self.df})
+        waitExport(self.outputfile)
+        np.testing.assert_allclose(self.df.values, pd.read_excel(self.outputfile).values)
+        # errors raised when flushed
+        exportExcel(join(self.tmpdir, 'missing', 'test.xlsx'), {'raw': self.df})
+        self.assertRaises(IOError, flushExports)
+        flushExports()
+
+    def test_exportError(self):
+        missing = join(self.tmpdir, 'missing', 'test.xlsx')
+        # raised for file when waited for
+        exportExcel(missing, {'raw': self.df})
+        waitExport(self.outputfile)
+        with self.assertRaisesRegex(IOError, 'missing'):
+            waitExport(missing)
+        flushExports()
+        # else raised by next export
+        exportExcel(missing, {'raw': self.df})
+        exporter.queue.join()
+        with self.assertRaisesRegex(IOError, 'missing'):
+            exportExcel(self.outputfile, {'raw': self.df})
+        flushExports()
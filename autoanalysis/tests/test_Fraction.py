@@ -0,0 +1,71 @@
+import unittest2 as unittest
+from os import makedirs
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules import Fraction
+from autoanalysis.processmodules.Fraction import AutoFraction, classifyTracks
+from autoanalysis.tests.testutils import TempDirTestCase, configuredModule
+
+class TestFraction(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.RandomState(1)
+        self.groups = {'all': [], 'stim': [], 'nostim': []}
+        self.data = {}
+        for group in ['stim', 'nostim']:
+            for c in range(3):
+                outputdir = join(self.tmpdir, group, 'cell%d' % c, 'processed')
+                makedirs(outputdir)
+                filename = join(outputdir, 'AllROI-D_Filtered_log10D.csv')
+                values = rng.uniform(-4, 0, rng.randint(50, 200))
+                pd.DataFrame({'Trajectory': np.arange(len(values)), 'log10D': values}).to_csv(filename, index=False)
+                self.groups[group].append(filename)
+                self.groups['all'].append(filename)
+                self.data[filename] = values
+
+    def test_classifyTracks(self):
+        self.assertEqual((2, 1), classifyTracks([-2, -1.6, np.nan, 0.5], -1.6))
+
+    def test_run(self):
+        # small chunks so files are read in parts
+        Fraction.READ_CHUNKSIZE = 16
+        try:
+            mod = configuredModule(AutoFraction, self.groups, '')
+            outputfile = mod.run()
+        finally:
+            Fraction.READ_CHUNKSIZE = 100000
+        self.assertEqual([outputfile], mod.outputfiles)
+        results = pd.read_csv(outputfile)
+        self.assertEqual(8, len(results))
+        cells = results[results['Cell'] != 'All']
+        self.assertEqual(['stim'] * 3 + ['nostim'] * 3, cells['Group'].tolist())
+        self.assertEqual(['stim_cell0', 'stim_cell1', 'stim_cell2'], cells['Cell'].tolist()[:3])
+        fractions = []
+        for (i, filename) in enumerate(self.groups['stim'] + self.groups['nostim']):
+            values = self.data[filename]
+            fractions.append((values < -1.6).mean())
+            self.assertEqual(len(values), cells['Tracks'].values[i])
+            self.assertAlmostEqual(fractions[-1], cells['Immobile_Fraction'].values[i])
+        for (i, group) in enumerate(['stim', 'nostim']):
+            row = results[(results['Group'] == group) & (results['Cell'] == 'All')].iloc[0]
+            values = np.concatenate([self.data[f] for f in self.groups[group]])
+            self.assertEqual(3, row['Cells'])
+            self.assertEqual((values >= -1.6).sum(), row['Mobile'])
+            self.assertAlmostEqual((values < -1.6).mean(), row['Immobile_Fraction'])
+            f = np.array(fractions[i * 3:i * 3 + 3])
+            self.assertAlmostEqual(f.mean(), row['Immobile_Mean'])
+            self.assertAlmostEqual(f.std(ddof=1) / np.sqrt(3), row['Immobile_SEM'])
+
+    def test_group(self):
+        # single group as batch
+        mod = configuredModule(AutoFraction, self.groups['stim'], join(self.tmpdir))
+        mod.prefix = 'stim'
+        outputfile = mod.run()
+        self.assertEqual(join(self.tmpdir, 'stim_stim_Fraction_log10D.csv'), outputfile)
+        results = pd.read_csv(outputfile)
+        self.assertEqual(['cell0', 'cell1', 'cell2', 'All'], results['Cell'].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest2 as unittest
+from os import makedirs
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.GroupMSD import AutoGroupMSD, Welford, mergeTables, toTable
+from autoanalysis.tests.testutils import TempDirTestCase, configuredModule
+
+class TestGroupMSD(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.RandomState(1)
+        self.groups = {'all': [], 'stim': [], 'nostim': []}
+        self.curves = {'stim': [], 'nostim': []}
+        for group in ['stim', 'nostim']:
+            for c in range(5):
+                outputdir = join(self.tmpdir, group, 'cell%d' % c, 'processed')
+                makedirs(outputdir)
+                filename = join(outputdir, 'Avg_MSD.csv')
+                # cells may have fewer lags or lags without MSD
+                msd = np.full(10, np.nan)
+                n = rng.randint(6, 11)
+                msd[:n] = np.arange(1, n + 1) * rng.uniform(0.01, 0.1) + 1000
+                if c == 2:
+                    msd[3] = np.nan
+                pd.DataFrame({'Time': np.arange(1, n + 1) * 0.02, 'MSD': msd[:n]}).to_csv(filename, index=False)
+                self.groups[group].append(filename)
+                self.groups['all'].append(filename)
+                self.curves[group].append(msd)
+
+    def test_welford(self):
+        curves = np.array(self.curves['stim'] + self.curves['nostim'])
+        acc = Welford()
+        for curve in curves:
+            acc.add(curve)
+        np.testing.assert_allclose(np.nanmean(curves, axis=0), acc.getMean())
+        np.testing.assert_allclose(np.nanstd(curves, axis=0, ddof=1), acc.getSD())
+        np.testing.assert_array_equal(np.isfinite(curves).sum(axis=0), acc.count)
+        # merged partial accumulators give the same
+        parts = [Welford(), Welford()]
+        for (i, curve) in enumerate(curves):
+            parts[i % 3 == 0].add(curve[:7] if i == 1 else curve)
+        parts[0].merge(parts[1])
+        curves[1, 7:] = np.nan
+        np.testing.assert_allclose(np.nanmean(curves, axis=0), parts[0].getMean())
+        np.testing.assert_allclose(np.nanstd(curves, axis=0, ddof=1), parts[0].getSD())
+        # merged accumulator with fewer lags is not changed
+        short = Welford()
+        short.add(curves[0][:5])
+        parts[0].merge(short)
+        self.assertEqual(5, len(short.count))
+        np.testing.assert_array_equal(np.ones(5), short.count)
+
+    def test_run(self):
+        mod = configuredModule(AutoGroupMSD, self.groups, '')
+        outputfile = mod.run()
+        self.assertEqual(join(self.tmpdir, mod.base.split('/')[-1] + '_Group_MSD.csv'), outputfile)
+        results = pd.read_csv(outputfile)
+        for group in ['stim', 'nostim']:
+            rows = results[results['Group'] == group]
+            curves = np.array(self.curves[group])
+            np.testing.assert_allclose(np.nanmean(curves, axis=0), rows['MSD'].values)
+            sem = np.nanstd(curves, axis=0, ddof=1) / np.sqrt(np.isfinite(curves).sum(axis=0))
+            np.testing.assert_allclose(sem, rows['SEM'].values)
+        np.testing.assert_allclose(np.arange(1, 11) * 0.02, rows['Time'].values)
+
+    def test_merge(self):
+        # shards of cells of the same group
+        outputfiles = []
+        for (i, files) in enumerate([self.groups['stim'][:2], self.groups['stim'][2:]]):
+            outputdir = join(self.tmpdir, 'shard%d' % i)
+            makedirs(outputdir)
+            mod = configuredModule(AutoGroupMSD, files, outputdir)
+            mod.prefix = 'stim'
+            outputfiles.append(mod.run())
+        (groups, times) = mergeTables(outputfiles)
+        results = toTable(groups, times)
+        curves = np.array(self.curves['stim'])
+        self.assertEqual(['stim'], list(groups.keys()))
+        np.testing.assert_allclose(np.nanmean(curves, axis=0), results['MSD'].values)
+        np.testing.assert_allclose(np.nanstd(curves, axis=0, ddof=1), results['SD'].values)
+        self.assertEqual(np.isfinite(curves).sum(axis=0).tolist(), results['Cells'].tolist())
+
+    def test_times(self):
+        # cell with other frame interval
+        filename = self.groups['stim'][1]
+        df = pd.read_csv(filename)
+        df['Time'] = df['Time'] * 2
+        df.to_csv(filename, index=False)
+        mod = configuredModule(AutoGroupMSD, self.groups, '')
+        with self.assertRaisesRegex(ValueError, filename):
+            mod.run()
+        # outputs of runs with other lag times
+        outputfiles = []
+        for (i, files) in enumerate([self.groups['stim'][:1], self.groups['stim'][1:2]]):
+            mod = configuredModule(AutoGroupMSD, files, join(self.tmpdir, 'stim'))
+            mod.prefix = 'shard%d' % i
+            outputfiles.append(mod.run())
+        with self.assertRaisesRegex(ValueError, outputfiles[1]):
+            mergeTables(outputfiles)
+
+
+if __name__ == "__main__":
+    unittest.main()
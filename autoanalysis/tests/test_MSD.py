@@ -0,0 +1,66 @@
+import unittest2 as unittest
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.MSD import AutoMSD, computeMSD
+from autoanalysis.tests.testutils import TempDirTestCase, configuredModule
+
+class TestMSD(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.RandomState(1)
+        tracks = []
+        for t in range(20):
+            n = rng.randint(2, 40)
+            frames = np.arange(n) + rng.randint(0, 100)
+            positions = np.cumsum(rng.normal(0, 0.1, (n, 2)), axis=0) + rng.uniform(0, 50, 2)
+            tracks.append(pd.DataFrame({'Trajectory': t + 1, 'Frame': frames, 'x': positions[:, 0], 'y': positions[:, 1]},
+                                       columns=['Trajectory', 'Frame', 'x', 'y']))
+        # unsorted as may be exported
+        self.data = pd.concat(tracks).sample(frac=1, random_state=1)
+
+    def naiveMSD(self, data, maxlag):
+        msd = []
+        for (t, track) in data.groupby('Trajectory'):
+            track = track.sort_values('Frame')
+            frames = track['Frame'].values - track['Frame'].values[0]
+            positions = np.full((frames[-1] + 1, 2), np.nan)
+            positions[frames] = track[['x', 'y']].values
+            row = []
+            for lag in range(1, maxlag + 1):
+                d = ((positions[lag:] - positions[:-lag]) ** 2).sum(axis=1)
+                d = d[np.isfinite(d)]
+                row.append(d.mean() if len(d) > 0 else np.nan)
+            msd.append(row)
+        return np.array(msd)
+
+    def test_computeMSD(self):
+        (tracks, msd, pairs) = computeMSD(self.data['Trajectory'].values, self.data['Frame'].values,
+                                          self.data[['x', 'y']].values, 10)
+        self.assertEqual(list(range(1, 21)), tracks.tolist())
+        self.assertEqual((20, 10), msd.shape)
+        np.testing.assert_allclose(self.naiveMSD(self.data, 10), msd, atol=1e-10)
+        # pairs per lag
+        lengths = self.data.groupby('Trajectory').size().values
+        np.testing.assert_array_equal(np.maximum(lengths - 1, 0), pairs[:, 0])
+
+    def test_gaps(self):
+        # missing frames only give pairs present
+        data = self.data.drop(self.data.index[::3])
+        data = data[data.groupby('Trajectory')['Frame'].transform('size') > 1]
+        (tracks, msd, pairs) = computeMSD(data['Trajectory'].values, data['Frame'].values, data[['x', 'y']].values, 0)
+        np.testing.assert_allclose(self.naiveMSD(data, msd.shape[1]), msd, atol=1e-10)
+
+    def test_run(self):
+        datafile = join(self.tmpdir, 'AllROI-Tracks.txt')
+        self.data.to_csv(datafile, sep='\t', index=False)
+        mod = configuredModule(AutoMSD, datafile, self.tmpdir, MSD_POINTS=5)
+        df_avg = mod.run()
+        df_msd = pd.read_csv(join(self.tmpdir, 'Track_MSD.txt'), sep='\t')
+        self.assertEqual(['Trajectory', '0.02', '0.04', '0.06', '0.08', '0.1'], list(df_msd.columns))
+        np.testing.assert_allclose(np.nanmean(self.naiveMSD(self.data, 5), axis=0), df_avg['MSD'].values)
+        self.assertEqual(2, len(mod.outputfiles))
+
+
+if __name__ == "__main__":
+    unittest.main()
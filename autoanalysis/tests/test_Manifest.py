@@ -0,0 +1,90 @@
+import unittest2 as unittest
+from os import utime
+from os.path import join, getmtime
+from autoanalysis.controller import runModule, renderPlot
+from autoanalysis.processmodules.Manifest import Manifest, isIncremental, getDependencies
+from autoanalysis.tests.testutils import TempDirTestCase
+
+def writePlot(outputfile):
+    with open(outputfile, 'w') as f:
+        f.write('<html></html>')
+    return [outputfile]
+
+
+class PlotModule():
+    # module with deferred plot
+    def __init__(self, datafile, outputdir, plotfile):
+        self.inputfiles = [datafile]
+        self.outputdir = outputdir
+        self.outputfiles = []
+        self.plotjobs = []
+        self.plotfile = plotfile
+
+    def run(self):
+        self.plotjobs.append((writePlot, (self.plotfile,)))
+
+
+class TestManifest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manifest = Manifest(self.tmpdir)
+        self.process = 'autoanalysis.processmodules.Bleach.Bleach'
+        self.datafile = join(self.tmpdir, 'test.csv')
+        self.extrafile = join(self.tmpdir, 'bleach.csv')
+        self.outputfile = join(self.tmpdir, 'test_Processed.xlsx')
+        for f in [self.datafile, self.extrafile, self.outputfile]:
+            with open(f, 'w') as myfile:
+                myfile.write('ROI1\n1.0\n')
+        self.config = {'EXPT_EXCEL': '_Processed.xlsx'}
+        self.manifest.record(self.process, self.datafile, [self.datafile], [self.extrafile],
+                             [self.outputfile], self.config, 'abc')
+
+    def touch(self, filename):
+        mtime = getmtime(filename) + 10
+        utime(filename, (mtime, mtime))
+
+    def test_uptodate(self):
+        self.assertIsNotNone(self.manifest.isUpToDate(self.process, self.datafile, [self.datafile], self.config, 'abc'))
+
+    def test_changed(self):
+        self.assertIsNone(self.manifest.isUpToDate(self.process, self.datafile, [self.datafile], self.config, 'abd'))
+        self.assertIsNone(self.manifest.isUpToDate(self.process, self.datafile, [self.datafile],
+                                                   {'EXPT_EXCEL': '_Other.xlsx'}, 'abc'))
+        self.assertIsNone(self.manifest.isUpToDate(self.process, self.datafile, [self.datafile, self.extrafile],
+                                                   self.config, 'abc'))
+        self.touch(self.extrafile)
+        self.assertIsNone(self.manifest.isUpToDate(self.process, self.datafile, [self.datafile], self.config, 'abc'))
+
+    def test_output_modified(self):
+        self.touch(self.outputfile)
+        self.assertIsNone(self.manifest.isUpToDate(self.process, self.datafile, [self.datafile], self.config, 'abc'))
+
+    def test_isIncremental(self):
+        self.assertTrue(isIncremental({'INCREMENTAL': 'True'}))
+        self.assertFalse(isIncremental({'INCREMENTAL': None}))
+        self.assertFalse(isIncremental(None))
+
+    def test_getDependencies(self):
+        # shared modules used by module are part of its code version
+        deps = getDependencies('autoanalysis.processmodules.Bleach')
+        for name in ['Bleach', 'DataParser', 'Plotting', 'ExcelExport', 'Container', 'TraceStore']:
+            self.assertIn('autoanalysis.processmodules.' + name, deps)
+        self.assertNotIn('autoanalysis.processmodules.MSD', deps)
+
+    def test_deferredPlots(self):
+        config = {'INCREMENTAL': 'True'}
+        key = join(self.tmpdir, 'plots.csv')
+        plotfile = join(self.tmpdir, 'missing', 'test.html')
+        process = 'autoanalysis.processmodules.Manifest.PlotModule'
+        # not recorded until plots are written - failed plot is redrawn by next run
+        mod = PlotModule(self.datafile, self.tmpdir, plotfile)
+        self.assertEqual((None, False), runModule(mod, 'autoanalysis.processmodules.Manifest', key, {}, True, config))
+        self.assertIsNone(self.manifest.load(process, key))
+        self.assertRaises(IOError, renderPlot, mod.plotjobs[0])
+        self.assertIsNone(self.manifest.load(process, key))
+        mod = PlotModule(self.datafile, self.tmpdir, join(self.tmpdir, 'test.html'))
+        runModule(mod, 'autoanalysis.processmodules.Manifest', key, {}, True, config)
+        self.assertEqual([mod.plotfile], renderPlot(mod.plotjobs[0]))
+        self.assertIn(mod.plotfile, self.manifest.load(process, key)['outputs'])
+        mod = PlotModule(self.datafile, self.tmpdir, join(self.tmpdir, 'test.html'))
+        self.assertEqual((None, True), runModule(mod, 'autoanalysis.processmodules.Manifest', key, {}, True, config))
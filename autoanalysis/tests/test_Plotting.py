@@ -0,0 +1,107 @@
+import unittest2 as unittest
+import base64
+import json
+from os import stat, umask
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.controller import PlotStage, getPlotProcesses
+from autoanalysis.processmodules.Plotting import writeROIViewer, writeROIPages, writeOverlay, writeContactSheets, encodeArray, getLTTBIndices, PLOTLYJS
+from autoanalysis.tests.testutils import TempDirTestCase
+
+def lttb(x, y, npoints):
+    """ Reference LTTB for a single trace """
+    n = len(y)
+    every = (n - 2) / (npoints - 2)
+    a = 0
+    indices = [0]
+    for i in range(npoints - 2):
+        start = int(np.floor(i * every)) + 1
+        stop = int(np.floor((i + 1) * every)) + 1
+        nextstop = min(int(np.floor((i + 2) * every)) + 1, n)
+        cx = np.mean(x[stop:nextstop])
+        cy = np.mean(y[stop:nextstop])
+        areas = [abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a])) for j in range(start, stop)]
+        a = start + int(np.argmax(areas))
+        indices.append(a)
+    indices.append(n - 1)
+    return indices
+
+class TestPlotting(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.xt = np.arange(100) * 0.1
+        self.df = pd.DataFrame(np.random.rand(100, 20), columns=['ROI%d' % i for i in range(1, 21)])
+
+    def test_encodeArray(self):
+        values = np.random.rand(10)
+        decoded = np.frombuffer(base64.b64decode(encodeArray(values)), dtype='<f4')
+        np.testing.assert_allclose(values, decoded, rtol=1e-6)
+
+    def test_writeROIViewer(self):
+        outputfile = join(self.tmpdir, 'test_Processed.html')
+        files = writeROIViewer(self.xt, self.df, 'Test', outputfile, auto_open=False)
+        self.assertEqual([outputfile, join(self.tmpdir, 'test_Processed_data.js'), join(self.tmpdir, PLOTLYJS)], files)
+        with open(files[1]) as f:
+            data = json.loads(f.read()[len('var ROIDATA = '):].rstrip(';\n'))
+        self.assertEqual(list(self.df.columns), data['names'])
+        y = np.frombuffer(base64.b64decode(data['y']), dtype='<f4').reshape((20, 100))
+        np.testing.assert_allclose(self.df['ROI3'].values, y[2], rtol=1e-6)
+        with open(outputfile) as f:
+            self.assertIn(PLOTLYJS, f.read())
+        # shared plotly.js readable as other outputs (not private as temp file)
+        mask = umask(0)
+        umask(mask)
+        self.assertEqual(0o666 & ~mask, stat(files[2]).st_mode & 0o777)
+
+    def test_getLTTBIndices(self):
+        Y = np.random.rand(5, 1000)
+        x = np.arange(1000) * 0.1
+        idx = getLTTBIndices(x, Y, 50)
+        self.assertEqual((5, 50), idx.shape)
+        for i in range(5):
+            self.assertEqual(lttb(x, Y[i], 50), idx[i].tolist())
+        # peaks are kept
+        Y[0, 500] = 10
+        self.assertIn(500, getLTTBIndices(x, Y, 50)[0])
+        # all points if within budget
+        self.assertEqual(list(range(1000)), getLTTBIndices(x, Y, 0)[0].tolist())
+
+    def test_writeOverlay(self):
+        outputfile = join(self.tmpdir, 'test_Normalized.html')
+        df = self.df.copy()
+        df['Average'] = self.df.mean(axis=1)
+        df['SD'] = self.df.std(axis=1)
+        files = writeOverlay(self.xt, df, 'Test', outputfile, npoints=20, rois=['ROI2'], auto_open=False)
+        self.assertEqual([outputfile, join(self.tmpdir, PLOTLYJS)], files)
+        with open(outputfile) as f:
+            page = f.read()
+        self.assertIn('"ROI2"', page)
+        self.assertNotIn('"ROI3"', page)
+        self.assertIn('scattergl', page)
+
+    def test_writeROIPages(self):
+        outputfile = join(self.tmpdir, 'test_Processed.html')
+        files = writeROIPages(self.xt, self.df, 'Test', outputfile, auto_open=False)
+        self.assertEqual([join(self.tmpdir, 'test_Processed_%d.html' % i) for i in range(1, 4)], files)
+
+    def test_PlotStage(self):
+        progress = []
+        stage = PlotStage(progress.append, 0, 'Test', 2)
+        outputfile = join(self.tmpdir, 'test_Processed.html')
+        stage.submit([(writeROIViewer, (self.xt, self.df, 'Test', outputfile, 3, 3, 'Time (s)', False))])
+        stage.close()
+        stage.join()
+        self.assertEqual((0, 0, 0, 0, 'Test (plots)'), progress[0])
+        self.assertEqual((100, 0, 1, 1, 'Test (plots)'), progress[-1])
+        self.assertIn(outputfile, stage.outputfiles)
+        self.assertEqual(0, getPlotProcesses({}))
+        self.assertEqual(0, getPlotProcesses({'PLOT_PROCESSES': 'x'}))
+        self.assertEqual(2, getPlotProcesses({'PLOT_PROCESSES': '2'}))
+
+    def test_writeContactSheets(self):
+        outputfile = join(self.tmpdir, 'test_Processed_ROIs.png')
+        files = writeContactSheets(self.xt, self.df, 'Test', outputfile, rows=2, cols=5)
+        self.assertEqual([join(self.tmpdir, 'test_Processed_ROIs_%d.png' % i) for i in range(1, 3)], files)
+        with open(files[0], 'rb') as f:
+            self.assertEqual(b'\x89PNG', f.read(4))
@@ -0,0 +1,83 @@
+import unittest2 as unittest
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.Prefetch import Prefetcher, getDataSize
+from autoanalysis.processmodules.DataParser import AutoData, readSheets, configurePrefetch
+from autoanalysis.tests.testutils import TempDirTestCase
+
+class TestPrefetch(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.files = []
+        for i in range(4):
+            datafile = join(self.tmpdir, 'test%d.csv' % i)
+            pd.DataFrame({'Time': np.arange(100) * 0.1, 'ROI1': np.arange(100) + i}).to_csv(datafile, index=False)
+            self.files.append(datafile)
+        self.loaded = []
+        # No cache so all loads are parsed
+        self.cache = AutoData.cache
+        AutoData.cache = None
+
+    def tearDown(self):
+        AutoData.prefetch = None
+        AutoData.cache = self.cache
+        super().tearDown()
+
+    def loader(self, datafile):
+        self.loaded.append(datafile)
+        return readSheets(datafile)
+
+    def test_fetch(self):
+        prefetch = Prefetcher(self.loader, ahead=2)
+        prefetch.fetch(self.files[1:])
+        # only files ahead
+        self.assertIsNone(prefetch.get(self.files[0]))
+        data = prefetch.get(self.files[1])
+        self.assertEqual(1, data['ROI1'][0])
+        self.assertEqual(self.files[1:3], sorted(self.loaded))
+        # each sheet returned once
+        self.assertIsNone(prefetch.get(self.files[1]))
+        prefetch.release(self.files[2])
+        self.assertIsNone(prefetch.get(self.files[2]))
+        self.assertEqual(1, prefetch.hits)
+        self.assertEqual(3, prefetch.misses)
+        prefetch.close()
+        self.assertEqual(0, prefetch.used)
+
+    def test_budget(self):
+        # over budget from file size - not fetched
+        prefetch = Prefetcher(self.loader, ahead=3, maxsize=0.001)
+        prefetch.fetch(self.files[1:])
+        self.assertIsNone(prefetch.get(self.files[1]))
+        self.assertEqual(1, prefetch.skipped)
+        self.assertEqual([], self.loaded)
+        self.assertEqual(0, prefetch.used)
+        prefetch.close()
+
+    def test_budgetParsed(self):
+        # parsed data much larger than file - dropped when parsed
+        large = lambda datafile: {0: pd.DataFrame({'ROI1': np.zeros(100000)})}
+        prefetch = Prefetcher(large, ahead=1, maxsize=0.1)
+        prefetch.fetch(self.files[1:])
+        self.assertIsNone(prefetch.get(self.files[1]))
+        self.assertEqual(1, prefetch.skipped)
+        self.assertEqual(0, prefetch.used)
+        prefetch.close()
+
+    def test_loadSheet(self):
+        prefetch = configurePrefetch({'PREFETCH_FILES': 2})
+        prefetch.fetch(self.files[1:])
+        data = AutoData(self.files[1]).data
+        self.assertEqual(1, prefetch.hits)
+        self.assertEqual(list(pd.read_csv(self.files[1]).columns), list(data.columns))
+        self.assertIsNone(configurePrefetch({'PREFETCH_FILES': 0}))
+
+    def test_getDataSize(self):
+        # text is counted - not only the 8 byte references of object columns
+        df = pd.DataFrame({'Frame': ['x' * 1000] * 100})
+        self.assertGreater(getDataSize({0: df}), 100 * 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest2 as unittest
+from os.path import join, exists
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.TraceStore import isTraceStore, saveTraces, getSidecar, TraceStore
+from autoanalysis.processmodules.Baseline import Normalized
+from autoanalysis.tests.testutils import TempDirTestCase
+
+class TestTraceStore(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outputfile = join(self.tmpdir, 'test_Processed.npy')
+        self.traces = pd.DataFrame(np.random.rand(20, 5), columns=['ROI%d' % i for i in range(1, 6)])
+        self.frames = pd.DataFrame({'Time': np.arange(20) * 0.1,
+                                    'Frame': ['STIM' if i == 4 else str(i) for i in range(20)]},
+                                   columns=['Time', 'Frame'])
+
+    def test_saveTraces(self):
+        self.assertTrue(isTraceStore(self.outputfile))
+        self.assertEqual([self.outputfile, getSidecar(self.outputfile)], saveTraces(self.outputfile, self.traces, self.frames))
+        self.assertTrue(exists(join(self.tmpdir, 'test_Processed.json')))
+        self.assertRaises(ValueError, saveTraces, self.outputfile, self.traces, self.frames.iloc[0:10])
+
+    def test_getTraces(self):
+        saveTraces(self.outputfile, self.traces, self.frames)
+        store = TraceStore(self.outputfile)
+        self.assertEqual((20, 5), store.shape)
+        self.assertEqual(4, store.getStimulusIndex())
+        self.assertIsInstance(store.matrix, np.memmap)
+        # selected ROIs in order given
+        df = store.getTraces(['ROI3', 'ROI1'])
+        self.assertEqual(['ROI3', 'ROI1'], list(df.columns))
+        np.testing.assert_allclose(self.traces[['ROI3', 'ROI1']].values, df.values, rtol=1e-6)
+        # window of frames
+        df = store.getTraces(['ROI2'], 2, 8)
+        self.assertEqual(list(range(2, 8)), list(df.index))
+        np.testing.assert_allclose(self.traces['ROI2'].values[2:8], df['ROI2'].values, rtol=1e-6)
+        self.assertRaises(KeyError, store.getTraces, ['ROI9'])
+
+    def test_normalizedWindow(self):
+        # window of selected ROIs read from store by Normalized
+        saveTraces(self.outputfile, self.traces, self.frames)
+        mod = Normalized(self.outputfile, self.tmpdir)
+        mod.loadData()
+        df = mod.getTraces(['ROI2', 'ROI5'], 2, 8)
+        self.assertEqual(list(range(2, 8)), list(df.index))
+        np.testing.assert_allclose(self.traces[['ROI2', 'ROI5']].values[2:8], df.values, rtol=1e-6)
+
+    def test_toDataFrame(self):
+        saveTraces(self.outputfile, self.traces, self.frames)
+        df = TraceStore(self.outputfile).toDataFrame()
+        self.assertEqual(list(self.traces.columns) + ['Time', 'Frame'], list(df.columns))
+        self.assertEqual(self.frames['Frame'].tolist(), df['Frame'].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
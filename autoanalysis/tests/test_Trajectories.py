@@ -0,0 +1,86 @@
+import unittest2 as unittest
+from os import mkdir
+from os.path import join
+import numpy as np
+import pandas as pd
+from autoanalysis.processmodules.Trajectories import Trajectories, Track, isTracksFile
+from autoanalysis.processmodules.MSD import AutoMSD
+from autoanalysis.tests.testutils import TempDirTestCase, configuredModule
+
+class TestTrajectories(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.RandomState(1)
+        tracks = []
+        for t in range(10):
+            n = rng.randint(2, 20)
+            frames = np.arange(n) + rng.randint(0, 100)
+            positions = rng.uniform(0, 50, (n, 2))
+            tracks.append(pd.DataFrame({'Trajectory': t + 1, 'Frame': frames, 'x': positions[:, 0], 'y': positions[:, 1]},
+                                       columns=['Trajectory', 'Frame', 'x', 'y']))
+        self.data = pd.concat(tracks, ignore_index=True)
+        self.datafile = join(self.tmpdir, 'AllROI-Tracks.txt')
+        # unsorted with extra column as may be exported
+        data = self.data.sample(frac=1, random_state=1)
+        data['Intensity'] = 1.0
+        data.to_csv(self.datafile, sep='\t', index=False)
+
+    def test_load(self):
+        tracks = Trajectories.load(self.datafile)
+        self.assertEqual(10, len(tracks))
+        self.assertEqual(len(self.data), tracks.npoints)
+        self.assertEqual(['Trajectory', 'Frame', 'x', 'y'], tracks.columns)
+        np.testing.assert_array_equal(self.data.groupby('Trajectory').size().values, tracks.lengths)
+        # sorted by track then frame
+        pd.testing.assert_frame_equal(self.data, tracks.toDataFrame(), check_dtype=False)
+
+    def test_duplicates(self):
+        # point repeated in same frame of tracks 3 and 7
+        data = pd.concat([self.data, self.data[self.data['Trajectory'].isin([3, 7])].iloc[[0, -1]]])
+        with self.assertRaisesRegex(ValueError, r'\(2\): 3, 7'):
+            Trajectories.fromDataFrame(data)
+
+    def test_views(self):
+        tracks = Trajectories.load(self.datafile)
+        track = tracks[2]
+        self.assertIsInstance(track, Track)
+        self.assertEqual(3, track.id)
+        self.assertTrue(np.shares_memory(track.positions, tracks.positions))
+        expected = self.data[self.data['Trajectory'] == 3]
+        np.testing.assert_allclose(expected[['x', 'y']].values, track.positions)
+        self.assertEqual(10, tracks[-1].id)
+        self.assertEqual(10, len(list(tracks)))
+        # slice shares arrays
+        subset = tracks[3:6]
+        self.assertEqual([4, 5, 6], subset.ids.tolist())
+        self.assertIs(tracks.positions, subset.positions)
+        self.assertEqual(5, subset[1].id)
+        np.testing.assert_array_equal(np.zeros(3), subset.getOffsets()[subset.starts])
+        pd.testing.assert_frame_equal(self.data[self.data['Trajectory'].isin([4, 5, 6])].reset_index(drop=True),
+                                      subset.toDataFrame(), check_dtype=False)
+        self.assertEqual(0, len(tracks[6:3]))
+
+    def test_save(self):
+        tracks = Trajectories.load(self.datafile)
+        outputfile = tracks[2:8].save(join(self.tmpdir, 'AllROI-Tracks.trk'))
+        self.assertTrue(isTracksFile(outputfile))
+        loaded = Trajectories.open(outputfile)
+        self.assertEqual(tracks.columns, loaded.columns)
+        pd.testing.assert_frame_equal(tracks[2:8].toDataFrame(), loaded.toDataFrame())
+
+    def test_msd(self):
+        # same MSD from binary file as from text
+        tracks = Trajectories.load(self.datafile)
+        trkfile = tracks.save(join(self.tmpdir, 'AllROI-Tracks.trk'))
+        results = []
+        for (i, datafile) in enumerate([self.datafile, trkfile]):
+            outputdir = join(self.tmpdir, str(i))
+            mkdir(outputdir)
+            mod = configuredModule(AutoMSD, datafile, outputdir)
+            mod.run()
+            results.append(pd.read_csv(join(outputdir, 'Track_MSD.txt'), sep='\t'))
+        pd.testing.assert_frame_equal(results[0], results[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest2 as unittest
+from os.path import join, sep
+from autoanalysis.cli import parseShard, getGroup
+from autoanalysis.controller import shardFiles
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.files = [join('data', 'Control', 'EXP%d_Time Trace(s).csv' % i) for i in range(10)]
+
+    def test_parseShard(self):
+        self.assertEqual((2, 4), parseShard('2/4'))
+        self.assertIsNone(parseShard(None))
+        self.assertRaises(ValueError, parseShard, '5/4')
+        self.assertRaises(ValueError, parseShard, '1-4')
+
+    def test_shardFiles(self):
+        shards = [shardFiles(self.files, (i, 3)) for i in range(1, 4)]
+        self.assertEqual(sorted(self.files), sorted(sum(shards, [])))
+        self.assertEqual([4, 3, 3], [len(s) for s in shards])
+        self.assertEqual(self.files, shardFiles(self.files, None))
+
+    def test_shardStages(self):
+        # outputs of later stages stay with the shard of their source whatever outputs exist
+        inputs = self.files + [join('data', 'Control', 'Bleach Time Trace(s).csv')]
+        first = [shardFiles(inputs, (i, 3)) for i in range(1, 4)]
+        outputs = [join('data', 'Control', 'processed', 'EXP%d_Time Trace(s)_Processed.xlsx' % i) for i in range(10)]
+        for i in range(1, 4):
+            # only some outputs written so far
+            second = shardFiles(outputs[:i * 3], (i, 3), inputs)
+            expected = [join('data', 'Control', 'processed', f.split(sep)[-1].replace('.csv', '_Processed.xlsx'))
+                        for f in first[i - 1] if 'EXP' in f]
+            self.assertEqual(sorted([f for f in expected if f in outputs[:i * 3]]), second)
+
+    def test_shardGroups(self):
+        filenames = {'all': self.files, 'Control': self.files[0:5], 'Treatment1': self.files[5:]}
+        sharded = shardFiles(filenames, (2, 2))
+        self.assertNotIn('Control', sharded)
+        self.assertEqual(sorted(self.files[5:]), sharded['all'])
+
+    def test_getGroup(self):
+        self.assertEqual('Control', getGroup(self.files[0], ['Treatment1', 'Control']))
+        self.assertEqual('', getGroup(sep.join(['data', 'Controls', 'EXP1.csv']), ['Control']))
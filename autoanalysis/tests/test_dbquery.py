@@ -1,8 +1,10 @@
 from os.path import join
+import pickle
+import threading
 
 import unittest2 as unittest
 
-from autoanalysis.db.dbquery import DBI
+from autoanalysis.db.dbquery import DBI, ConfigSnapshot
 
 
 class TestDBquery(unittest.TestCase):
@@ -73,4 +75,59 @@ class TestDBquery(unittest.TestCase):
                       ('MAXRANGE', 50, 'test', "Maximum range of histograms bins")]
         cnt = self.dbi.addConfig(configid,configlist)
         expected = len(configlist)
-        self.assertEqual(expected,cnt)
\ No newline at end of file
+        self.assertEqual(expected,cnt)
+
+    def test_getSnapshot(self):
+        configid = 'test'
+        snapshot = self.dbi.getSnapshot(configid)
+        self.assertEqual(self.dbi.getConfig(configid), dict(snapshot))
+        self.assertRaises(AttributeError, setattr, snapshot, 'configid', 'general')
+        self.assertEqual(snapshot, pickle.loads(pickle.dumps(snapshot)))
+
+    def test_snapshot_resolve(self):
+        snapshot = ConfigSnapshot('test', {'BINWIDTH': '20', 'MINRANGE': '5.5', 'SHOWALL': 'False', 'COLUMNS': 'A,B'})
+        cfg = snapshot.resolve({'BINWIDTH': 1, 'MINRANGE': 0.0, 'SHOWALL': True, 'COLUMNS': [], 'COLUMN': ''})
+        self.assertEqual(20, cfg['BINWIDTH'])
+        self.assertEqual(5.5, cfg['MINRANGE'])
+        self.assertFalse(cfg['SHOWALL'])
+        self.assertEqual(['A', 'B'], cfg['COLUMNS'])
+        self.assertEqual('', cfg['COLUMN'])
+        self.assertRaises(ValueError, snapshot.resolve, {'COLUMNS': 1})
+
+    def test_getConfigs(self):
+        data = self.dbi.getConfigs('test', ['BINWIDTH', 'BINW'])
+        self.assertEqual(self.dbi.getConfigByName('test', 'BINWIDTH'), data['BINWIDTH'])
+        self.assertIsNone(data['BINW'])
+
+    def test_getConfigsForMany(self):
+        data = self.dbi.getConfigsForMany(['test', 'none'])
+        self.assertEqual(self.dbi.getConfig('test'), data['test'])
+        self.assertEqual({}, data['none'])
+
+    def test_index(self):
+        self.dbi.c.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='config'")
+        self.assertIn('config_configid_name_index', [d[0] for d in self.dbi.c.fetchall()])
+
+    def test_threads(self):
+        results = []
+        def query():
+            dbi = DBI(self.dbi.dbfile)
+            results.append((dbi.conn, dbi.getConfigByName('test', 'BINWIDTH')))
+        threads = [threading.Thread(target=query) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(4, len(set([id(r[0]) for r in results])))
+        self.assertIs(self.dbi.conn, DBI(self.dbi.dbfile).conn)
+
+    def test_journal(self):
+        # db file not switched to WAL unless set
+        self.dbi.c.execute("PRAGMA journal_mode")
+        self.assertNotEqual('wal', self.dbi.c.fetchone()[0].lower())
+
+    def test_close(self):
+        conn = self.dbi.conn
+        self.dbi.closeconn()
+        self.assertIsNot(conn, self.dbi.conn)
+        self.assertGreater(len(self.dbi.getConfig('test')), 0)
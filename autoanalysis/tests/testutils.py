@@ -0,0 +1,35 @@
+"""
+Test utilities
+    1. TempDirTestCase - test case with a temp directory (self.tmpdir) removed after each test
+    2. configuredModule - process module with its default config set (as the controller does from configdb)
+
+Created on 17 Oct 2026
+
+@author: QBI Software
+"""
+import unittest2 as unittest
+import shutil
+import tempfile
+
+
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+def configuredModule(moduleclass, *args, **config):
+    """
+    Create process module with default config
+    :param moduleclass: process module class
+    :param args: module args eg datafile, outputdir
+    :param config: config values to set over the defaults
+    :return: configured module
+    """
+    mod = moduleclass(*args)
+    cfg = mod.getConfigurables()
+    cfg.update(config)
+    mod.setConfigurables(cfg)
+    return mod